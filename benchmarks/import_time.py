@@ -0,0 +1,108 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Benchmark of the time to import the RGA driver for headless use.
+
+It times 'from srsinst.rga import RGA100' in fresh Python processes, subtracts the time
+to import srsgui, which the driver is built on, and checks it against a budget.
+It also checks that the import does not load heavy packages that only plots and analysis use.
+A heavy package already loaded by srsgui itself, i.e., matplotlib for srsgui TimePlot, is reported
+but not counted as a failure.
+
+Usage
+---------
+    .. code-block:: bash
+
+        python benchmarks/import_time.py --repeat 10 --budget 0.05
+
+The exit code is 1 if the budget is exceeded or a heavy package is imported.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+RootDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DriverImport = 'from srsinst.rga import RGA100'
+BaseImport = 'import srsgui'
+
+# Packages a headless driver should not import
+HeavyModules = ('matplotlib', 'scipy', 'PySide6', 'PyQt5')
+
+# Seconds allowed to import the driver on top of srsgui
+DefaultBudget = 0.05
+
+MeasureScript = """
+import sys, time, json
+start_time = time.perf_counter()
+{}
+duration = time.perf_counter() - start_time
+print(json.dumps({{'duration': duration, 'modules': [name for name in {!r} if name in sys.modules]}}))
+"""
+
+
+def measure(statement, repeat):
+    """
+    Import with the statement in fresh processes
+
+    :return: (durations in seconds, heavy modules loaded)
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [RootDirectory, env.get('PYTHONPATH')]))
+    script = MeasureScript.format(statement, HeavyModules)
+    durations = []
+    modules = set()
+    for i in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        durations.append(result['duration'])
+        modules.update(result['modules'])
+    return durations, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the import time of srsinst.rga')
+    parser.add_argument('--repeat', type=int, default=10, help='number of fresh processes for each import')
+    parser.add_argument('--budget', type=float, default=DefaultBudget,
+                        help='seconds allowed for the driver import on top of srsgui')
+    args = parser.parse_args(argv)
+
+    base_durations, base_modules = measure(BaseImport, args.repeat)
+    durations, modules = measure(DriverImport, args.repeat)
+
+    base_time = statistics.median(base_durations)
+    total_time = statistics.median(durations)
+    driver_time = max(total_time - base_time, 0.0)
+    heavy_modules = sorted(modules - base_modules)
+
+    print('{:<35s} median {:7.1f} ms  min {:7.1f} ms'
+          .format(BaseImport, 1000 * base_time, 1000 * min(base_durations)))
+    print('{:<35s} median {:7.1f} ms  min {:7.1f} ms'
+          .format(DriverImport, 1000 * total_time, 1000 * min(durations)))
+    print('{:<35s} {:7.1f} ms  budget {:.1f} ms'.format('srsinst.rga on top of srsgui',
+                                                          1000 * driver_time, 1000 * args.budget))
+    if base_modules:
+        print('Imported by srsgui: {}'.format(', '.join(sorted(base_modules))))
+
+    passed = True
+    if heavy_modules:
+        print('FAIL: heavy modules imported: {}'.format(', '.join(heavy_modules)))
+        passed = False
+    if driver_time > args.budget:
+        print('FAIL: import time over budget')
+        passed = False
+    if passed:
+        print('PASS')
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,6 @@
 
+import importlib
+
 from .instruments.rga100.rga  import RGA100
 from .instruments.get_instruments import get_rga
 from .instruments.rga100.sicp import SICP, Packet
@@ -7,14 +9,25 @@ from .instruments.rga100.sicp import SICP, Packet
 RGA200 = RGA100
 RGA300 = RGA100
 
-try:
-    from .plots.analogscanplot    import AnalogScanPlot
-    from .plots.histogramscanplot import HistogramScanPlot
-    from .plots.timeplot          import TimePlot
-except (ImportError, ModuleNotFoundError):
-    # Without matplotlib package installed, importing plot classes will fail.
-    pass
+# Plot classes are imported when first used, so that a headless program using RGA100
+# does not import matplotlib. Without matplotlib installed, using them raises ImportError.
+_lazy_attributes = {
+    'AnalogScanPlot': '.plots.analogscanplot',
+    'HistogramScanPlot': '.plots.histogramscanplot',
+    'TimePlot': '.plots.timeplot',
+}
 
 __version__ = "0.3.9"  # Global version number
 
 
+def __getattr__(name):
+    module_name = _lazy_attributes.get(name)
+    if module_name is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # __getattr__ is not called again for the name
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
@@ -0,0 +1,336 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to evaluate alarm rules on P vs T data as it is measured.
+
+AlarmEngine has rules on named channels, i.e., masses of a P vs T scan or gases of
+composition analysis: absolute thresholds, ratios of two channels such as 18/28,
+and rate of change over a time window. Each rule has hysteresis to clear the alarm.
+The rules are compiled once into NumPy arrays, and all the rules are evaluated together
+with each new set of values, so that callbacks are called within the cycle
+when a value crosses a limit.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga.data.alarms import AlarmEngine
+
+        engine = AlarmEngine(['2', '18', '28', '44'])
+        engine.add_threshold('H2O high', '18', 1e-7, hysteresis=1e-8)
+        engine.add_ratio('Air leak', '28', '32', 3.0, above=False)
+        engine.add_rate('Pressure burst', '28', 1e-9, window=10.0)
+        engine.add_callback(lambda event: print(event))
+
+        # Evaluate with every P vs T data point added to a TimePlot
+        engine.attach(pvst_plot)
+
+Rules can be given in a string, i.e., from a task input, separated with ';'.
+'18 > 1e-7' is a threshold, '28/32 < 3' is a ratio, and 'rate(28, 10) > 1e-9' is
+a rate of change over 10 seconds.
+
+    .. code-block:: python
+
+        engine = create_alarm_engine(['2', '18', '28', '44'], '18 > 1e-7; 18/28 > 0.5',
+                                     pvst_plot, task.logger)
+"""
+
+import re
+import time
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RuleThreshold = 0
+RuleRatio = 1
+RuleRate = 2
+
+RuleTypeNames = {RuleThreshold: 'threshold', RuleRatio: 'ratio', RuleRate: 'rate'}
+
+_RatePattern = re.compile(r'^rate\s*\(\s*([^<>/;(),]+?)\s*(?:,\s*([^<>;()]+?)\s*)?\)\s*([<>])\s*(\S+)$')
+_RatioPattern = re.compile(r'^([^<>/;(),]+?)\s*/\s*([^<>/;(),]+?)\s*([<>])\s*(\S+)$')
+_ThresholdPattern = re.compile(r'^([^<>/;(),]+?)\s*([<>])\s*(\S+)$')
+
+DefaultRateWindow = 10.0
+
+AlarmEvent = namedtuple('AlarmEvent', ('name', 'active', 'value', 'limit', 'timestamp'))
+"""
+Alarm state change. value is the channel value, ratio or rate in unit per second
+"""
+
+
+class AlarmRule:
+    """
+    Definition of an alarm rule. Use AlarmEngine.add_threshold, add_ratio or add_rate to add one.
+    """
+
+    def __init__(self, name, rule_type, channel, limit, above=True, hysteresis=0.0,
+                 other_channel=None, window=0.0):
+        self.name = name
+        self.rule_type = rule_type
+        self.channel = channel
+        self.other_channel = other_channel
+        self.limit = float(limit)
+        self.above = above
+        self.hysteresis = abs(float(hysteresis))
+        self.window = float(window)
+
+    def __repr__(self):
+        return 'AlarmRule({!r}, {}, {!r}, {})'.format(self.name, RuleTypeNames[self.rule_type],
+                                                      self.channel, self.limit)
+
+
+class AlarmEngine:
+    """
+    Class to evaluate alarm rules on sets of channel values
+
+    parameters
+    -----------
+
+        channel_names: list of str
+            names of the values in each update, in order
+        history_size: int, optional
+            number of past updates kept to calculate rates
+    """
+
+    def __init__(self, channel_names, history_size=1000):
+        self.channel_names = list(channel_names)
+        self._channel_index = {name: index for index, name in enumerate(self.channel_names)}
+        self.rules = []
+        self.callbacks = []
+        self._compiled = False
+
+        self.history_size = history_size
+        self._history_times = np.zeros(history_size)
+        self._history_values = np.zeros((history_size, len(self.channel_names)))
+        self._history_index = 0
+        self._history_count = 0
+
+        self.update_count = 0
+        self.event_count = 0
+
+    def _add_rule(self, rule):
+        for channel in (rule.channel, rule.other_channel):
+            if channel is not None and channel not in self._channel_index:
+                raise KeyError('Unknown channel {} for alarm "{}"'.format(channel, rule.name))
+        if any(r.name == rule.name for r in self.rules):
+            raise ValueError('Alarm "{}" already exists'.format(rule.name))
+        self.rules.append(rule)
+        self._compiled = False
+        return rule
+
+    def add_threshold(self, name, channel, limit, above=True, hysteresis=0.0):
+        """
+        Add an alarm set when the value of a channel is above (or below) the limit.
+        The alarm is cleared when the value goes back beyond the limit by hysteresis.
+        """
+        return self._add_rule(AlarmRule(name, RuleThreshold, channel, limit, above, hysteresis))
+
+    def add_ratio(self, name, numerator, denominator, limit, above=True, hysteresis=0.0):
+        """
+        Add an alarm on the ratio of two channels, such as '18' / '28'
+        """
+        return self._add_rule(AlarmRule(name, RuleRatio, numerator, limit, above, hysteresis,
+                                        other_channel=denominator))
+
+    def add_rate(self, name, channel, limit, window=10.0, above=True, hysteresis=0.0):
+        """
+        Add an alarm on the rate of change, dP/dt in unit per second,
+        calculated from the oldest value within the window in seconds
+        """
+        if window <= 0:
+            raise ValueError('Invalid window: {}'.format(window))
+        return self._add_rule(AlarmRule(name, RuleRate, channel, limit, above, hysteresis,
+                                        window=window))
+
+    def add_rules(self, text):
+        """
+        Add rules from a string with rules separated with ';'. Each rule is named with its text.
+
+            '18 > 1e-7': threshold of channel '18'
+            '28/32 < 3': ratio of channel '28' to channel '32'
+            'rate(28, 10) > 1e-9': rate of change of channel '28' over 10 seconds
+
+        :return: rules added
+        :rtype: list of AlarmRule
+        """
+        rules = []
+        for item in text.split(';'):
+            item = item.strip()
+            if not item:
+                continue
+            match = _RatePattern.match(item)
+            if match:
+                channel, window, comparison, limit = match.groups()
+                window = DefaultRateWindow if window is None else float(window)
+                rules.append(self.add_rate(item, channel, float(limit), window, comparison == '>'))
+                continue
+            match = _RatioPattern.match(item)
+            if match:
+                numerator, denominator, comparison, limit = match.groups()
+                rules.append(self.add_ratio(item, numerator, denominator, float(limit), comparison == '>'))
+                continue
+            match = _ThresholdPattern.match(item)
+            if match:
+                channel, comparison, limit = match.groups()
+                rules.append(self.add_threshold(item, channel, float(limit), comparison == '>'))
+                continue
+            raise ValueError('Invalid alarm rule: "{}"'.format(item))
+        return rules
+
+    def remove_rule(self, name):
+        self.rules = [rule for rule in self.rules if rule.name != name]
+        self._compiled = False
+
+    def add_callback(self, callback):
+        """
+        Add a function called with an AlarmEvent, when an alarm is set or cleared
+        """
+        if callable(callback):
+            self.callbacks.append(callback)
+
+    def attach(self, time_plot):
+        """
+        Evaluate the rules with every data point added to a TimePlot.
+        The values are in the converted unit of the plot.
+        """
+        if list(time_plot.data_keys) != self.channel_names:
+            raise ValueError('Plot data names {} do not match channels {}'
+                             .format(list(time_plot.data_keys), self.channel_names))
+        time_plot.add_listener(self.update)
+
+    def compile(self):
+        """
+        Compile the rules into arrays. update() calls it, if the rules changed.
+        Alarm states are reset.
+        """
+        rules = self.rules
+        self._types = np.array([rule.rule_type for rule in rules], dtype=np.int8)
+        self._channels = np.array([self._channel_index[rule.channel] for rule in rules], dtype=np.intp)
+        self._others = np.array([self._channel_index.get(rule.other_channel, 0) for rule in rules],
+                                dtype=np.intp)
+        self._limits = np.array([rule.limit for rule in rules])
+        self._above = np.array([rule.above for rule in rules], dtype=bool)
+        self._hysteresis = np.array([rule.hysteresis for rule in rules])
+        self._windows = np.array([rule.window for rule in rules])
+
+        self._is_ratio = self._types == RuleRatio
+        self._is_rate = self._types == RuleRate
+        self._set_limits = self._limits
+        self._clear_limits = np.where(self._above, self._limits - self._hysteresis,
+                                      self._limits + self._hysteresis)
+        self.active = np.zeros(len(rules), dtype=bool)
+        self.values = np.full(len(rules), np.nan)
+        self._compiled = True
+
+    def get_active_alarms(self):
+        """
+        :return: names of alarms currently set
+        :rtype: list of str
+        """
+        if not self._compiled:
+            return []
+        return [self.rules[i].name for i in np.flatnonzero(self.active)]
+
+    def update(self, values, timestamp=None):
+        """
+        Evaluate all the rules with a new set of channel values
+
+        :param values: values in the order of channel_names
+        :param float timestamp: time in seconds. If None, the current time is used
+        :return: AlarmEvents of the alarms changed
+        :rtype: list
+        """
+        if not self._compiled:
+            self.compile()
+        if timestamp is None:
+            timestamp = time.time()
+        v = np.asarray(values, dtype=np.double)
+        self._add_history(timestamp, v)
+        self.update_count += 1
+        if len(self.rules) == 0:
+            return []
+
+        x = v[self._channels]
+        if self._is_ratio.any():
+            denominator = v[self._others]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # No ratio without the denominator, to avoid alarms with no signal
+                ratio = np.where(denominator != 0, x / denominator, np.nan)
+            x = np.where(self._is_ratio, ratio, x)
+        if self._is_rate.any():
+            x = np.where(self._is_rate, self._calculate_rates(timestamp, v), x)
+        self.values = x
+
+        with np.errstate(invalid='ignore'):
+            set_condition = np.where(self._above, x > self._set_limits, x < self._set_limits)
+            clear_condition = np.where(self._above, x < self._clear_limits, x > self._clear_limits)
+        new_active = np.where(self.active, ~clear_condition, set_condition)
+        changed = np.flatnonzero(new_active != self.active)
+        self.active = new_active
+
+        events = [AlarmEvent(self.rules[i].name, bool(new_active[i]), float(x[i]),
+                             float(self._limits[i]), timestamp) for i in changed]
+        self.event_count += len(events)
+        for event in events:
+            for callback in self.callbacks:
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error('Alarm callback error: {}: {}'.format(e.__class__.__name__, e))
+        return events
+
+    def _add_history(self, timestamp, v):
+        index = self._history_index
+        self._history_times[index] = timestamp
+        self._history_values[index] = v
+        self._history_index = (index + 1) % self.history_size
+        self._history_count = min(self._history_count + 1, self.history_size)
+
+    def _calculate_rates(self, timestamp, v):
+        # history in chronological order, including the current values
+        count = self._history_count
+        order = np.arange(self._history_index - count, self._history_index) % self.history_size
+        times = self._history_times[order]
+        start = np.searchsorted(times, timestamp - self._windows)
+        start = np.minimum(start, count - 1)
+        dt = timestamp - times[start]
+        dv = v[self._channels] - self._history_values[order[start], self._channels]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(dt > 0, dv / dt, np.nan)
+
+
+def log_alarm_event(event, event_logger=logger):
+    """
+    Log an AlarmEvent: a warning when the alarm is set, info when cleared
+    """
+    if event.active:
+        event_logger.warning('Alarm "{}" set: {:.3e}, limit: {:.3e}'.format(event.name, event.value, event.limit))
+    else:
+        event_logger.info('Alarm "{}" cleared: {:.3e}'.format(event.name, event.value))
+
+
+def create_alarm_engine(channel_names, rules, time_plot, event_logger=logger):
+    """
+    Create an AlarmEngine with rules from a string, log its events,
+    and evaluate it with every data point added to the TimePlot
+
+    :param list channel_names: data names of the plot
+    :param str rules: rules for AlarmEngine.add_rules()
+    :param TimePlot time_plot: plot to attach to
+    :param event_logger: logger for the alarm events, i.e., the task logger
+    :return: AlarmEngine, or None without a rule
+    """
+    if not rules.strip():
+        return None
+    engine = AlarmEngine(channel_names)
+    engine.add_rules(rules)
+    engine.add_callback(lambda event: log_alarm_event(event, event_logger))
+    engine.attach(time_plot)
+    return engine
@@ -0,0 +1,490 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to read back data files saved by the RGA tasks.
+
+Tasks save scan data using the srsgui session handler. A data file (.sgdata)
+contains JSON blocks with plot information and text tables:
+a 'TN' line for a table name, a 'TH' line for the table header and
+a 'TD' line for each row of data. Spectra from analog and histogram scan plots are saved
+with the mass axis as the header, and P vs T data from time plots are saved
+with the mass (or gas) names as the header.
+
+SessionArchive opens a data file lazily. The file is memory-mapped, and only the
+byte offset and time stamp of each row are kept in memory. The offsets are saved in
+a sidecar index file the first time a data file is opened, so the next time the file
+is opened, only rows added since then are scanned.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga.data.archive import SessionArchive
+
+        with SessionArchive('Analog Scan-20230501-102030.sgdata') as archive:
+            print(archive.get_table_names())
+
+            # Spectra taken between 60 s and 120 s, only from 17 to 19 AMU
+            times, masses, spectra = archive.get_spectra('Analog Scan', 60, 120, (17, 19))
+
+            # Process a large P vs T table 10000 rows at a time
+            for times, data in archive.iter_chunks('P vs T Scan', 10000):
+                print(times[0], data.mean(axis=0))
+"""
+
+import os
+import json
+import mmap
+import logging
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TableNamePrefix = b'TN:'
+TableHeaderPrefix = b'TH:'
+TableDataPrefix = b'TD:'
+JsonStartPrefix = b':::JSON-'
+JsonEndPrefix = b':::JSONEND-'
+
+DateTimeHeader = 'Date time'
+IndexFileSuffix = '.idx.npz'
+IndexVersion = 1
+
+
+class ArchiveTable:
+    """
+    Index information of a table in a data file
+
+    parameters
+    -----------
+
+        index: int
+            table index used in 'TN', 'TH' and 'TD' lines
+        name: str
+            table name
+    """
+
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+        self.header = []
+        self.info = {}
+        self.is_datetime = False
+
+        # Byte offset and time stamp of each row, in float seconds.
+        # Time stamps of a 'Date time' table are seconds since the epoch.
+        self.offsets = np.array([], dtype=np.int64)
+        self.times = np.array([], dtype=np.float64)
+        self._new_offsets = []
+        self._new_times = []
+
+    def __len__(self):
+        return len(self.offsets) + len(self._new_offsets)
+
+    @property
+    def columns(self):
+        """
+        Column labels without the time column
+        """
+        return self.header[1:]
+
+    def get_mass_axis(self):
+        """
+        Get column labels converted to mass values
+
+        Raises ValueError if any of column labels is not a number
+        """
+        return np.array(list(map(float, self.columns)), dtype=np.float64)
+
+    def add_row(self, offset, time_stamp):
+        self._new_offsets.append(offset)
+        self._new_times.append(time_stamp)
+
+    def commit_rows(self):
+        """
+        Move rows added while scanning the file into the offset and time arrays
+        """
+        if not self._new_offsets:
+            return False
+        self.offsets = np.append(self.offsets, np.array(self._new_offsets, dtype=np.int64))
+        self.times = np.append(self.times, np.array(self._new_times, dtype=np.float64))
+        self._new_offsets = []
+        self._new_times = []
+        return True
+
+    def get_meta(self):
+        return {
+            'index': self.index,
+            'name': self.name,
+            'header': self.header,
+            'info': self.info,
+            'is_datetime': self.is_datetime,
+        }
+
+
+class SessionArchive:
+    """
+    Class to read tables in a data file saved by tasks without loading the whole file
+
+    parameters
+    -----------
+
+        file_name: str
+            path to a .sgdata file
+
+        use_index_file: bool, optional
+            If True, the row index is loaded from and saved to a sidecar file
+            named file_name + '.idx.npz'
+    """
+
+    def __init__(self, file_name, use_index_file=True):
+        self.file_name = str(file_name)
+        self.index_file_name = self.file_name + IndexFileSuffix
+        self.use_index_file = use_index_file
+
+        self.tables = {}  # ArchiveTable instances with the table index as key
+        self.json_dict = {}  # JSON blocks with their names as key
+        self._indexed_size = 0
+
+        self._file = None
+        self._map = None
+
+        loaded = self.use_index_file and self._load_index()
+        updated = self._scan(self._indexed_size)
+        if self.use_index_file and (updated or not loaded):
+            self._save_index()
+        self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self):
+        self._file = open(self.file_name, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # An empty file or a file system without mmap support
+            self._map = None
+
+    def close(self):
+        """
+        Close the memory map and the data file
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def refresh(self):
+        """
+        Index rows added to the file after it was opened, while a task is still running.
+
+        Returns
+        --------
+            bool
+                True if new rows are found
+        """
+        updated = self._scan(self._indexed_size)
+        if updated:
+            if self.use_index_file:
+                self._save_index()
+            self.close()
+            self._open()
+        return updated
+
+    def _scan(self, start_offset):
+        """
+        Scan the file from start_offset and index complete lines only.
+        """
+        size = os.path.getsize(self.file_name)
+        if size < start_offset:
+            # The file is not the one indexed before
+            self.tables = {}
+            self.json_dict = {}
+            start_offset = 0
+        if size == start_offset:
+            return False
+
+        json_name = None
+        offset = start_offset
+        with open(self.file_name, 'rb') as f:
+            f.seek(start_offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # A partially written line will be indexed later
+                if line.startswith(TableDataPrefix):
+                    self._index_data_line(line, offset)
+                elif json_name is not None:
+                    try:
+                        self.json_dict[json_name] = json.loads(line)
+                    except ValueError:
+                        logger.error('Invalid JSON block: {}'.format(json_name))
+                    json_name = None
+                elif line.startswith(JsonEndPrefix):
+                    pass
+                elif line.startswith(JsonStartPrefix):
+                    json_name = line[len(JsonStartPrefix):].strip().decode()[:-3]
+                elif line.startswith(TableNamePrefix):
+                    index, name = self._split_prefix(line)
+                    table = ArchiveTable(index, name.decode().strip())
+                    table.info = self.json_dict.get(table.name, {})
+                    self.tables[index] = table
+                elif line.startswith(TableHeaderPrefix):
+                    index, header = self._split_prefix(line)
+                    table = self.tables[index]
+                    table.header = [h.strip() for h in header.decode().split(',')]
+                    table.is_datetime = table.header[0] == DateTimeHeader
+                offset += len(line)
+
+        self._indexed_size = offset
+        updated = False
+        for table in self.tables.values():
+            updated = table.commit_rows() or updated
+        return updated
+
+    @staticmethod
+    def _split_prefix(line):
+        prefix, _, rest = line[3:].partition(b',')
+        return int(prefix), rest
+
+    def _index_data_line(self, line, offset):
+        index, rest = self._split_prefix(line)
+        table = self.tables.get(index)
+        if table is None:
+            return
+        table.add_row(offset, self._parse_time(rest.split(b',', 1)[0], table.is_datetime))
+
+    @staticmethod
+    def _parse_time(field, is_datetime):
+        try:
+            if is_datetime:
+                ms = np.datetime64(field.strip().decode()).astype('datetime64[ms]').astype(np.int64)
+                return ms / 1000.0
+            return float(field)
+        except ValueError:
+            return np.nan
+
+    def _load_index(self):
+        if not os.path.exists(self.index_file_name):
+            return False
+        try:
+            with np.load(self.index_file_name, allow_pickle=False) as f:
+                meta = json.loads(str(f['meta']))
+                if meta['version'] != IndexVersion:
+                    return False
+                tables = {}
+                for d in meta['tables']:
+                    table = ArchiveTable(d['index'], d['name'])
+                    table.header = d['header']
+                    table.info = d['info']
+                    table.is_datetime = d['is_datetime']
+                    table.offsets = f['offsets_{}'.format(table.index)]
+                    table.times = f['times_{}'.format(table.index)]
+                    tables[table.index] = table
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning('Index file {} is ignored: {}'.format(self.index_file_name, e))
+            return False
+
+        self.tables = tables
+        self.json_dict = meta['json']
+        self._indexed_size = meta['indexed_size']
+        return True
+
+    def _save_index(self):
+        meta = {
+            'version': IndexVersion,
+            'indexed_size': self._indexed_size,
+            'tables': [table.get_meta() for table in self.tables.values()],
+            'json': self.json_dict,
+        }
+        arrays = {}
+        for table in self.tables.values():
+            arrays['offsets_{}'.format(table.index)] = table.offsets
+            arrays['times_{}'.format(table.index)] = table.times
+        try:
+            with open(self.index_file_name, 'wb') as f:
+                np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        except OSError as e:
+            logger.warning('Failed to save index file {}: {}'.format(self.index_file_name, e))
+
+    def get_table_names(self):
+        """
+        Get names of tables in the data file
+        """
+        return [table.name for table in self.tables.values()]
+
+    def get_table(self, name):
+        """
+        Get the ArchiveTable instance with the name
+        """
+        for table in self.tables.values():
+            if table.name == name:
+                return table
+        raise KeyError('Invalid table name: {}'.format(name))
+
+    def get_row_count(self, name):
+        return len(self.get_table(name))
+
+    def _to_time(self, table, value):
+        """
+        Convert a time slice boundary to the time unit used in the table index.
+
+        For a 'Date time' table, a datetime, numpy.datetime64 or an ISO format string
+        can be used. A number is taken as seconds from the first row.
+        """
+        if isinstance(value, (int, float, np.integer, np.floating)):
+            if table.is_datetime and len(table.times):
+                return table.times[0] + float(value)
+            return float(value)
+        if isinstance(value, datetime):
+            value = np.datetime64(value)
+        ms = np.datetime64(value).astype('datetime64[ms]').astype(np.int64)
+        return ms / 1000.0
+
+    def _get_row_range(self, table, start, stop):
+        first = 0
+        last = len(table.times)
+        if start is not None:
+            first = int(np.searchsorted(table.times, self._to_time(table, start), 'left'))
+        if stop is not None:
+            last = int(np.searchsorted(table.times, self._to_time(table, stop), 'right'))
+        return first, max(first, last)
+
+    def _get_column_positions(self, table, columns):
+        if columns is None:
+            return list(range(len(table.columns)))
+        labels = [str(c).strip() for c in columns]
+        try:
+            return [table.columns.index(label) for label in labels]
+        except ValueError:
+            raise KeyError('Invalid columns {} for table "{}"'.format(columns, table.name))
+
+    def _read_line(self, offset):
+        if self._map is not None:
+            end = self._map.find(b'\n', offset)
+            return self._map[offset:end]
+        self._file.seek(offset)
+        return self._file.readline()
+
+    def _read_rows(self, table, first, last, positions):
+        rows = []
+        for offset in table.offsets[first:last]:
+            # fields[0] is 'TD:n' and fields[1] is the time column
+            fields = self._read_line(offset).split(b',')
+            rows.append([fields[p + 2] for p in positions])
+        if not rows:
+            return np.zeros((0, len(positions)), dtype=np.float64)
+        return np.array(rows, dtype=np.float64)
+
+    def _convert_times(self, table, times):
+        if table.is_datetime:
+            return np.round(times * 1000.0).astype(np.int64).astype('datetime64[ms]')
+        return times.copy()
+
+    def read_table(self, name, start=None, stop=None, columns=None):
+        """
+        Read rows of a table within a time slice.
+
+        Parameters
+        -----------
+            name: str
+                table name
+            start: float or datetime, optional
+                beginning of the time slice. If None, from the first row
+            stop: float or datetime, optional
+                end of the time slice, inclusive. If None, to the last row
+            columns: list, optional
+                column labels to read. If None, all columns are read
+
+        Returns
+        --------
+            tuple
+                (time array, 2D data array with a row for each time)
+        """
+        table = self.get_table(name)
+        positions = self._get_column_positions(table, columns)
+        first, last = self._get_row_range(table, start, stop)
+        data = self._read_rows(table, first, last, positions)
+        return self._convert_times(table, table.times[first:last]), data
+
+    def iter_chunks(self, name, chunk_size=1000, start=None, stop=None, columns=None):
+        """
+        Iterate over rows of a table in chunks of fixed number of rows
+        for processing a table larger than memory.
+
+        Yields
+        --------
+            tuple
+                (time array, 2D data array) with up to chunk_size rows
+        """
+        if chunk_size < 1:
+            raise ValueError('Invalid chunk size: {}'.format(chunk_size))
+        table = self.get_table(name)
+        positions = self._get_column_positions(table, columns)
+        first, last = self._get_row_range(table, start, stop)
+        for index in range(first, last, chunk_size):
+            end = min(index + chunk_size, last)
+            yield self._convert_times(table, table.times[index:end]), \
+                self._read_rows(table, index, end, positions)
+
+    def get_spectra(self, name, start=None, stop=None, mass_range=None):
+        """
+        Read spectra saved by an analog or histogram scan plot
+
+        Parameters
+        -----------
+            name: str
+                table name, which is the plot name
+            start, stop: float or datetime, optional
+                time slice
+            mass_range: tuple, optional
+                (initial_mass, final_mass) to read. If None, the whole mass axis is read
+
+        Returns
+        --------
+            tuple
+                (time array, mass axis array, 2D spectra array with a spectrum for each row)
+        """
+        table = self.get_table(name)
+        mass_axis = table.get_mass_axis()
+        if mass_range is None:
+            selected = np.arange(len(mass_axis))
+        else:
+            selected = np.where((mass_axis >= mass_range[0]) & (mass_axis <= mass_range[1]))[0]
+        columns = [table.columns[i] for i in selected]
+        times, spectra = self.read_table(name, start, stop, columns)
+        return times, mass_axis[selected], spectra
+
+    def get_pvst(self, name, start=None, stop=None, masses=None):
+        """
+        Read P vs T data saved by a time plot
+
+        Parameters
+        -----------
+            name: str
+                table name, which is the plot name
+            start, stop: float or datetime, optional
+                time slice
+            masses: list, optional
+                masses, or gas names for a composition analysis table, to read.
+                If None, all the columns are read.
+
+        Returns
+        --------
+            tuple
+                (time array, 2D data array with a column for each mass, list of column labels)
+        """
+        table = self.get_table(name)
+        labels = table.columns if masses is None else [str(m).strip() for m in masses]
+        times, data = self.read_table(name, start, stop, labels)
+        return times, data, labels
@@ -0,0 +1,202 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to average spectra over repeated scans.
+
+SpectrumAverager accumulates spectra in place as they are measured, with a running mean,
+exponential moving average (EMA) or median over a window of the latest scans kept
+in a preallocated stack. It estimates the noise of each point online, and
+can stop scanning when the signal-to-noise ratio of chosen peaks reaches a target.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga.data.averaging import SpectrumAverager
+
+        rga.scan.set_parameters(1, 50, 3, 10)
+        mass_axis = rga.scan.get_mass_axis(True)
+
+        averager = SpectrumAverager(len(mass_axis), mode='mean')
+        averager.set_target_snr(100.0, [18, 28], mass_axis)
+        spectrum = averager.run(rga.scan.get_analog_scan, max_scans=50)
+        print(averager.count, averager.get_snr())
+"""
+
+import numpy as np
+
+ModeMean = 'mean'
+ModeEma = 'ema'
+ModeMedian = 'median'
+Modes = (ModeMean, ModeEma, ModeMedian)
+
+# Standard error of the median relative to that of the mean for normal distribution
+MedianErrorRatio = 1.2533
+
+
+class SpectrumAverager:
+    """
+    Class to average spectra with the same number of points
+
+    parameters
+    -----------
+
+        points: int
+            number of points in a spectrum
+        mode: str, optional
+            'mean', 'ema' or 'median'
+        window: int, optional
+            number of the latest spectra kept in the stack for median
+        alpha: float, optional
+            weight of a new spectrum for EMA
+    """
+
+    def __init__(self, points, mode=ModeMean, window=10, alpha=0.1):
+        if mode not in Modes:
+            raise ValueError('Invalid mode: {} not in {}'.format(mode, Modes))
+        if window < 1 or not 0.0 < alpha <= 1.0:
+            raise ValueError('Invalid window: {} or alpha: {}'.format(window, alpha))
+        self.points = points
+        self.mode = mode
+        self.window = window
+        self.alpha = alpha
+
+        self.average = np.zeros(points)
+        # Running mean and sum of squared deviations for noise estimate in mean and EMA modes
+        self._mean = self.average if mode == ModeMean else np.zeros(points)
+        self._m2 = np.zeros(points)
+        self._delta = np.zeros(points)
+        self._stack = np.zeros((window, points)) if mode == ModeMedian else None
+        self._stack_index = 0
+        self.count = 0
+
+        self.target_snr = None
+        self._peak_regions = []
+
+    def reset(self):
+        self.average[:] = 0.0
+        self._mean[:] = 0.0
+        self._m2[:] = 0.0
+        self._stack_index = 0
+        self.count = 0
+
+    def add(self, spectrum):
+        """
+        Add a spectrum and update the average in place
+
+        :return: the current average
+        :rtype: NumPy array
+        """
+        y = np.asarray(spectrum, dtype=np.double)
+        if y.shape != (self.points,):
+            raise ValueError('Spectrum with {} points, not {}'.format(y.shape, self.points))
+        self.count += 1
+        if self.mode != ModeMedian:
+            # Welford's algorithm
+            np.subtract(y, self._mean, out=self._delta)
+            self._mean += self._delta / self.count
+            self._m2 += self._delta * (y - self._mean)
+        if self.mode == ModeEma:
+            if self.count == 1:
+                self.average[:] = y
+            else:
+                np.subtract(y, self.average, out=self._delta)
+                self.average += self.alpha * self._delta
+        elif self.mode == ModeMedian:
+            self._stack[self._stack_index] = y
+            self._stack_index = (self._stack_index + 1) % self.window
+            n = min(self.count, self.window)
+            np.median(self._stack[:n], axis=0, out=self.average)
+        return self.average
+
+    def get_average(self):
+        return self.average
+
+    def get_noise(self):
+        """
+        Estimate the standard deviation of a single scan for each point
+
+        :rtype: NumPy array, NaN before two scans are added
+        """
+        if self.count < 2:
+            return np.full(self.points, np.nan)
+        if self.mode != ModeMedian:
+            return np.sqrt(self._m2 / (self.count - 1))
+        n = min(self.count, self.window)
+        return np.std(self._stack[:n], axis=0, ddof=1)
+
+    def get_error(self):
+        """
+        Estimate the standard error of the average for each point
+
+        :rtype: NumPy array
+        """
+        noise = self.get_noise()
+        if self.mode == ModeMean:
+            return noise / np.sqrt(self.count)
+        if self.mode == ModeEma:
+            effective_count = min(self.count, (2.0 - self.alpha) / self.alpha)
+            return noise / np.sqrt(effective_count)
+        return MedianErrorRatio * noise / np.sqrt(min(self.count, self.window))
+
+    def set_target_snr(self, snr, masses, mass_axis, half_width=0.5):
+        """
+        Set the target signal-to-noise ratio for peaks
+
+        :param float snr: target SNR
+        :param list masses: masses of the peaks to check
+        :param mass_axis: mass axis of the spectra
+        :param float half_width: peak region around each mass in AMU
+        """
+        x = np.asarray(mass_axis)
+        self._peak_regions = []
+        for mass in masses:
+            region = np.flatnonzero(np.abs(x - mass) <= half_width)
+            if len(region) == 0:
+                raise ValueError('Mass {} is out of the mass axis'.format(mass))
+            self._peak_regions.append(region)
+        self.target_snr = snr
+
+    def get_snr(self):
+        """
+        SNR of each peak at the maximum of the average in its region
+
+        :rtype: NumPy array
+        """
+        error = self.get_error()
+        snr = np.zeros(len(self._peak_regions))
+        for i, region in enumerate(self._peak_regions):
+            index = region[np.argmax(self.average[region])]
+            if error[index] > 0:
+                snr[i] = self.average[index] / error[index]
+            elif self.count >= 2:
+                snr[i] = np.inf  # no noise observed
+        return snr
+
+    def is_target_reached(self):
+        if self.target_snr is None or not self._peak_regions or self.count < 2:
+            return False
+        return bool(np.all(self.get_snr() >= self.target_snr))
+
+    def run(self, scan_function, max_scans=100, min_scans=2, stop_function=None):
+        """
+        Run scans until the target SNR is reached or max_scans scans are added
+
+        :param scan_function: function returning a spectrum, i.e., rga.scan.get_analog_scan
+        :param int max_scans: maximum number of scans
+        :param int min_scans: minimum number of scans
+        :param stop_function: optional function returning True to stop scanning,
+                              i.e., lambda: not task.is_running()
+        :return: the average
+        :rtype: NumPy array
+        """
+        for i in range(max_scans):
+            if callable(stop_function) and stop_function():
+                break
+            self.add(scan_function())
+            if self.count >= min_scans and self.is_target_reached():
+                break
+        return self.average
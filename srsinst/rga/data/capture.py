@@ -0,0 +1,309 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to capture data around events at full rate.
+
+EventCapture keeps the latest samples of each channel in a fixed-size pre-trigger ring buffer.
+When a trigger fires, by a channel crossing a threshold or by an external call to trigger(),
+it collects the samples from pre_time seconds before the trigger until post_time seconds after it,
+and passes the captured window to a writer. Only the windows are saved at full resolution,
+while the long-term trend can be kept decimated.
+
+It is fed with P vs T data points from a TimePlot, or with single mass measurements from Scans.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga.data.capture import EventCapture, TaskArchiveWriter
+
+        capture = EventCapture(['2', '18', '28', '44'], pre_time=10.0, post_time=20.0,
+                               writer=TaskArchiveWriter(task))
+        capture.add_threshold_trigger('28', 1e-6)
+        capture.attach_plot(pvst_plot)
+        capture.arm()
+
+        # when a valve opens
+        capture.trigger('Valve opened')
+"""
+
+import time
+import logging
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DateTimeHeader = 'Date time'
+
+
+class CapturedEvent:
+    """
+    Samples captured around a trigger
+
+    attributes
+    -----------
+
+        number: int
+            sequence number of the event, starting from 1
+        reason: str
+            trigger reason
+        trigger_time: float
+            time.time() of the trigger
+        channel_names: list of str
+        times: dict
+            time stamps of the samples with channel names as keys
+        values: dict
+            values of the samples with channel names as keys
+    """
+
+    def __init__(self, number, reason, trigger_time, channel_names, times, values):
+        self.number = number
+        self.reason = reason
+        self.trigger_time = trigger_time
+        self.channel_names = channel_names
+        self.times = times
+        self.values = values
+
+    def get_table(self):
+        """
+        Merge the samples of all channels into a table. Values of channels not measured
+        at a time stamp are NaN.
+
+        :return: (times, data) with data in shape of (len(times), len(channel_names))
+        :rtype: tuple of NumPy arrays
+        """
+        times = np.unique(np.concatenate([self.times[name] for name in self.channel_names]))
+        data = np.full((len(times), len(self.channel_names)), np.nan)
+        for column, name in enumerate(self.channel_names):
+            rows = np.searchsorted(times, self.times[name])
+            data[rows, column] = self.values[name]
+        return times, data
+
+    def get_info(self):
+        return {
+            'type': 'CapturedEvent',
+            'number': self.number,
+            'reason': self.reason,
+            'trigger_time': datetime.fromtimestamp(self.trigger_time).isoformat(),
+        }
+
+
+class TaskArchiveWriter:
+    """
+    Writer to save a captured event as a table in the data file of a task,
+    which can be read back with SessionArchive
+
+    parameters
+    -----------
+
+        task: Task
+            task with a session handler
+        table_prefix: str, optional
+            table name is the prefix followed by the event number
+    """
+
+    def __init__(self, task, table_prefix='Event'):
+        self.task = task
+        self.table_prefix = table_prefix
+
+    def __call__(self, event):
+        name = '{} {}'.format(self.table_prefix, event.number)
+        times, data = event.get_table()
+        self.task.add_dict_to_file(name, event.get_info())
+        self.task.create_table_in_file(name, DateTimeHeader, *event.channel_names)
+        for timestamp, row in zip(times, data):
+            ts = str(np.datetime64(datetime.fromtimestamp(timestamp), 'ms'))
+            self.task.add_to_table_in_file(name, ts, *map(float, row))
+
+
+class _ThresholdTrigger:
+    def __init__(self, channel, level, above):
+        self.channel = channel
+        self.level = level
+        self.above = above
+        self.last_value = None
+
+    def check(self, value):
+        # Fires only on a crossing, not while the value stays beyond the level
+        last_value, self.last_value = self.last_value, value
+        if last_value is None:
+            return False
+        if self.above:
+            return last_value <= self.level < value
+        return last_value >= self.level > value
+
+
+class EventCapture:
+    """
+    Class to capture samples around triggers
+
+    parameters
+    -----------
+
+        channel_names: list
+            names of channels, i.e., mass names of a P vs T plot, or masses of single mass measurements.
+            Names are converted to str, so that int masses from Scans match with mass names.
+        pre_time: float, optional
+            seconds to capture before a trigger
+        post_time: float, optional
+            seconds to capture after a trigger
+        capacity: int, optional
+            size of the pre-trigger ring buffer for each channel. It should hold
+            the samples of pre_time seconds at the full rate.
+        writer: function(CapturedEvent), optional
+            called with a captured event, i.e., TaskArchiveWriter
+        auto_rearm: bool, optional
+            If True, triggers are armed again after an event is captured
+    """
+
+    def __init__(self, channel_names, pre_time=10.0, post_time=10.0, capacity=1000,
+                 writer=None, auto_rearm=True):
+        self.channel_names = [str(name).strip() for name in channel_names]
+        self._channel_index = {name: index for index, name in enumerate(self.channel_names)}
+        self.pre_time = pre_time
+        self.post_time = post_time
+        self.capacity = capacity
+        self.writer = writer if callable(writer) else None
+        self.auto_rearm = auto_rearm
+        self.triggers = []
+        self.callbacks = []
+
+        channels = len(self.channel_names)
+        self._ring_times = np.zeros((channels, capacity))
+        self._ring_values = np.zeros((channels, capacity))
+        self._ring_index = np.zeros(channels, dtype=np.intp)
+        self._ring_count = np.zeros(channels, dtype=np.intp)
+
+        self.armed = False
+        self._capturing = None  # [reason, trigger_time, times lists, values lists]
+        self.event_count = 0
+        self.sample_count = 0
+
+    def add_threshold_trigger(self, channel, level, above=True):
+        """
+        Add a trigger firing when a channel crosses the level upward, or downward if above is False
+        """
+        channel = str(channel).strip()
+        if channel not in self._channel_index:
+            raise KeyError('Unknown channel {}'.format(channel))
+        trigger = _ThresholdTrigger(channel, level, above)
+        self.triggers.append(trigger)
+        return trigger
+
+    def add_callback(self, callback):
+        """
+        Add a function(CapturedEvent) called when an event is captured
+        """
+        if callable(callback):
+            self.callbacks.append(callback)
+
+    def attach_plot(self, time_plot):
+        """
+        Feed with every data point added to a TimePlot
+        """
+        time_plot.add_listener(self.add)
+
+    def attach_scans(self, scans):
+        """
+        Feed with every single mass measurement of a Scans component.
+        channel_names should be the masses measured, as int or str.
+        """
+        scans.add_mass_listener(self.add_sample)
+
+    def arm(self):
+        self.armed = True
+
+    def disarm(self):
+        self.armed = False
+
+    def is_capturing(self):
+        return self._capturing is not None
+
+    def trigger(self, reason='External', trigger_time=None):
+        """
+        Start capturing with an external trigger. It is ignored if a capture is in progress.
+
+        :return: True if capture started
+        """
+        if self._capturing is not None:
+            return False
+        if trigger_time is None:
+            trigger_time = time.time()
+        times = {}
+        values = {}
+        for name, channel in self._channel_index.items():
+            count = self._ring_count[channel]
+            order = np.arange(self._ring_index[channel] - count, self._ring_index[channel]) % self.capacity
+            t = self._ring_times[channel, order]
+            selected = t >= trigger_time - self.pre_time
+            times[name] = list(t[selected])
+            values[name] = list(self._ring_values[channel, order][selected])
+        self._capturing = [reason, trigger_time, times, values]
+        return True
+
+    def add(self, values, timestamp=None):
+        """
+        Add values of all channels measured at the same time
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        for name, value in zip(self.channel_names, values):
+            self._add(name, value, timestamp)
+        self._check_capture_end(timestamp)
+
+    def add_sample(self, channel, value, timestamp=None):
+        """
+        Add a value of a channel. Samples of channels not in channel_names are ignored.
+        """
+        channel = str(channel)
+        if channel not in self._channel_index:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        self._add(channel, value, timestamp)
+        self._check_capture_end(timestamp)
+
+    def _add(self, name, value, timestamp):
+        channel = self._channel_index[name]
+        index = self._ring_index[channel]
+        self._ring_times[channel, index] = timestamp
+        self._ring_values[channel, index] = value
+        self._ring_index[channel] = (index + 1) % self.capacity
+        self._ring_count[channel] = min(self._ring_count[channel] + 1, self.capacity)
+        self.sample_count += 1
+
+        # Every trigger sees every sample, so that a crossing is found from the last value
+        # even right after a capture ends.
+        crossed = [trigger for trigger in self.triggers
+                   if trigger.channel == name and trigger.check(value)]
+
+        if self._capturing is not None:
+            self._capturing[2][name].append(timestamp)
+            self._capturing[3][name].append(value)
+            return
+
+        if crossed and self.armed:
+            self.trigger('{} crossed {:.3e}'.format(name, crossed[0].level), timestamp)
+
+    def _check_capture_end(self, timestamp):
+        if self._capturing is None:
+            return
+        reason, trigger_time, times, values = self._capturing
+        if timestamp < trigger_time + self.post_time:
+            return
+        self._capturing = None
+        self.event_count += 1
+        event = CapturedEvent(self.event_count, reason, trigger_time, self.channel_names,
+                              {name: np.array(times[name]) for name in self.channel_names},
+                              {name: np.array(values[name]) for name in self.channel_names})
+        self.armed = self.auto_rearm
+        for function in ([self.writer] if self.writer else []) + self.callbacks:
+            try:
+                function(event)
+            except Exception as e:
+                logger.error('Event capture output error: {}: {}'.format(e.__class__.__name__, e))
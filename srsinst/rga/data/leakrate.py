@@ -0,0 +1,246 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to estimate rate of rise of ion intensities while they are measured.
+
+RateOfRiseEstimator keeps a linear regression over a sliding time window for each mass,
+updated in O(1) with running sums as each single mass measurement arrives,
+and reports slope, intercept and R-squared with every sample.
+With the chamber volume, the slope is converted to a leak rate.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga.data.leakrate import RateOfRiseEstimator
+
+        calibration = rga.pressure.get_calibration()
+        estimator = RateOfRiseEstimator(window=60.0,
+                                        conversion_factor=calibration.partial_pressure_factor,
+                                        volume=10.0)  # liter
+        estimator.attach(rga.scan)
+
+        while True:
+            rga.scan.get_multiple_mass_scan([4, 28, 32, 40])
+            result = estimator.get_result(4)
+            print('He rate of rise: {:.3e} Torr/s, leak rate: {:.3e} Torr L/s'
+                  .format(result.slope, result.leak_rate))
+"""
+
+import time
+import math
+from collections import deque, namedtuple
+
+RateOfRiseResult = namedtuple('RateOfRiseResult',
+                              ('mass', 'slope', 'intercept', 'r_squared', 'count', 'timestamp', 'leak_rate'))
+"""
+Result of the regression for a mass. slope is in the converted unit per second, and intercept
+is the fitted value at the origin time of the estimator. leak_rate is slope times volume,
+or None without the volume.
+"""
+
+# Running sums are recalculated from the window after this many updates, to limit round-off drift.
+RecalculationPeriod = 10000
+
+
+class SlidingRegression:
+    """
+    Linear regression of (t, y) over a sliding time window with running sums
+
+    parameters
+    -----------
+
+        window: float
+            time window in seconds
+        max_samples: int, optional
+            maximum number of samples in the window
+    """
+
+    def __init__(self, window, max_samples=100000):
+        self.window = window
+        self.samples = deque(maxlen=max_samples)
+        self._update_count = 0
+        self._reset_sums()
+
+    def _reset_sums(self):
+        self.n = 0
+        self.st = 0.0
+        self.sy = 0.0
+        self.stt = 0.0
+        self.sty = 0.0
+        self.syy = 0.0
+
+    def _add_to_sums(self, t, y, sign):
+        self.n += sign
+        self.st += sign * t
+        self.sy += sign * y
+        self.stt += sign * t * t
+        self.sty += sign * t * y
+        self.syy += sign * y * y
+
+    def add(self, t, y):
+        if len(self.samples) == self.samples.maxlen:
+            old_t, old_y = self.samples[0]
+            self._add_to_sums(old_t, old_y, -1)
+        self.samples.append((t, y))
+        self._add_to_sums(t, y, 1)
+
+        limit = t - self.window
+        while self.samples and self.samples[0][0] < limit:
+            old_t, old_y = self.samples.popleft()
+            self._add_to_sums(old_t, old_y, -1)
+
+        self._update_count += 1
+        if self._update_count >= RecalculationPeriod:
+            self.recalculate()
+
+    def recalculate(self):
+        """
+        Recalculate the running sums from the samples in the window
+        """
+        self._reset_sums()
+        for t, y in self.samples:
+            self._add_to_sums(t, y, 1)
+        self._update_count = 0
+
+    def set_window(self, window):
+        self.window = window
+
+    def get_fit(self):
+        """
+        :return: (slope, intercept, r_squared). NaN if not enough samples for a fit
+        :rtype: tuple
+        """
+        n = self.n
+        if n < 2:
+            return math.nan, math.nan, math.nan
+        t_variance = n * self.stt - self.st * self.st
+        if t_variance <= 0:
+            return math.nan, math.nan, math.nan
+        covariance = n * self.sty - self.st * self.sy
+        slope = covariance / t_variance
+        intercept = (self.sy - slope * self.st) / n
+        y_variance = n * self.syy - self.sy * self.sy
+        if y_variance <= 0:
+            r_squared = math.nan
+        else:
+            r_squared = min(1.0, covariance * covariance / (t_variance * y_variance))
+        return slope, intercept, r_squared
+
+
+class RateOfRiseEstimator:
+    """
+    Class to estimate rate of rise for multiple masses from single mass measurements
+
+    parameters
+    -----------
+
+        window: float, optional
+            default time window of the regression in seconds
+        conversion_factor: float, optional
+            multiplied to the intensities in 0.1 fA unit, i.e.,
+            the partial pressure factor of PressureCalibration to get rate of rise in Torr/s
+        volume: float, optional
+            chamber volume to calculate leak rate from rate of rise
+        min_samples: int, optional
+            minimum number of samples in the window to report a result
+        callback: function(RateOfRiseResult), optional
+            called with the result of every sample
+    """
+
+    def __init__(self, window=60.0, conversion_factor=1.0, volume=None, min_samples=3, callback=None):
+        self.window = window
+        self.conversion_factor = conversion_factor
+        self.volume = volume
+        self.min_samples = max(2, min_samples)
+        self.callback = callback if callable(callback) else None
+        self.origin = None
+        self.regressions = {}
+        self.results = {}
+        self._scans = None
+
+    def set_window(self, window, mass=None):
+        """
+        Set the time window for a mass, or for all masses if mass is None
+        """
+        if mass is None:
+            self.window = window
+            for regression in self.regressions.values():
+                regression.set_window(window)
+        else:
+            self._get_regression(mass).set_window(window)
+
+    def _get_regression(self, mass):
+        regression = self.regressions.get(mass)
+        if regression is None:
+            regression = SlidingRegression(self.window)
+            self.regressions[mass] = regression
+        return regression
+
+    def attach(self, scans):
+        """
+        Update with every single mass measurement of a Scans component,
+        including those in multiple mass scans
+        """
+        self.detach()
+        scans.add_mass_listener(self.add_sample)
+        self._scans = scans
+
+    def detach(self):
+        if self._scans is not None:
+            self._scans.remove_mass_listener(self.add_sample)
+            self._scans = None
+
+    def reset(self, mass=None):
+        if mass is None:
+            self.regressions = {}
+            self.results = {}
+            self.origin = None
+        else:
+            self.regressions.pop(mass, None)
+            self.results.pop(mass, None)
+
+    def add_sample(self, mass, intensity, timestamp=None):
+        """
+        Add a measurement and update the regression for the mass
+
+        :return: updated result, or None if not enough samples yet
+        :rtype: RateOfRiseResult
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if self.origin is None:
+            self.origin = timestamp
+        regression = self._get_regression(mass)
+        regression.add(timestamp - self.origin, intensity * self.conversion_factor)
+        if regression.n < self.min_samples:
+            return None
+
+        slope, intercept, r_squared = regression.get_fit()
+        leak_rate = None if self.volume is None else slope * self.volume
+        result = RateOfRiseResult(mass, slope, intercept, r_squared, regression.n, timestamp, leak_rate)
+        self.results[mass] = result
+        if self.callback:
+            self.callback(result)
+        return result
+
+    def add_samples(self, masses, intensities, timestamp=None):
+        """
+        Add measurements of multiple masses taken at the same time
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        return [self.add_sample(mass, intensity, timestamp) for mass, intensity in zip(masses, intensities)]
+
+    def get_result(self, mass):
+        """
+        :return: the latest result for the mass, or None
+        :rtype: RateOfRiseResult
+        """
+        return self.results.get(mass)
+
+    def get_results(self):
+        return dict(self.results)
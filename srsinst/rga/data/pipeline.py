@@ -0,0 +1,263 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to run analysis of completed scans off the acquisition thread.
+
+Scans calls the scan_finished callback in the thread running the scan,
+and the next scan does not start until the callback returns.
+AnalysisPipeline takes a SpectrumSnapshot of a completed scan into a bounded queue
+and returns immediately. Worker threads, or a process pool, run the analysis stages
+and deliver the results with a callback, or keep the latest results for take_result().
+If the analysis falls behind, the oldest snapshot waiting in the queue is dropped,
+instead of stalling acquisition.
+
+Matplotlib artists should not be changed in a worker thread. To plot the results,
+call take_result() in the thread that draws, i.e., in the scan callbacks of the task.
+Call wait() before taking the results of the last scan.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga.data.pipeline import AnalysisPipeline
+        from srsinst.rga.plots.analysis import calculate_baseline
+
+        def baseline_stage(snapshot, results):
+            return calculate_baseline(snapshot.spectrum)
+
+        def peak_stage(snapshot, results):
+            y = snapshot.spectrum - results['baseline']
+            return snapshot.mass_axis[y.argmax()]
+
+        pipeline = AnalysisPipeline({'baseline': baseline_stage, 'peak': peak_stage})
+        rga.scan.set_callbacks(None, None, lambda: pipeline.submit(rga.scan.get_snapshot()))
+        for i in range(10):
+            rga.scan.get_analog_scan()
+            latest = pipeline.take_result()
+            if latest:
+                snapshot, results = latest
+                print(snapshot.sequence, results['peak'])
+        pipeline.stop()
+"""
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+AnalysisWaitTime = 5.0  # seconds to wait for the analysis of the last scan at cleanup
+
+
+def run_stages(stages, snapshot):
+    """
+    Run analysis stages in order. Each stage is called with the snapshot and
+    a dict of results from the previous stages.
+
+    Parameters
+    -----------
+        stages: dict
+            stage functions, function(snapshot, results) with stage names as keys
+        snapshot: SpectrumSnapshot
+            completed scan to analyze
+
+    Returns
+    --------
+        dict
+            results of the stages with stage names as keys
+    """
+    results = {}
+    for name, stage in stages.items():
+        results[name] = stage(snapshot, results)
+    return results
+
+
+class AnalysisPipeline:
+    """
+    Class to run analysis stages on completed scans in worker threads or a process pool
+
+    parameters
+    -----------
+
+        stages: dict
+            stage functions, function(snapshot, results) with stage names as keys.
+            Stage functions should be picklable module-level functions, if use_process is True.
+
+        result_callback: function(snapshot, results), optional
+            called in a worker thread with the snapshot and a dict of stage results.
+            Results older than the ones already delivered are dropped.
+            Without it, get the results with take_result().
+
+        queue_size: int, optional
+            maximum number of snapshots waiting for analysis
+
+        workers: int, optional
+            number of worker threads
+
+        use_process: bool, optional
+            If True, the stages run in a process pool to avoid contention for the GIL
+            with the acquisition thread
+
+        error_logger: logging.Logger, optional
+            logger to report analysis errors, i.e., the logger of the task
+    """
+
+    def __init__(self, stages, result_callback=None, queue_size=1, workers=1, use_process=False,
+                 error_logger=logger):
+        if queue_size < 1 or workers < 1:
+            raise ValueError('Invalid queue_size: {} or workers: {}'.format(queue_size, workers))
+        self.stages = dict(stages)
+        self.result_callback = result_callback if callable(result_callback) else None
+        self.workers = workers
+        self.use_process = use_process
+        self.error_logger = error_logger
+
+        self._queue = deque(maxlen=queue_size)
+        self._condition = threading.Condition()
+        self._delivery_lock = threading.Lock()
+        self._threads = []
+        self._executor = None
+        self._running = False
+        self._last_delivered = None
+        self._latest_result = None
+        self._active_count = 0  # snapshots being analyzed
+
+        self.submitted_count = 0
+        self.processed_count = 0
+        self.dropped_count = 0
+        self.error_count = 0
+
+    def start(self):
+        """
+        Start worker threads. submit() starts them, if not started yet.
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            if self.use_process:
+                self._executor = ProcessPoolExecutor(self.workers)
+            self._threads = [threading.Thread(target=self._run, daemon=True)
+                             for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop worker threads. Snapshots waiting in the queue are discarded.
+        """
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self.dropped_count += len(self._queue)
+            self._queue.clear()
+            self._condition.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def is_running(self):
+        return self._running
+
+    def submit(self, snapshot):
+        """
+        Queue a snapshot for analysis without blocking.
+
+        Returns
+        --------
+            bool
+                False if the oldest snapshot in the full queue was dropped
+        """
+        if not self._running:
+            self.start()
+        with self._condition:
+            dropped = len(self._queue) == self._queue.maxlen
+            if dropped:
+                self.dropped_count += 1
+            self._queue.append(snapshot)
+            self.submitted_count += 1
+            self._condition.notify()
+        return not dropped
+
+    def take_result(self):
+        """
+        Take the latest results delivered, if not taken yet
+
+        Returns
+        --------
+            tuple or None
+                (snapshot, results), or None if no new results are delivered
+        """
+        with self._delivery_lock:
+            latest, self._latest_result = self._latest_result, None
+        return latest
+
+    def get_pending_count(self):
+        with self._condition:
+            return len(self._queue)
+
+    def wait(self, timeout=None):
+        """
+        Wait until all the snapshots submitted are analyzed, i.e., before taking
+        the results of the last scan with take_result()
+
+        Returns
+        --------
+            bool
+                False on timeout
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue and self._active_count == 0, timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                snapshot = self._queue.popleft()
+                self._active_count += 1
+            try:
+                self._analyze(snapshot)
+            finally:
+                with self._condition:
+                    self._active_count -= 1
+                    self._condition.notify_all()
+
+    def _analyze(self, snapshot):
+        try:
+            if self._executor is not None:
+                results = self._executor.submit(run_stages, self.stages, snapshot).result()
+            else:
+                results = run_stages(self.stages, snapshot)
+        except Exception as e:
+            self.error_count += 1
+            self.error_logger.error('Analysis of scan {} failed: {}: {}'
+                                    .format(snapshot.sequence, e.__class__.__name__, e))
+            return
+        self._deliver(snapshot, results)
+
+    def _deliver(self, snapshot, results):
+        with self._delivery_lock:
+            if self._last_delivered is not None and snapshot.sequence <= self._last_delivered:
+                self.dropped_count += 1  # A newer scan is already delivered
+                return
+            self._last_delivered = snapshot.sequence
+            self.processed_count += 1
+            self._latest_result = (snapshot, results)
+            if self.result_callback and self._running:
+                try:
+                    self.result_callback(snapshot, results)
+                except Exception as e:
+                    self.error_count += 1
+                    self.error_logger.error('Result callback error: {}: {}'.format(e.__class__.__name__, e))
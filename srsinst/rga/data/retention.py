@@ -0,0 +1,381 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to keep long-running partial pressure trends with bounded memory.
+
+RetentionStore ingests an intensity vector, one value for each mass or gas,
+every measurement cycle. Raw samples are kept only for a time window, and
+min/max/mean/last rollups are maintained at multiple resolutions in fixed-size rings.
+Memory usage and query cost do not grow with the run time,
+so a P vs T measurement can run for months. The rings are allocated as they fill,
+so a short run uses memory only for the time it has run.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga.data.retention import RetentionStore
+
+        store = RetentionStore(['2', '18', '28', '44'])
+        while running:
+            store.add(rga.scan.get_multiple_mass_scan([2, 18, 28, 44]))
+
+        # 1 minute rollups for the last 24 hours
+        rollup = store.get_rollup(60, time.time() - 86400)
+        print(rollup['time'], rollup['mean'], rollup['max'])
+"""
+
+import time
+import json
+import numpy as np
+
+DefaultResolutions = (1.0, 60.0, 3600.0)  # in seconds
+DefaultBucketCounts = (86400, 44640, 43800)  # 1 day, 31 days and 5 years
+DefaultRawWindow = 3600.0  # in seconds
+DefaultRawCapacity = 100000  # samples
+InitialAllocation = 1024  # rows allocated first, doubled as a ring fills up to its size
+
+
+def _grow(array, rows):
+    grown = np.zeros((rows,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class RawBuffer:
+    """
+    Ring buffer of raw samples that expire after a time window
+
+    parameters
+    -----------
+
+        channels: int
+            number of values in a sample
+        window: float
+            time in seconds to keep a raw sample
+        capacity: int
+            maximum number of samples kept, regardless of the window
+    """
+
+    def __init__(self, channels, window=DefaultRawWindow, capacity=DefaultRawCapacity):
+        self.window = float(window)
+        self.capacity = int(capacity)
+        size = min(self.capacity, InitialAllocation)
+        self.times = np.zeros(size, dtype=np.float64)
+        self.values = np.zeros((size, channels), dtype=np.float64)
+        self._head = 0  # next slot to write
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, timestamp, values):
+        size = len(self.times)
+        if self._count == size and size < self.capacity:
+            self._reallocate(min(2 * size, self.capacity))
+        self.times[self._head] = timestamp
+        self.values[self._head] = values
+        self._head = (self._head + 1) % len(self.times)
+        if self._count < len(self.times):
+            self._count += 1
+        self.expire(timestamp)
+
+    def _reallocate(self, size):
+        # Move the samples in order to the start of larger arrays
+        order = (self._tail() + np.arange(self._count)) % len(self.times)
+        self.times = _grow(self.times[order], size)
+        self.values = _grow(self.values[order], size)
+        self._head = self._count
+
+    def expire(self, now):
+        """
+        Drop samples older than the window from the tail of the ring
+        """
+        limit = now - self.window
+        while self._count > 0 and self.times[self._tail()] < limit:
+            self._count -= 1
+
+    def _tail(self):
+        return (self._head - self._count) % len(self.times)
+
+    def get(self, start=None, stop=None):
+        """
+        Get raw samples within a time slice
+
+        Returns
+        --------
+            tuple
+                (time array, 2D value array with a row for each time)
+        """
+        order = (self._tail() + np.arange(self._count)) % len(self.times)
+        times = self.times[order]
+        first = 0 if start is None else np.searchsorted(times, start, 'left')
+        last = len(times) if stop is None else np.searchsorted(times, stop, 'right')
+        selected = order[first:last]
+        return self.times[selected], self.values[selected]
+
+    def get_start_time(self):
+        if self._count == 0:
+            return None
+        return self.times[self._tail()]
+
+
+class Rollup:
+    """
+    Fixed-size ring of rollup buckets at a time resolution.
+
+    A bucket holds min, max, sum, count and last values of samples within the
+    resolution time. Slots are counted from the first bucket added, and a slot
+    in the ring is reused when the time moves beyond the size of the ring,
+    which expires the oldest bucket.
+
+    parameters
+    -----------
+
+        resolution: float
+            bucket width in seconds
+        size: int
+            number of buckets kept
+        channels: int
+            number of values in a sample
+    """
+
+    def __init__(self, resolution, size, channels):
+        if resolution <= 0 or size < 1:
+            raise ValueError('Invalid rollup resolution: {} or size: {}'.format(resolution, size))
+        self.resolution = float(resolution)
+        self.size = int(size)
+        rows = min(self.size, InitialAllocation)
+        self.bucket_ids = np.full(rows, -1, dtype=np.int64)
+        self.minimum = np.zeros((rows, channels), dtype=np.float64)
+        self.maximum = np.zeros((rows, channels), dtype=np.float64)
+        self.total = np.zeros((rows, channels), dtype=np.float64)
+        self.last = np.zeros((rows, channels), dtype=np.float64)
+        self.count = np.zeros(rows, dtype=np.int64)
+        self.first_bucket = None
+        self.latest_bucket = -1
+
+    def _reallocate(self, rows):
+        added = rows - len(self.bucket_ids)
+        self.bucket_ids = np.concatenate([self.bucket_ids, np.full(added, -1, dtype=np.int64)])
+        for key in ('minimum', 'maximum', 'total', 'last', 'count'):
+            setattr(self, key, _grow(getattr(self, key), rows))
+
+    def _get_slots(self, buckets):
+        return (buckets - self.first_bucket) % self.size
+
+    def add(self, timestamp, values):
+        bucket = int(timestamp // self.resolution)
+        if self.first_bucket is None:
+            self.first_bucket = bucket
+        if bucket <= self.latest_bucket - self.size or bucket < self.first_bucket:
+            return  # already expired, or older than the first bucket
+        slot = self._get_slots(bucket)
+        if slot >= len(self.bucket_ids):
+            self._reallocate(min(max(2 * len(self.bucket_ids), slot + 1), self.size))
+        if self.bucket_ids[slot] != bucket:
+            self.bucket_ids[slot] = bucket
+            self.minimum[slot] = values
+            self.maximum[slot] = values
+            self.total[slot] = values
+            self.last[slot] = values
+            self.count[slot] = 1
+        else:
+            np.minimum(self.minimum[slot], values, out=self.minimum[slot])
+            np.maximum(self.maximum[slot], values, out=self.maximum[slot])
+            self.total[slot] += values
+            self.last[slot] = values
+            self.count[slot] += 1
+        if bucket > self.latest_bucket:
+            self.latest_bucket = bucket
+
+    def get_start_time(self):
+        """
+        Get the start time of the oldest bucket that can be kept
+        """
+        if self.latest_bucket < 0:
+            return None
+        return (self.latest_bucket - self.size + 1) * self.resolution
+
+    def count_buckets(self, start, stop):
+        return int(stop // self.resolution) - int(start // self.resolution) + 1
+
+    def get(self, start=None, stop=None):
+        """
+        Get buckets within a time slice. Only the buckets in the time slice are visited.
+
+        Returns
+        --------
+            dict
+                'time' for start time of buckets, 'min', 'max', 'mean', 'last' for
+                2D arrays with a row for each bucket, and 'count' for number of samples
+        """
+        if self.latest_bucket < 0:
+            ids = np.array([], dtype=np.int64)
+        else:
+            oldest = self.latest_bucket - self.size + 1
+            last = self.latest_bucket if stop is None else min(int(stop // self.resolution),
+                                                                self.latest_bucket)
+            first = oldest if start is None else max(int(start // self.resolution), oldest)
+            ids = np.arange(first, last + 1, dtype=np.int64)
+        slots = self._get_slots(ids) if len(ids) else ids
+        valid = slots < len(self.bucket_ids)
+        valid[valid] = self.bucket_ids[slots[valid]] == ids[valid]
+        slots = slots[valid]
+        count = self.count[slots]
+        return {
+            'time': ids[valid] * self.resolution,
+            'min': self.minimum[slots],
+            'max': self.maximum[slots],
+            'mean': self.total[slots] / count[:, np.newaxis],
+            'last': self.last[slots],
+            'count': count,
+        }
+
+
+class RetentionStore:
+    """
+    Class to keep raw samples for a window and rollups at multiple resolutions
+    for multiple time series.
+
+    parameters
+    -----------
+
+        names: list of str
+            names of values in a sample, such as masses or gas names
+        resolutions: list of float
+            rollup resolutions in seconds
+        bucket_counts: list of int
+            number of buckets kept for each resolution
+        raw_window: float
+            time in seconds to keep raw samples
+        raw_capacity: int
+            maximum number of raw samples kept
+    """
+
+    def __init__(self, names, resolutions=DefaultResolutions, bucket_counts=DefaultBucketCounts,
+                 raw_window=DefaultRawWindow, raw_capacity=DefaultRawCapacity):
+        if len(resolutions) != len(bucket_counts):
+            raise ValueError('Number of resolutions and bucket counts do not match')
+        self.names = [str(name).strip() for name in names]
+        channels = len(self.names)
+        self.raw = RawBuffer(channels, raw_window, raw_capacity)
+        self.rollups = [Rollup(r, n, channels) for r, n in sorted(zip(resolutions, bucket_counts))]
+
+    def add(self, values, timestamp=None):
+        """
+        Add a sample to the raw buffer and the rollups
+
+        Parameters
+        -----------
+            values: list or Numpy array
+                values with the same order as names
+            timestamp: float, optional
+                time in seconds since the epoch. If None, the current time is used
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != (len(self.names),):
+            raise ValueError('Sample size {} does not match with {} names'
+                             .format(values.shape, len(self.names)))
+        self.raw.add(timestamp, values)
+        for rollup in self.rollups:
+            rollup.add(timestamp, values)
+
+    def get_raw(self, start=None, stop=None):
+        """
+        Get raw samples still kept within a time slice
+
+        Returns
+        --------
+            tuple
+                (time array, 2D value array with a column for each name)
+        """
+        return self.raw.get(start, stop)
+
+    def get_rollup(self, resolution, start=None, stop=None):
+        """
+        Get rollups at the resolution within a time slice
+
+        Returns
+        --------
+            dict
+                See Rollup.get()
+        """
+        for rollup in self.rollups:
+            if rollup.resolution == resolution:
+                return rollup.get(start, stop)
+        raise KeyError('No rollup with resolution: {}'.format(resolution))
+
+    def query(self, start, stop=None, max_points=10000):
+        """
+        Get data for a time slice at the finest resolution available
+        with the number of points not exceeding max_points.
+
+        Raw samples are used if they cover the start time. Otherwise,
+        the finest rollup that still keeps the start time is used.
+
+        Returns
+        --------
+            tuple
+                (resolution, data) where resolution is 0 for raw samples, and data is
+                a tuple from get_raw() for raw samples or a dict from get_rollup() for rollups
+        """
+        if stop is None:
+            stop = time.time()
+        raw_start = self.raw.get_start_time()
+        if raw_start is not None and raw_start <= start:
+            times, values = self.raw.get(start, stop)
+            if len(times) <= max_points:
+                return 0, (times, values)
+        for rollup in self.rollups:
+            rollup_start = rollup.get_start_time()
+            if rollup_start is None:
+                break
+            if rollup_start <= start and rollup.count_buckets(start, stop) <= max_points:
+                return rollup.resolution, rollup.get(start, stop)
+        rollup = self.rollups[-1]
+        return rollup.resolution, rollup.get(start, stop)
+
+    def save(self, file_name):
+        """
+        Save raw samples and rollups in a NumPy .npz file
+        """
+        times, values = self.raw.get()
+        arrays = {'raw_times': times, 'raw_values': values}
+        for i, rollup in enumerate(self.rollups):
+            for key in ('bucket_ids', 'minimum', 'maximum', 'total', 'last', 'count'):
+                arrays['{}_{}'.format(key, i)] = getattr(rollup, key)
+        meta = {
+            'names': self.names,
+            'resolutions': [r.resolution for r in self.rollups],
+            'bucket_counts': [r.size for r in self.rollups],
+            'raw_window': self.raw.window,
+            'raw_capacity': self.raw.capacity,
+            'first_buckets': [r.first_bucket for r in self.rollups],
+        }
+        with open(file_name, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Create a RetentionStore instance from a file saved with save()
+        """
+        with np.load(file_name, allow_pickle=False) as f:
+            meta = json.loads(str(f['meta']))
+            store = cls(meta['names'], meta['resolutions'], meta['bucket_counts'],
+                        meta['raw_window'], meta['raw_capacity'])
+            for timestamp, values in zip(f['raw_times'], f['raw_values']):
+                store.raw.add(timestamp, values)
+            first_buckets = meta.get('first_buckets', [0] * len(store.rollups))
+            for i, rollup in enumerate(store.rollups):
+                for key in ('bucket_ids', 'minimum', 'maximum', 'total', 'last', 'count'):
+                    setattr(rollup, key, f['{}_{}'.format(key, i)].copy())
+                rollup.first_bucket = first_buckets[i]
+                rollup.latest_bucket = int(rollup.bucket_ids.max(initial=-1))
+        return store
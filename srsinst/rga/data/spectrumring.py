@@ -0,0 +1,444 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to share completed scans between processes without copying.
+
+SpectrumRing is a ring of fixed-size spectrum slots in a
+`multiprocessing.shared_memory <https://docs.python.org/3/library/multiprocessing.shared_memory.html>`_
+block (Python 3.8 or later). The acquisition process publishes each completed scan
+into the next slot with a sequence number and metadata. Analysis and GUI processes
+attach to the ring by name and read the slots as NumPy views of the shared memory,
+so heavy analysis in other processes does not affect acquisition timing.
+
+A slot is overwritten after the writer goes around the ring.
+A reader should check SpectrumSlot.is_valid() after using the data in a slot,
+or make a copy with SpectrumSlot.copy().
+
+Example
+---------
+    .. code-block:: python
+
+        # Acquisition process
+        from srsinst.rga.data.spectrumring import AcquisitionProcess
+
+        acq = AcquisitionProcess('rga_ring', ('serial', 'COM3', 28800),
+                                 scan_parameters=(1, 50, 3, 10))
+        acq.start()
+
+        # Analysis process
+        from srsinst.rga.data.spectrumring import SpectrumRing
+
+        ring = SpectrumRing.attach('rga_ring')
+        slot = ring.wait_for_next(timeout=30)
+        peak = slot.spectrum.max()
+        if slot.is_valid():
+            print(slot.sequence, peak)
+        ring.close()
+
+        acq.stop()
+"""
+
+import sys
+import time
+import logging
+import multiprocessing
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:  # Python 3.7
+    shared_memory = resource_tracker = None
+
+import numpy as np
+
+from srsinst.rga.instruments.rga100.scans import SpectrumSnapshot
+
+logger = logging.getLogger(__name__)
+
+Magic = 0x52474131  # 'RGA1'
+
+# Header fields
+HeaderMagic = 0
+HeaderSlotCount = 1
+HeaderSlotPoints = 2
+HeaderLatestSequence = 3
+HeaderWriterState = 4
+HeaderSize = 8
+
+# Slot metadata fields
+MetaTimestamp = 0
+MetaScanType = 1
+MetaPoints = 2
+MetaTotalCurrent = 3
+MetaSize = 4
+
+WriterStopped = 0
+WriterRunning = 1
+WriterFailed = -1
+
+ScanTypes = ['', 'analog_scan', 'histogram_scan', 'multiple_mass_scan', 'single_mass_scan',
+             'segmented_analog_scan', 'coarse_fine_scan']
+SlotWriting = -1
+
+
+def _check_shared_memory():
+    if shared_memory is None:
+        raise RuntimeError('SpectrumRing requires multiprocessing.shared_memory of Python 3.8 or later')
+
+
+class SpectrumSlot:
+    """
+    View of a slot in a SpectrumRing. mass_axis and spectrum are read-only
+    views of the shared memory, valid until the writer reuses the slot.
+    """
+
+    def __init__(self, ring, index, sequence):
+        self._ring = ring
+        self.index = index
+        self.sequence = sequence
+        meta = ring.meta[index]
+        points = int(meta[MetaPoints])
+        self.timestamp = float(meta[MetaTimestamp])
+        self.scan_type = ScanTypes[int(meta[MetaScanType])]
+        self.total_current = int(meta[MetaTotalCurrent])
+        self.mass_axis = ring.mass_axes[index, :points]
+        self.spectrum = ring.spectra[index, :points]
+
+    def is_valid(self):
+        """
+        Check if the slot is not overwritten since it was read
+        """
+        return self._ring.slot_sequences[self.index] == self.sequence
+
+    def copy(self):
+        """
+        Make a SpectrumSnapshot with copies of the data
+
+        Returns None if the slot is overwritten while copying
+        """
+        snapshot = SpectrumSnapshot(self.sequence, self.scan_type, self.mass_axis,
+                                    self.spectrum, self.total_current, self.timestamp)
+        return snapshot if self.is_valid() else None
+
+
+class SpectrumRing:
+    """
+    Ring of fixed-size spectrum slots in shared memory.
+
+    Use SpectrumRing.create() in the writer process, and SpectrumRing.attach()
+    in reader processes.
+    """
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.name = shm.name
+        self.owner = owner
+
+        self.header = np.ndarray((HeaderSize,), dtype=np.int64, buffer=shm.buf)
+        if self.header[HeaderMagic] != Magic:
+            raise ValueError('Shared memory "{}" is not a SpectrumRing'.format(self.name))
+        self.slot_count = int(self.header[HeaderSlotCount])
+        self.slot_points = int(self.header[HeaderSlotPoints])
+
+        offset = self.header.nbytes
+        self.slot_sequences = np.ndarray((self.slot_count,), dtype=np.int64,
+                                         buffer=shm.buf, offset=offset)
+        offset += self.slot_sequences.nbytes
+        self.meta = np.ndarray((self.slot_count, MetaSize), dtype=np.float64,
+                               buffer=shm.buf, offset=offset)
+        offset += self.meta.nbytes
+        self.mass_axes = np.ndarray((self.slot_count, self.slot_points), dtype=np.float64,
+                                    buffer=shm.buf, offset=offset)
+        offset += self.mass_axes.nbytes
+        self.spectra = np.ndarray((self.slot_count, self.slot_points), dtype=np.float64,
+                                  buffer=shm.buf, offset=offset)
+        if not owner:
+            for array in (self.mass_axes, self.spectra):
+                array.setflags(write=False)
+
+    @staticmethod
+    def get_size(slot_count, slot_points):
+        return 8 * (HeaderSize + slot_count * (1 + MetaSize + 2 * slot_points))
+
+    @classmethod
+    def create(cls, slot_count=8, slot_points=8001, name=None):
+        """
+        Create a ring in a new shared memory block
+
+        Parameters
+        -----------
+            slot_count: int
+                number of slots in the ring
+            slot_points: int
+                maximum number of points in a spectrum. The default is enough for an analog scan
+                from 1 to 320 AMU with 25 steps per AMU.
+            name: str, optional
+                name of the shared memory block. If None, a unique name is generated
+        """
+        _check_shared_memory()
+        if slot_count < 2 or slot_points < 1:
+            raise ValueError('Invalid slot_count: {} or slot_points: {}'.format(slot_count, slot_points))
+        shm = shared_memory.SharedMemory(name, create=True, size=cls.get_size(slot_count, slot_points))
+        header = np.ndarray((HeaderSize,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[HeaderSlotCount] = slot_count
+        header[HeaderSlotPoints] = slot_points
+        header[HeaderLatestSequence] = 0
+        header[HeaderMagic] = Magic
+        ring = cls(shm, owner=True)
+        ring.slot_sequences[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attach to an existing ring by the name of the shared memory block.
+        The block is not tracked in the reader process, so that it is not unlinked
+        when the reader exits.
+        """
+        _check_shared_memory()
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name, track=False)
+        else:
+            # Skip the registration instead of unregistering after it, because a forked reader
+            # or a reader in the writer process shares the resource tracker with the writer.
+            register = resource_tracker.register
+            resource_tracker.register = lambda name, rtype: None
+            try:
+                shm = shared_memory.SharedMemory(name)
+            finally:
+                resource_tracker.register = register
+        return cls(shm, owner=False)
+
+    def close(self):
+        """
+        Release the views and detach from the shared memory.
+        The owner also removes the shared memory block.
+        """
+        self.header = self.slot_sequences = self.meta = None
+        self.mass_axes = self.spectra = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def publish(self, mass_axis, spectrum, scan_type='analog_scan', total_current=0, timestamp=None):
+        """
+        Write a spectrum into the next slot.
+
+        Returns
+        --------
+            int
+                sequence number of the published spectrum, starting from 1
+        """
+        points = len(spectrum)
+        if points > self.slot_points:
+            raise ValueError('Spectrum with {} points does not fit in a slot of {} points'
+                             .format(points, self.slot_points))
+        sequence = int(self.header[HeaderLatestSequence]) + 1
+        index = sequence % self.slot_count
+
+        # Mark the slot busy while writing, so that readers do not take torn data as valid
+        self.slot_sequences[index] = SlotWriting
+        self.meta[index, MetaTimestamp] = time.time() if timestamp is None else timestamp
+        self.meta[index, MetaScanType] = ScanTypes.index(scan_type) if scan_type in ScanTypes else 0
+        self.meta[index, MetaPoints] = points
+        self.meta[index, MetaTotalCurrent] = total_current
+        if mass_axis is None:
+            self.mass_axes[index, :points] = np.nan
+        else:
+            self.mass_axes[index, :points] = mass_axis
+        self.spectra[index, :points] = spectrum
+        self.slot_sequences[index] = sequence
+        self.header[HeaderLatestSequence] = sequence
+        return sequence
+
+    def publish_snapshot(self, snapshot):
+        return self.publish(snapshot.mass_axis, snapshot.spectrum, snapshot.scan_type,
+                            snapshot.total_current, snapshot.timestamp)
+
+    def get_latest_sequence(self):
+        return int(self.header[HeaderLatestSequence])
+
+    def get_writer_state(self):
+        return int(self.header[HeaderWriterState])
+
+    def set_writer_state(self, state):
+        self.header[HeaderWriterState] = state
+
+    def read(self, sequence=None):
+        """
+        Get a view of the slot with the sequence number
+
+        Parameters
+        -----------
+            sequence: int, optional
+                If None, the latest one is used
+
+        Returns
+        --------
+            SpectrumSlot or None
+                None if the sequence is not published yet or already overwritten
+        """
+        if sequence is None:
+            sequence = self.get_latest_sequence()
+        if sequence < 1:
+            return None
+        index = sequence % self.slot_count
+        if self.slot_sequences[index] != sequence:
+            return None
+        slot = SpectrumSlot(self, index, sequence)
+        return slot if slot.is_valid() else None
+
+    def wait_for_next(self, last_sequence=None, timeout=None, poll_period=0.01):
+        """
+        Wait until a spectrum newer than last_sequence is published
+
+        Parameters
+        -----------
+            last_sequence: int, optional
+                sequence number already processed. If None, the latest sequence number is used
+            timeout: float, optional
+                maximum wait time in seconds. If None, wait indefinitely
+
+        Returns
+        --------
+            SpectrumSlot or None
+                the latest slot, or None on timeout
+        """
+        if last_sequence is None:
+            last_sequence = self.get_latest_sequence()
+        start_time = time.time()
+        while True:
+            sequence = self.get_latest_sequence()
+            if sequence > last_sequence:
+                slot = self.read(sequence)
+                if slot is not None:
+                    return slot
+            if timeout is not None and time.time() - start_time > timeout:
+                return None
+            time.sleep(poll_period)
+
+
+class AcquisitionProcess(multiprocessing.Process):
+    """
+    Process that owns an RGA100 and publishes every completed scan into a SpectrumRing.
+
+    The RGA100 is created and connected in the child process, so that the serial read loop
+    does not share the GIL with analysis or GUI in other processes.
+
+    parameters
+    -----------
+
+        ring_name: str
+            name of the shared memory block for the SpectrumRing created by this process
+
+        connect_parameters: tuple
+            arguments for RGA100.connect(), such as ('serial', 'COM3', 28800)
+
+        scan_type: str, optional
+            'analog', 'histogram' or 'multiple_mass'
+
+        scan_parameters: tuple, optional
+            (initial_mass, final_mass, scan_speed, steps_per_amu) for Scans.set_parameters().
+            If None, the scan parameters in the RGA are used.
+
+        mass_list: list of int, optional
+            masses to measure for 'multiple_mass' scan type
+
+        slot_count: int, optional
+            number of slots in the ring
+    """
+
+    def __init__(self, ring_name, connect_parameters, scan_type='analog', scan_parameters=None,
+                 mass_list=None, slot_count=8):
+        super().__init__(daemon=True)
+        if scan_type not in ('analog', 'histogram', 'multiple_mass'):
+            raise ValueError('Invalid scan type: {}'.format(scan_type))
+        if scan_type == 'multiple_mass' and not mass_list:
+            raise ValueError('mass_list is required for multiple mass scan')
+        self.ring_name = ring_name
+        self.connect_parameters = tuple(connect_parameters)
+        self.scan_type = scan_type
+        self.scan_parameters = scan_parameters
+        self.mass_list = list(mass_list) if mass_list else []
+        self.slot_count = slot_count
+        self._stop_event = multiprocessing.Event()
+        self._ready_event = multiprocessing.Event()
+        self._errors = multiprocessing.SimpleQueue()
+        self.error = None
+
+    def stop(self, timeout=None):
+        """
+        Stop acquisition after the current scan and wait for the process to finish
+        """
+        self._stop_event.set()
+        self.join(timeout)
+
+    def wait_until_ready(self, timeout=None):
+        """
+        Wait until the ring is created and the first scan starts
+
+        Returns
+        --------
+            bool
+                False on timeout
+
+        Raises
+        -------
+            RuntimeError
+                if the process failed to connect to the RGA or to create the ring
+        """
+        ready = self._ready_event.wait(timeout)
+        if ready and self.error is None and not self._errors.empty():
+            self.error = self._errors.get()
+        if self.error is not None:
+            raise RuntimeError('Acquisition failed to start: {}'.format(self.error))
+        return ready
+
+    def run(self):
+        # Import here not to load the instrument driver in reader processes
+        from srsinst.rga.instruments.rga100.rga import RGA100
+
+        rga = RGA100()
+        try:
+            rga.connect(*self.connect_parameters)
+            rga.check_id()
+            scan = rga.scan
+            if self.scan_parameters:
+                scan.set_parameters(*self.scan_parameters)
+
+            if self.scan_type == 'multiple_mass':
+                mass_axis = np.array(self.mass_list, dtype=np.float64)
+                run_scan = lambda: scan.get_multiple_mass_scan(self.mass_list)
+            else:
+                for_analog = self.scan_type == 'analog'
+                mass_axis = scan.get_mass_axis(for_analog)
+                run_scan = scan.get_analog_scan if for_analog else scan.get_histogram_scan
+
+            ring = SpectrumRing.create(self.slot_count, max(len(mass_axis), 1), self.ring_name)
+        except Exception as e:
+            error = '{}: {}'.format(e.__class__.__name__, e)
+            logger.error('Acquisition failed to start: {}'.format(error))
+            self._errors.put(error)
+            self._ready_event.set()
+            if rga.is_connected():
+                rga.disconnect()
+            return
+
+        ring.set_writer_state(WriterRunning)
+        self._ready_event.set()
+        try:
+            while not self._stop_event.is_set():
+                spectrum = run_scan()
+                ring.publish(mass_axis, spectrum, scan.scan_type, scan.total_current)
+            ring.set_writer_state(WriterStopped)
+        except Exception as e:
+            ring.set_writer_state(WriterFailed)
+            logger.error('Acquisition stopped: {}: {}'.format(e.__class__.__name__, e))
+        finally:
+            rga.disconnect()
+            # Give readers time to see the final writer state before unlinking
+            time.sleep(0.5)
+            ring.close()
@@ -0,0 +1,265 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to send multiple RGA100 commands in a single write.
+
+Each set or query with a command descriptor acquires the communication lock and waits for
+a round-trip. Inside a CommandBatch, sets with the descriptors are collected, and sent
+in a single write when the batch exits. The replies, i.e., status bytes from ionizer and
+CEM set commands, and query replies requested with get() or query_text(),
+are read in order and resolved after the write.
+
+Reading a command descriptor attribute of RGA100 components inside a batch sends
+the commands collected so far before the query, to keep the order of commands.
+Scan commands returning binary data are not allowed in a batch.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga import RGA100
+
+        rga = RGA100('serial', 'COM3', 28800)
+
+        with rga.batch() as batch:
+            rga.qmf.rf.slope = 1000.0
+            rga.qmf.rf.offset = 0.0
+            rga.qmf.dc.slope = 1000.0
+            rga.qmf.dc.offset = 0.0
+            rga.ionizer.electron_energy = 70
+            focus_voltage = batch.get(rga.ionizer, 'focus_voltage')
+
+        print(focus_voltage.value, rga.ionizer.last_set_status)
+"""
+
+from srsgui.inst.exceptions import InstCommunicationError, InstSetError, InstQueryError
+
+# Timeout to wait for a status byte reply, same as the default of query_text_with_long_timeout
+StatusReplyTimeout = 30.0
+
+BinaryReplyCommands = ('SC', 'HS', 'MR', 'TP?')
+
+
+class BatchResult:
+    """
+    Reply of a command in a CommandBatch, available after the batch is sent
+    """
+    def __init__(self, command):
+        self.command = command
+        self.done = False
+        self.reply = None
+        self._value = None
+        self._error = None
+
+    @property
+    def value(self):
+        if not self.done:
+            raise RuntimeError('Batch with {} is not sent yet'.format(self.command))
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def _resolve(self, reply, convert=None, error_class=InstQueryError):
+        self.reply = reply
+        self.done = True
+        try:
+            self._value = convert(reply) if callable(convert) else reply
+        except ValueError:
+            self._error = error_class('Error during conversion CMD: {} Reply: {}'
+                                      .format(self.command, reply))
+
+    def _fail(self, error):
+        self.done = True
+        self._error = error
+
+
+class _BatchEntry:
+    def __init__(self, command, result=None, convert=None, long_timeout=False,
+                 error_class=InstQueryError, on_reply=None):
+        self.command = command
+        self.result = result
+        self.convert = convert
+        self.long_timeout = long_timeout
+        self.error_class = error_class
+        self.on_reply = on_reply
+
+
+class CommandBatch:
+    """
+    Context manager to collect commands to an RGA100 and send them in a single write.
+    Get one with RGA100.batch(). Nested batches in a thread are merged into the outermost one.
+
+    parameters
+    -----------
+
+        rga: RGA100
+            instrument to send commands to
+    """
+
+    def __init__(self, rga):
+        self.rga = rga
+        self._entries = []
+        self._depth = 0
+
+        self._buffer = b''  # received bytes not consumed yet, i.e., replies joined in a TCP packet
+
+        self.write_count = 0
+        self.command_count = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            self.rga._batch_local.batch = self
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if self._depth > 0:
+            return False
+        self.rga._batch_local.batch = None
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
+        return False
+
+    def is_active(self):
+        return self._depth > 0
+
+    def get_pending_count(self):
+        return len(self._entries)
+
+    def add_set(self, set_string, on_sent=None):
+        """
+        Add a set command without a reply
+
+        :param on_sent: optional function called after the command is sent
+        """
+        self._check_command(set_string)
+        self._entries.append(_BatchEntry(set_string, on_reply=on_sent))
+
+    def add_set_with_status(self, set_string, instance, status_callback=None):
+        """
+        Add a set command that returns a status byte.
+        The status byte is stored to instance.last_set_status, when the reply is read.
+
+        :param status_callback: optional function called with the status byte
+        :rtype: BatchResult
+        """
+        self._check_command(set_string)
+        result = BatchResult(set_string)
+
+        def store_status(value):
+            instance.last_set_status = value
+            if callable(status_callback):
+                status_callback(value)
+
+        self._entries.append(_BatchEntry(set_string, result, int, True, InstSetError, store_status))
+        return result
+
+    def query_text(self, cmd, convert=None, long_timeout=False):
+        """
+        Add a query command
+
+        :param str cmd: remote command returning a text reply
+        :param convert: optional function to convert the reply string
+        :param bool long_timeout: If True, wait for the reply up to StatusReplyTimeout
+        :rtype: BatchResult
+        """
+        self._check_command(cmd)
+        result = BatchResult(cmd)
+        self._entries.append(_BatchEntry(cmd, result, convert, long_timeout))
+        return result
+
+    def get(self, component, name):
+        """
+        Add a query for a command descriptor of a component
+
+        :param Component component: component that has the command, such as rga.ionizer
+        :param str name: attribute name of the command, such as 'electron_energy'
+        :rtype: BatchResult
+        """
+        descriptor = getattr(type(component), name)
+        if not hasattr(descriptor, 'remote_command') or not descriptor._get_enable:
+            raise AttributeError('{} is not a query command'.format(name))
+        query_string = descriptor._get_command_format.format(descriptor.remote_command)
+        return self.query_text(query_string, descriptor._get_convert_function)
+
+    def discard(self):
+        """
+        Discard the commands collected without sending
+        """
+        for entry in self._entries:
+            if entry.result is not None:
+                entry.result._fail(InstCommunicationError('Batch discarded before sending {}'
+                                                          .format(entry.command)))
+        self._entries = []
+
+    def flush(self):
+        """
+        Send the collected commands in a single write and read the replies in order.
+        All the replies are read before raising a conversion error, to keep the communication in sync.
+        """
+        if not self._entries:
+            return
+        entries, self._entries = self._entries, []
+        comm = self.rga.comm
+        term_char = comm.get_term_char().decode()
+        error = None
+        with comm.get_lock():
+            old_timeout = comm.get_timeout()
+            try:
+                comm._send(term_char.join(entry.command for entry in entries) + term_char)
+                self.write_count += 1
+                self.command_count += len(entries)
+                for index, entry in enumerate(entries):
+                    if entry.result is None:
+                        if entry.on_reply:
+                            entry.on_reply(None)
+                        continue
+                    comm.set_timeout(StatusReplyTimeout if entry.long_timeout else old_timeout)
+                    reply = self._read_reply(comm)
+                    if reply is None:
+                        error = InstCommunicationError('Batch timeout with CMD: {}'.format(entry.command))
+                        for remaining in entries[index:]:
+                            if remaining.result is not None:
+                                remaining.result._fail(error)
+                        break
+                    entry.result._resolve(reply.decode(encoding='utf-8').strip(),
+                                          entry.convert, entry.error_class)
+                    if entry.result._error is not None:
+                        error = error or entry.result._error
+                    elif entry.on_reply:
+                        entry.on_reply(entry.result._value)
+            finally:
+                comm.set_timeout(old_timeout)
+        if error is not None:
+            raise error
+
+    def _read_reply(self, comm):
+        """
+        Read a reply terminated with the term char. The serial interface returns a reply
+        for each read, but the TCP/IP interface returns whatever arrived, with replies joined.
+
+        :return: reply without the term char, or None with a timeout
+        """
+        term_char = comm.get_term_char()
+        while term_char not in self._buffer:
+            try:
+                data = comm._recv()
+            except InstCommunicationError:
+                data = None
+            if not data:
+                self._buffer = b''  # a partial reply is of no use after a timeout
+                return None
+            self._buffer += data
+        reply, self._buffer = self._buffer.split(term_char, 1)
+        return reply
+
+    @staticmethod
+    def _check_command(cmd):
+        if cmd.upper().startswith(BinaryReplyCommands):
+            raise ValueError('{} with a binary reply is not allowed in a batch'.format(cmd))
@@ -0,0 +1,122 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module for conversion of ion currents to pressure without querying the RGA for every conversion.
+
+Pressure.get_calibration() captures the partial and total pressure sensitivities, the stored CEM gain,
+the CEM HV state and the reduction factor in a single batched query, and keeps the PressureCalibration
+until any of the parameters is set through the driver.
+
+Example
+---------
+    .. code-block:: python
+
+        calibration = rga.pressure.get_calibration()
+        for i in range(10):
+            spectrum_in_torr = calibration.convert_spectrum(rga.scan.get_analog_scan())
+"""
+
+import time
+import numpy as np
+
+# Remote commands that change the pressure calibration
+CalibrationCommands = ('SP', 'ST', 'MG', 'HV')
+
+# CEM is considered on above this voltage
+CemOnVoltage = 10
+
+LowLimit = 1e-4
+MinReductionFactor = 1e-12
+
+
+class PressureCalibration:
+    """
+    Conversion factors from ion current in 0.1 fA unit to pressure in Torr
+
+    parameters
+    -----------
+
+        partial_pressure_sensitivity: float
+            SP value in mA/Torr
+        total_pressure_sensitivity: float
+            ST value in mA/Torr
+        stored_gain: float
+            stored CEM gain
+        cem_voltage: int
+            CEM HV. The CEM gain is used if it is above CemOnVoltage
+        reduction_factor: float, optional
+            pressure reduction factor to the inlet pressure, if the RGA is used in a UGA
+        sens_factor: float, optional
+            if positive, it is used instead of partial_pressure_sensitivity
+        low_limit: float, optional
+            minimum sensitivity value to use
+    """
+
+    def __init__(self, partial_pressure_sensitivity, total_pressure_sensitivity,
+                 stored_gain, cem_voltage, reduction_factor=1.0, sens_factor=0.0, low_limit=LowLimit):
+        self.partial_pressure_sensitivity = partial_pressure_sensitivity
+        self.total_pressure_sensitivity = total_pressure_sensitivity
+        self.stored_gain = stored_gain
+        self.cem_voltage = cem_voltage
+        self.reduction_factor = reduction_factor
+        self.sens_factor = sens_factor
+        self.timestamp = time.time()
+        self.valid = True
+
+        sp = sens_factor if sens_factor > 0.0 else max(partial_pressure_sensitivity, low_limit)
+        st = max(total_pressure_sensitivity, low_limit)
+        gain = self.get_gain()
+
+        self.partial_pressure_factor = 1e-13 / sp / max(reduction_factor, MinReductionFactor) / gain
+        self.total_pressure_factor = 1e-13 / st / gain
+
+    def is_cem_on(self):
+        return self.cem_voltage > CemOnVoltage
+
+    def get_gain(self):
+        """
+        Get the gain used in conversion. It is 1 if the CEM is off
+        """
+        if not self.is_cem_on():
+            return 1.0
+        return 1.0 if self.stored_gain < 1.0 else self.stored_gain
+
+    def invalidate(self):
+        self.valid = False
+
+    def is_valid(self):
+        return self.valid
+
+    def matches(self, reduction_factor, sens_factor):
+        """
+        Check if the calibration is valid and was made with the factors
+        """
+        return self.valid and self.reduction_factor == reduction_factor \
+            and self.sens_factor == sens_factor
+
+    def convert_spectrum(self, spectrum):
+        """
+        Convert a spectrum in 0.1 fA unit to partial pressure in Torr
+
+        :param spectrum: ion currents from an analog, histogram or multiple mass scan
+        :rtype: NumPy array
+        """
+        return np.asarray(spectrum, dtype=np.double) * self.partial_pressure_factor
+
+    def convert_pvst(self, data):
+        """
+        Convert P vs T data in 0.1 fA unit, a vector of masses or an array of (time x mass),
+        to partial pressure in Torr
+
+        :rtype: NumPy array
+        """
+        return np.asarray(data, dtype=np.double) * self.partial_pressure_factor
+
+    def convert_total_pressure(self, total_current):
+        """
+        Convert total pressure current(s) in 0.1 fA unit to total pressure in Torr
+        """
+        return np.asarray(total_current, dtype=np.double) * self.total_pressure_factor
@@ -20,79 +20,239 @@ from srsgui.inst.commands import IntCommand, IntGetCommand, FloatCommand, \
 SetCommandFormat = '{}{}'
 
 
-class IntNSCommand(IntCommand):
-    _set_command_format = SetCommandFormat
+class SetValueCache:
+    """
+    Last confirmed values of RGA100 set commands, used to skip set commands
+    that would change nothing. It is disabled by default.
+
+    A value is confirmed by a query, by a set command returning a zero status byte,
+    or by sending a set command without a status byte, i.e., QMF RS, RI, DS and DI.
+    Set-only commands without a query are not cached.
+    RGA100 clears the cache with reset, calibration, reconnection,
+    or when any error is reported, because the RGA can change the settings by itself,
+    i.e., turning off the filament or CEM HV with an error.
+    """
 
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._values = {}
+        self.hit_count = 0
+        self.miss_count = 0
 
-class FloatNSCommand(FloatCommand):
-    _set_command_format = SetCommandFormat
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        if not enabled:
+            self.invalidate()
 
+    def is_hit(self, remote_command, set_string):
+        """
+        Check if the set_string is the same as the last confirmed one
+        and update the hit and miss counters
+        """
+        if not self.enabled:
+            return False
+        if self._values.get(remote_command) == set_string:
+            self.hit_count += 1
+            return True
+        self.miss_count += 1
+        return False
 
-class BoolSetNSCommand(BoolSetCommand):
-    _set_command_format = SetCommandFormat
+    def confirm(self, remote_command, set_string):
+        if self.enabled:
+            self._values[remote_command] = set_string
 
+    def invalidate(self, remote_command=None):
+        """
+        Clear the value of a command, or all values if remote_command is None
+        """
+        if remote_command is None:
+            self._values.clear()
+        else:
+            self._values.pop(remote_command, None)
 
-class RgaIntCommand(IntNSCommand):
+    def get_statistics(self):
+        return {'hit': self.hit_count, 'miss': self.miss_count, 'size': len(self._values)}
+
+
+def get_root(instance):
     """
-    Descriptor for an RGA100 remote command to
-    **set** and **query** an **integer** value.
-    Setting a value returns a status byte, which is stored as last_set_status
+    Get the instrument that a component belongs to
+    """
+    root = instance
+    while getattr(root, '_parent', None) is not None:
+        root = root._parent
+    return root
+
+
+def get_set_cache(instance):
+    """
+    Get the SetValueCache of the instrument that the component belongs to, or None
+    """
+    return getattr(get_root(instance), 'set_cache', None)
+
+
+def notify_command_set(instance, remote_command, value=None):
+    """
+    Let the instrument that the component belongs to know that a command is set
+    """
+    on_command_set = getattr(get_root(instance), 'on_command_set', None)
+    if callable(on_command_set):
+        on_command_set(remote_command, value)
+
+
+def get_active_batch(instance):
+    """
+    Get the CommandBatch active in the current thread for the instrument
+    that the component belongs to, or None without an active batch.
+    """
+    batch_local = getattr(get_root(instance), '_batch_local', None)
+    if batch_local is None:
+        return None
+    return getattr(batch_local, 'batch', None)
+
+
+class BatchNSMixin:
+    """
+    Mixin for no space commands to collect set commands in an active CommandBatch.
+    A query sends the commands collected in the batch before itself.
+    If the SetValueCache of the instrument is enabled, setting the last confirmed value is skipped.
     """
 
+    def __get__(self, instance, instance_type):
+        if instance is None:
+            return super().__get__(instance, instance_type)
+        batch = get_active_batch(instance)
+        if batch is not None:
+            batch.flush()
+        value = super().__get__(instance, instance_type)
+        cache = self.get_cache(instance)
+        if cache is not None:
+            cache.confirm(self.remote_command, self.get_set_string(value))
+        return value
+
     def __set__(self, instance, value):
         if instance is None:
             return
+        set_string = self.get_set_string(value)
+        cache = self.get_cache(instance)
+        if cache is not None and cache.is_hit(self.remote_command, set_string):
+            return
+
+        def confirm(reply=None):
+            if cache is not None:
+                cache.confirm(self.remote_command, set_string)
 
+        batch = get_active_batch(instance)
+        if batch is None:
+            if cache is not None:
+                cache.invalidate(self.remote_command)  # in case that sending fails
+            super().__set__(instance, value)
+            confirm()
+        else:
+            if cache is not None:
+                cache.invalidate(self.remote_command)  # until the batch is sent
+            batch.add_set(set_string, confirm)
+        notify_command_set(instance, self.remote_command, value)
+
+    def get_cache(self, instance):
+        """
+        Get the SetValueCache for the command, or None if it is a set-only command
+        """
+        if not self._get_enable:
+            return None
+        return get_set_cache(instance)
+
+    def get_set_string(self, value):
         set_string = self.remote_command
         try:
-
             if callable(self._set_convert_function):
                 converted_value = self._set_convert_function(value)
             else:
                 converted_value = value
-            set_string = self._set_command_format.format(self.remote_command, converted_value)
-            reply = int(instance.comm.query_text_with_long_timeout(set_string))
-            instance.last_set_status = reply
-        except InstCommunicationError:
-            raise InstSetError('Error during setting: CMD:{} '.format(set_string))
+            return self._set_command_format.format(self.remote_command, converted_value)
         except ValueError:
             raise InstSetError('Error during conversion: CMD: {}'
                                .format(set_string))
 
 
-class RgaFloatCommand(FloatNSCommand):
+class IntNSCommand(BatchNSMixin, IntCommand):
+    _set_command_format = SetCommandFormat
+
+
+class FloatNSCommand(BatchNSMixin, FloatCommand):
+    _set_command_format = SetCommandFormat
+
+
+class BoolSetNSCommand(BatchNSMixin, BoolSetCommand):
+    _set_command_format = SetCommandFormat
+
+
+class StatusSetMixin:
     """
-    Descriptor for an RGA100 remote command to
-    **set** and **query** a **float** value.
-    Setting a value returns a status byte, which is stored as last_set_status
+    Mixin for RGA100 commands returning a status byte with a set command.
+    The status byte is stored as last_set_status of the component.
+    If the SetValueCache of the instrument is enabled, setting the last confirmed value is skipped.
     """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._get_convert_function = float
-        self._set_convert_function = float
-
     def __set__(self, instance, value):
         if instance is None:
             return
 
-        set_string = self.remote_command
-        try:
+        set_string = self.get_set_string(value)
+        cache = self.get_cache(instance)
+        if cache is not None and cache.is_hit(self.remote_command, set_string):
+            instance.last_set_status = 0
+            return
+        notify_command_set(instance, self.remote_command, value)
 
-            if callable(self._set_convert_function):
-                converted_value = self._set_convert_function(value)
+        def update_cache(status):
+            if cache is None:
+                return
+            if status == 0:
+                cache.confirm(self.remote_command, set_string)
             else:
-                converted_value = value
-            set_string = self._set_command_format.format(self.remote_command, converted_value)
+                cache.invalidate(self.remote_command)
+
+        batch = get_active_batch(instance)
+        if batch is not None:
+            if cache is not None:
+                cache.invalidate(self.remote_command)  # until the status byte is read
+            batch.add_set_with_status(set_string, instance, update_cache)
+            return
+        try:
             reply = int(instance.comm.query_text_with_long_timeout(set_string))
             instance.last_set_status = reply
+            update_cache(reply)
         except InstCommunicationError:
+            if cache is not None:
+                cache.invalidate(self.remote_command)
             raise InstSetError('Error during setting: CMD:{} '.format(set_string))
         except ValueError:
             raise InstSetError('Error during conversion: CMD: {}'
                                .format(set_string))
 
 
+class RgaIntCommand(StatusSetMixin, IntNSCommand):
+    """
+    Descriptor for an RGA100 remote command to
+    **set** and **query** an **integer** value.
+    Setting a value returns a status byte, which is stored as last_set_status
+    """
+
+
+class RgaFloatCommand(StatusSetMixin, FloatNSCommand):
+    """
+    Descriptor for an RGA100 remote command to
+    **set** and **query** a **float** value.
+    Setting a value returns a status byte, which is stored as last_set_status
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._get_convert_function = float
+        self._set_convert_function = float
+
+
 class RgaIonEnergyCommand(RgaIntCommand):
     """
     Descriptor for a RGA100 remote command
@@ -11,7 +11,10 @@ from .commands import FloatNSCommand, BoolSetNSCommand,\
                       RgaIntCommand, RgaFloatCommand, \
                       RgaIonEnergyCommand, RgaTotalPressureCommand, \
                       RgaStoredCEMGainCommand
-from .errors import query_errors, fetch_error_descriptions
+from .calibration import PressureCalibration
+from .timing import OperationDegas
+from .errors import query_errors, fetch_error_descriptions, \
+                    ERROR_REGISTERS, StatusSnapshot
 
 
 class Defaults:
@@ -76,9 +79,10 @@ class Ionizer(Component):
                 error status after setting
         """
 
-        self.electron_energy = electron_energy
-        self.ion_energy = ion_energy
-        self.focus_voltage = focus_voltage
+        with self._parent.batch():
+            self.electron_energy = electron_energy
+            self.ion_energy = ion_energy
+            self.focus_voltage = focus_voltage
         return self.last_set_status
 
 
@@ -118,7 +122,9 @@ class Filament(Component):
         Start degas. Subsequent commands are blocked until the degas is over for RGA100.
         """
         print('Degas starting')
-        self.comm.query_text_with_long_timeout('DG{}'.format(degas_minute), degas_minute * 65)
+        self._parent.invalidate_caches()
+        self._parent.timing.time_operation(OperationDegas, self.comm.query_text_with_long_timeout,
+                                           'DG{}'.format(degas_minute), units=degas_minute)
         print('Degas finished')
 
     allow_run_button = [turn_on, turn_off]
@@ -179,39 +185,51 @@ class Pressure(Component):
     # If the rga is used in a UGA, set reduction_factor to convert to the inlet pressure
     reduction_factor = 1.0
 
-    def get_total_pressure_in_torr(self):
-        st = self.total_pressure_sensitivity
-        st = Pressure.LowLimit if st < Pressure.LowLimit else st
+    def __init__(self, parent):
+        super().__init__(parent)
+        self._calibration = None
+        # The last total pressure enable set through the driver, None if unknown. TP has no query for it.
+        self.total_pressure_enabled = None
+
+    def get_calibration(self, refresh=False):
+        """
+        Get the PressureCalibration to convert ion currents to pressure without I/O.
+        It is captured with a single batched query, and kept until SP, ST, MG or HV
+        is set through the driver, or the reduction factor or sens_factor changes.
 
-        gain = self._parent.cem.stored_gain
-        gain = 1.0 if gain < 1.0 else gain
+        :param bool refresh: If True, query the parameters again
+        :rtype: PressureCalibration
+        """
+        calibration = self._calibration
+        if refresh or calibration is None or \
+                not calibration.matches(self.reduction_factor, self.sens_factor):
+            if self.reduction_factor < 1e-12:
+                self.reduction_factor = 1e-12
+            cem = self._parent.cem
+            with self._parent.batch() as batch:
+                sp = batch.get(self, 'partial_pressure_sensitivity')
+                st = batch.get(self, 'total_pressure_sensitivity')
+                gain = batch.get(cem, 'stored_gain')
+                voltage = batch.get(cem, 'voltage')
+                batch.flush()
+            calibration = PressureCalibration(sp.value, st.value, gain.value, voltage.value,
+                                              self.reduction_factor, self.sens_factor, Pressure.LowLimit)
+            self._calibration = calibration
+        return calibration
+
+    def invalidate_calibration(self):
+        if self._calibration is not None:
+            self._calibration.invalidate()
 
-        factor = 1e-13 / st
-        if self._parent.cem.voltage > 10:
-            factor /= gain
-        return self.total_pressure * factor
+    def get_total_pressure_in_torr(self):
+        return float(self.get_calibration().convert_total_pressure(self.total_pressure))
 
     def get_partial_pressure_sensitivity_in_torr(self):
         """
         Sensitivity factor is multiplied to a raw ion current value (in 1e-16 A unit)
         to calculate the partial pressure in Torr
         """
-        if self.sens_factor > 0.0:
-            sp = self.sens_factor
-        else:
-            sp = self.partial_pressure_sensitivity
-            sp = Pressure.LowLimit if sp < Pressure.LowLimit else sp
-
-        if self.reduction_factor < 1e-12:
-            self.reduction_factor = 1e-12
-
-        gain = self._parent.cem.stored_gain
-        gain = 1.0 if gain < 1.0 else gain
-
-        factor = 1e-13 / sp / self.reduction_factor
-        if self._parent.cem.voltage > 10:
-            factor /= gain
-        return factor
+        return self.get_calibration().partial_pressure_factor
 
 
 class QMF(Component):
@@ -235,7 +253,7 @@ class Status(Component):
     error_ps = IntGetCommand('EP')
     error_detector = IntGetCommand('ED')
     error_qmf = IntGetCommand('EQ')
-    error_cem = IntGetCommand('EC')
+    error_cem = IntGetCommand('EM')
     error_filament = IntGetCommand('EF')
     error_rs232 = IntGetCommand('EC')
 
@@ -249,7 +267,36 @@ class Status(Component):
             str
                 error bits coded in a string
         """
-        return query_errors(self)
+        errors = query_errors(self)
+        if errors != 'NE':
+            # The RGA may have changed settings, i.e., turned off the filament or CEM HV
+            self._parent.invalidate_caches()
+        return errors
+
+    def snapshot(self):
+        """
+        Get the status byte, all the error registers, emission current and CEM HV
+        in a single write and return them in an immutable record.
+        Errors are decoded from the record with a lookup table without further queries.
+
+        Returns
+        --------
+            StatusSnapshot
+        """
+        with self._parent.batch() as batch:
+            status_byte = batch.query_text('ER?', int)
+            registers = [batch.query_text(command + '?', int) for _, command, _, _ in ERROR_REGISTERS]
+            emission_current = batch.query_text('FL?', float)
+            cem_voltage = batch.query_text('HV?', int)
+            batch.flush()  # in case that it is inside another batch
+
+        record = StatusSnapshot(status_byte.value,
+                                tuple(register.value for register in registers),
+                                emission_current.value,
+                                cem_voltage.value)
+        if record.has_errors():
+            self._parent.invalidate_caches()
+        return record
 
     def get_error_text(self, error_bits=''):
         """
@@ -0,0 +1,158 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to choose the scan speed (NF) for each mass in multiple mass measurements.
+
+DwellOptimizer tracks the recent intensity and noise of each mass, and picks
+the fastest scan speed for each mass that meets a relative precision.
+A strong peak is measured fast, while a trace peak near the noise floor
+gets a slower speed, so that the cycle time is the minimum for the precision.
+The masses are measured grouped by speed, and a speed change is sent in the same write
+as the following measurement command.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga.instruments.rga100.dwell import DwellOptimizer
+
+        optimizer = DwellOptimizer([2, 18, 28, 44], precision=0.02, timing_model=rga.timing)
+        while True:
+            intensities = optimizer.scan(rga.scan)
+            print(intensities, optimizer.speeds, optimizer.predict_cycle_time())
+"""
+
+import numpy as np
+
+from .timing import ScanTimingModel, MultipleMassScan, MaxSpeed
+from .planner import DefaultNoiseFloor
+
+# A mass goes to a faster speed only if it meets the precision by this fraction of a speed step
+Hysteresis = 0.5
+
+
+class DwellOptimizer:
+    """
+    Class to optimize the scan speed of each mass in multiple mass measurements
+
+    parameters
+    -----------
+
+        masses: list of int
+            masses to measure
+        precision: float, optional
+            target relative standard deviation of each measurement
+        initial_speed: int, optional
+            speed used until intensity and noise of a mass are known
+        min_speed: int, optional
+            slowest speed allowed
+        max_speed: int, optional
+            fastest speed allowed
+        alpha: float, optional
+            weight of a new measurement in the exponential averages of intensity and noise
+        noise_floor: float, optional
+            noise in 0.1 fA unit at scan speed 0 used until noise is measured
+        timing_model: ScanTimingModel, optional
+            model to predict cycle time
+    """
+
+    def __init__(self, masses, precision=0.05, initial_speed=3, min_speed=0, max_speed=MaxSpeed,
+                 alpha=0.2, noise_floor=DefaultNoiseFloor, timing_model=None):
+        if precision <= 0 or not 0 <= min_speed <= initial_speed <= max_speed <= MaxSpeed:
+            raise ValueError('Invalid precision: {} or speeds: {} {} {}'
+                             .format(precision, min_speed, initial_speed, max_speed))
+        self.masses = list(masses)
+        self.precision = precision
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+        self.alpha = alpha
+        self.noise_floor = noise_floor
+        self.timing_model = timing_model if timing_model else ScanTimingModel()
+
+        count = len(self.masses)
+        self.speeds = np.full(count, initial_speed, dtype=int)
+        self.intensities = np.full(count, np.nan)
+        # Noise variance scaled to scan speed 0, estimated from differences of successive measurements
+        self._noise_variance = np.full(count, np.nan)
+        self._last = np.full(count, np.nan)
+        self._last_speeds = self.speeds.copy()
+        self._ascending = False
+        self.cycle_count = 0
+
+    def update(self, intensities, speeds):
+        """
+        Update intensity and noise of the masses with measurements
+
+        :param intensities: intensities in the order of masses
+        :param speeds: scan speeds used for the intensities
+        """
+        y = np.asarray(intensities, dtype=np.double)
+        speeds = np.asarray(speeds)
+        # Noise variance grows by 2 with each step of speed, and a difference has twice the variance
+        variance = (y - self._last) ** 2 / 2.0 / 2.0 ** speeds
+        valid = np.isfinite(variance) & (speeds == self._last_speeds)
+        first = valid & np.isnan(self._noise_variance)
+        self._noise_variance[first] = variance[first]
+        update = valid & ~first
+        self._noise_variance[update] += self.alpha * (variance[update] - self._noise_variance[update])
+
+        known = np.isfinite(self.intensities)
+        self.intensities[~known] = y[~known]
+        self.intensities[known] += self.alpha * (y[known] - self.intensities[known])
+        self._last = y
+        self._last_speeds = speeds.copy()
+        self.cycle_count += 1
+
+    def get_noise(self):
+        """
+        :return: noise of each mass at scan speed 0 in 0.1 fA unit
+        :rtype: NumPy array
+        """
+        return np.where(np.isfinite(self._noise_variance), np.sqrt(self._noise_variance), self.noise_floor)
+
+    def get_speeds(self):
+        """
+        Calculate the fastest speed of each mass meeting the precision
+
+        :rtype: NumPy array
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # noise * 2 ** (speed / 2) <= precision * intensity
+            ratio = self.precision * np.abs(self.intensities) / np.maximum(self.get_noise(), 1e-12)
+            raw = 2.0 * np.log2(ratio)
+        raw = np.where(np.isfinite(self.intensities), raw, self.speeds)
+        raw = np.nan_to_num(raw, nan=self.min_speed, posinf=self.max_speed, neginf=self.min_speed)
+        speeds = np.clip(np.floor(raw), self.min_speed, self.max_speed).astype(int)
+        hold = (speeds > self.speeds) & (raw < self.speeds + 1 + Hysteresis)
+        speeds[hold] = self.speeds[hold]
+        return speeds
+
+    def predict_cycle_time(self, speeds=None):
+        """
+        Predict seconds to measure all the masses at the speeds
+        """
+        speeds = self.speeds if speeds is None else speeds
+        return sum(self.timing_model.predict(MultipleMassScan, int(speed), 1) for speed in speeds)
+
+    def scan(self, scans):
+        """
+        Measure all the masses with the optimized speeds and update the estimates.
+        The masses are measured grouped by speed, in alternating order of speed
+        in successive cycles, so that the speed changes least.
+
+        :param scans: Scans component of an RGA
+        :return: intensities in the order of masses
+        :rtype: NumPy array
+        """
+        self.speeds = self.get_speeds()
+        order = np.argsort(self.speeds if self._ascending else -self.speeds, kind='stable')
+        self._ascending = not self._ascending
+        values = scans.get_multiple_mass_scan([self.masses[i] for i in order],
+                                              [int(self.speeds[i]) for i in order])
+        intensities = np.empty(len(self.masses))
+        intensities[order] = values
+        self.update(intensities, self.speeds)
+        return intensities
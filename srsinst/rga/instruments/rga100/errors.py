@@ -7,6 +7,8 @@
 Module to handle RGA100 error status
 """
 
+from collections import namedtuple
+
 BIT7 = 1 << 7
 BIT6 = 1 << 6
 BIT5 = 1 << 5
@@ -55,6 +57,49 @@ ERROR_DICT = {
 }
 
 
+# Error registers: (bit in the status byte, query command, error key prefix, bits in use)
+ERROR_REGISTERS = (
+    (BIT6, 'EP', 'PS', (7, 6)),
+    (BIT5, 'ED', 'DET', (7, 6, 5, 4, 3, 1)),
+    (BIT4, 'EQ', 'RF', (7, 6, 4)),
+    (BIT3, 'EM', 'EM', (7,)),
+    (BIT1, 'EF', 'FL', (7, 6, 5, 0)),
+    (BIT0, 'EC', 'CM', (6, 5, 4, 3, 2, 1, 0)),
+)
+
+
+def _build_error_lookup(prefix, bits):
+    # Error keys for all 256 register values, in the order of the bit from MSB
+    return tuple(tuple('{}{}'.format(prefix, bit) for bit in bits if value & (1 << bit))
+                 for value in range(256))
+
+
+ERROR_LOOKUP = {prefix: _build_error_lookup(prefix, bits) for _, _, prefix, bits in ERROR_REGISTERS}
+
+
+def decode_errors(status_byte, registers):
+    """
+    Decode error registers into error keys with the lookup table
+
+    Parameters
+    -----------
+        status_byte: int
+            reply of ER?
+        registers: dict
+            register values with prefixes in ERROR_REGISTERS as keys, such as {'FL': 64}
+
+    Returns
+    --------
+        tuple
+            error keys, such as ('FL6',)
+    """
+    keys = ()
+    for bit, _, prefix, _ in ERROR_REGISTERS:
+        if status_byte & bit:
+            keys += ERROR_LOOKUP[prefix][registers.get(prefix, 0) & 0xff]
+    return keys
+
+
 def query_errors(status):
     """
     Query all the status registers of RGA100
@@ -64,76 +109,14 @@ def query_errors(status):
         str
             string that contains colon separated register name and bits
     """
-    error_string = ''
     status_byte = status.error_status
     if status_byte == 0:
         return 'NE'
-    if status_byte & BIT6:
-        result = status.error_ps
-        # error_string += 'PS:'
-        if result & BIT7:
-            error_string += 'PS7:'
-        if result & BIT6:
-            error_string += 'PS6:'
-    if status_byte & BIT5:
-        result = status.error_detector
-        # error_string += 'DET:'
-        if result & BIT7:
-            error_string += 'DET7:'
-        if result & BIT6:
-            error_string += 'DET6:'
-        if result & BIT5:
-            error_string += 'DET5:'
-        if result & BIT4:
-            error_string += 'DET4:'
-        if result & BIT3:
-            error_string += 'DET3:'
-        if result & BIT1:
-            error_string += 'DET1:'
-    if status_byte & BIT4:
-        result = status.error_qmf
-        # error_string += 'RF:'
-        if result & BIT7:
-            error_string += 'RF7:'
-        if result & BIT6:
-            error_string += 'RF6:'
-        if result & BIT4:
-            error_string += 'RF4:'
-    if status_byte & BIT3:
-        result = status.error_cem
-        # error_string += 'EM:'
-        if result & BIT7:
-            error_string += 'EM7:'
-
-    if status_byte & BIT1:
-        result = status.error_filament
-        # error_string += 'FL:'
-        if result & BIT7:
-            error_string += 'FL7:'
-        if result & BIT6:
-            error_string += 'FL6:'
-        if result & BIT5:
-            error_string += 'FL5:'
-        if result & BIT0:
-            error_string += 'FL0:'
-    if status_byte & BIT0:
-        result = status.error_rs232
-        # error_string += 'CM:'
-        if result & BIT6:
-            error_string += 'CM6:'
-        if result & BIT5:
-            error_string += 'CM5:'
-        if result & BIT4:
-            error_string += 'CM4:'
-        if result & BIT3:
-            error_string += 'CM3:'
-        if result & BIT2:
-            error_string += 'CM2:'
-        if result & BIT1:
-            error_string += 'CM1:'
-        if result & BIT0:
-            error_string += 'CM0:'
-    return error_string[:-1]  # remove the last colon
+    registers = {}
+    for bit, command, prefix, _ in ERROR_REGISTERS:
+        if status_byte & bit:
+            registers[prefix] = status.comm.query_int(command + '?')
+    return ':'.join(decode_errors(status_byte, registers))
 
 
 def fetch_error_descriptions(error_string):
@@ -147,8 +130,50 @@ def fetch_error_descriptions(error_string):
             comma separated long description of error bits
 
     """
-    err_list = error_string.split(':')
-    err_description = ''
-    for key in err_list:
-        err_description += ERROR_DICT[key] + ', '
-    return err_description[:-2]  # remove the last comma
+    return ', '.join(ERROR_DICT[key] for key in error_string.split(':'))
+
+
+StatusSnapshotFields = ('status_byte', 'registers', 'emission_current', 'cem_voltage')
+
+
+class StatusSnapshot(namedtuple('StatusSnapshot', StatusSnapshotFields)):
+    """
+    Immutable record of the RGA100 status obtained with Status.snapshot().
+    Snapshots from two polls can be compared with == to check for any change.
+
+    attributes
+    -----------
+
+        status_byte: int
+            reply of ER?
+        registers: tuple
+            values of error registers in the order of ERROR_REGISTERS
+        emission_current: float
+            reply of FL? in mA
+        cem_voltage: int
+            reply of HV? in V
+    """
+    __slots__ = ()
+
+    def has_errors(self):
+        return self.status_byte != 0
+
+    def get_error_keys(self):
+        """
+        :return: error keys, such as ('FL6', 'FL5')
+        :rtype: tuple
+        """
+        registers = {prefix: value for (_, _, prefix, _), value in zip(ERROR_REGISTERS, self.registers)}
+        return decode_errors(self.status_byte, registers)
+
+    def get_errors(self):
+        """
+        :return: error bits in the same string format as query_errors()
+        :rtype: str
+        """
+        if self.status_byte == 0:
+            return 'NE'
+        return ':'.join(self.get_error_keys())
+
+    def get_error_text(self):
+        return fetch_error_descriptions(self.get_errors())
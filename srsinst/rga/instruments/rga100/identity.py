@@ -0,0 +1,98 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to read the identity and the state of an RGA at startup with a single write.
+
+RGA100.check_id() parses the ID string into an InstrumentIdentity, cached by serial number,
+so that the maximum mass and the ID string are available without another ID query,
+i.e., in every Scans.set_parameters(). RGA100.read_state() reads the ID string,
+scan parameters, ionizer parameters and CEM HV in a single batch into an InstrumentState,
+in place of the burst of queries at the start of a task.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga import RGA100
+
+        rga = RGA100('serial', 'COM3', 28800)
+        state = rga.read_state()
+        print(state.identity.serial_number, state.emission_current, state.cem_voltage)
+
+        rga.scan.set_parameters(1, 50, 3, 10)
+        rga.scan.get_analog_scan()
+        print('Time to first scan: {:.2f} s'.format(rga.get_time_to_first_scan()))
+"""
+
+from collections import namedtuple
+
+from srsgui.inst.exceptions import InstIdError
+
+IdString = 'SRSRGA'
+MinIdLength = 20
+
+InstrumentIdentity = namedtuple('InstrumentIdentity',
+                                'id_string model_name serial_number firmware_version max_mass')
+
+InstrumentState = namedtuple('InstrumentState',
+                             'identity initial_mass final_mass speed resolution '
+                             'electron_energy ion_energy focus_voltage emission_current cem_voltage '
+                             'timestamp duration')
+InstrumentState.__doc__ = """
+State of an RGA read by RGA100.read_state()
+
+    identity: InstrumentIdentity, or None if the ID reply is invalid
+    initial_mass, final_mass, speed, resolution: scan parameters
+    electron_energy, ion_energy, focus_voltage: ionizer parameters
+    emission_current: filament emission current in mA
+    cem_voltage: CEM HV in V
+    timestamp: time.time() when the state was read
+    duration: seconds to read the state
+"""
+
+# Identities of the RGAs connected in this process with serial numbers as keys
+_identity_cache = {}
+
+
+def parse_id_string(reply):
+    """
+    Parse an ID string of an RGA, i.e., 'SRSRGA200VER0.24SN12345'
+
+    :return: InstrumentIdentity, or None if the reply is too short
+    :raises InstIdError: if the reply is not from an SRS RGA
+    """
+    reply = reply.strip()
+    if len(reply) < MinIdLength:
+        return None
+    if IdString not in reply:
+        raise InstIdError("Invalid instrument: {} not in {}".format(IdString, reply[0:9]))
+
+    serial_number = reply[18:]
+    cached = _identity_cache.get(serial_number)
+    if cached is not None and cached.id_string == reply:
+        return cached
+
+    try:
+        max_mass = int(reply[6:9])  # uninitialized unit has '???'
+    except ValueError:
+        max_mass = 100
+    if max_mass >= 300:
+        max_mass = 300
+    elif max_mass >= 200:
+        max_mass = 200
+    else:
+        max_mass = 100
+
+    identity = InstrumentIdentity(reply, reply[0:9], serial_number, reply[12:16], max_mass)
+    _identity_cache[serial_number] = identity
+    return identity
+
+
+def get_cached_identity(serial_number):
+    """
+    :return: InstrumentIdentity of the serial number read before in this process, or None
+    """
+    return _identity_cache.get(serial_number)
@@ -0,0 +1,316 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to monitor total pressure of an RGA at a fixed rate.
+
+TotalPressureMonitor samples TP in a background thread into a ring buffer, and converts
+the total pressure current to Torr with the cached PressureCalibration.
+It can run alone, or submit the samples to a CommandScheduler, so that samples
+are taken between scans or between segments of a scan.
+Decimated updates and threshold alarms are delivered with callbacks,
+so that a scan loop does not have to poll total pressure.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga import RGA100
+        from srsinst.rga.instruments.rga100.monitor import TotalPressureMonitor
+
+        rga = RGA100('serial', 'COM3', 28800)
+        scheduler = rga.get_scheduler()
+
+        monitor = TotalPressureMonitor(rga, rate=2.0, decimation=4, scheduler=scheduler,
+                                       update_callback=lambda t, p: print(t, p))
+        monitor.add_alarm(1e-5, lambda t, p, alarm: print('Pressure high', p))
+        monitor.start()
+
+        for i in range(10):
+            scheduler.submit_analog_scan(segment_width=10).result()
+
+        monitor.stop()
+        times, pressures = monitor.get_data()
+"""
+
+import time
+import logging
+import threading
+
+import numpy as np
+
+from .scheduler import Priority
+
+logger = logging.getLogger(__name__)
+
+
+class ThresholdAlarm:
+    """
+    Alarm for total pressure crossing a threshold
+
+    parameters
+    -----------
+
+        threshold: float
+            pressure in Torr
+        callback: function(timestamp, pressure, alarm)
+            called when the alarm is set, and when it is cleared if notify_clear is True
+        above: bool, optional
+            If True, the alarm is set above the threshold, otherwise below it
+        hysteresis: float, optional
+            pressure difference in Torr from the threshold to clear the alarm
+        notify_clear: bool, optional
+            If True, the callback is called also when the alarm is cleared
+    """
+
+    def __init__(self, threshold, callback, above=True, hysteresis=0.0, notify_clear=False):
+        self.threshold = threshold
+        self.callback = callback
+        self.above = above
+        self.hysteresis = abs(hysteresis)
+        self.notify_clear = notify_clear
+        self.active = False
+
+    def check(self, timestamp, pressure):
+        """
+        Update the alarm state with a pressure value
+
+        :return: True if the state changed
+        :rtype: bool
+        """
+        if self.above:
+            if not self.active and pressure > self.threshold:
+                self.active = True
+            elif self.active and pressure < self.threshold - self.hysteresis:
+                self.active = False
+            else:
+                return False
+        else:
+            if not self.active and pressure < self.threshold:
+                self.active = True
+            elif self.active and pressure > self.threshold + self.hysteresis:
+                self.active = False
+            else:
+                return False
+        if self.active or self.notify_clear:
+            self.callback(timestamp, pressure, self)
+        return True
+
+
+class TotalPressureMonitor:
+    """
+    Class to sample total pressure at a fixed rate into a ring buffer
+
+    parameters
+    -----------
+
+        rga: RGA100
+            instrument to monitor
+        rate: float, optional
+            samples per second
+        capacity: int, optional
+            number of samples kept in the ring buffer
+        decimation: int, optional
+            update_callback is called with the average of every decimation samples
+        update_callback: function(timestamp, pressure), optional
+            called with pressure in Torr
+        scheduler: CommandScheduler, optional
+            If given, samples are taken through the scheduler. Otherwise, the monitor
+            uses the comm lock directly, and waits for a scan running to finish.
+        priority: int, optional
+            priority of sampling jobs in the scheduler
+    """
+
+    def __init__(self, rga, rate=1.0, capacity=3600, decimation=1, update_callback=None,
+                 scheduler=None, priority=Priority.High):
+        if rate <= 0 or capacity < 1 or decimation < 1:
+            raise ValueError('Invalid rate: {}, capacity: {} or decimation: {}'
+                             .format(rate, capacity, decimation))
+        self.rga = rga
+        self.period = 1.0 / rate
+        self.capacity = capacity
+        self.decimation = decimation
+        self.update_callback = update_callback if callable(update_callback) else None
+        self.scheduler = scheduler
+        self.priority = priority
+        self.alarms = []
+
+        self.times = np.zeros(capacity)
+        self.currents = np.zeros(capacity)
+        self.pressures = np.zeros(capacity)
+        self._index = 0  # where the next sample goes
+        self._count = 0
+        self._decimation_count = 0
+        self._decimation_sum = 0.0
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._pending = None
+        self._previous_enable = None  # total pressure enable before start, to restore at stop
+
+        self.sample_count = 0
+        self.missed_count = 0
+        self.error_count = 0
+
+    def add_alarm(self, threshold, callback, above=True, hysteresis=0.0, notify_clear=False):
+        """
+        Add a ThresholdAlarm checked with every sample
+
+        :rtype: ThresholdAlarm
+        """
+        alarm = ThresholdAlarm(threshold, callback, above, hysteresis, notify_clear)
+        self.alarms.append(alarm)
+        return alarm
+
+    def remove_alarm(self, alarm):
+        if alarm in self.alarms:
+            self.alarms.remove(alarm)
+
+    def start(self):
+        """
+        Enable total pressure measurement and start sampling in a background thread
+        """
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop sampling, and restore total pressure measurement as it was before start().
+        It is turned off, unless it was enabled through the driver before start().
+        """
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+        if self._previous_enable is None:
+            return
+        try:
+            self._call(self._restore)
+        except Exception as e:
+            self.error_count += 1
+            logger.error('Total pressure monitor failed to restore TP: {}: {}'.format(e.__class__.__name__, e))
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        try:
+            self._call(self._enable)
+        except Exception as e:
+            self.error_count += 1
+            logger.error('Total pressure monitor failed to start: {}: {}'.format(e.__class__.__name__, e))
+            return
+
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            if self.scheduler is None:
+                self._take_sample()
+            elif self._pending is not None and not self._pending.done():
+                self.missed_count += 1  # the previous sample is still waiting in the scheduler
+            else:
+                self._pending = self.scheduler.submit(self._take_sample, priority=self.priority,
+                                                      deadline=time.time() + self.period)
+            next_time += self.period
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                # Sampling took longer than the period. Skip the samples missed.
+                skipped = int(-delay / self.period) + 1
+                self.missed_count += skipped
+                next_time += skipped * self.period
+                delay += skipped * self.period
+            self._stop_event.wait(delay)
+
+    def _call(self, function):
+        if self.scheduler is None:
+            return function()
+        return self.scheduler.call(function, priority=self.priority)
+
+    def _enable(self):
+        self._previous_enable = bool(self.rga.pressure.total_pressure_enabled)
+        self.rga.pressure.total_pressure_enable = True
+        self.rga.pressure.get_calibration()
+
+    def _restore(self):
+        previous, self._previous_enable = self._previous_enable, None
+        if not previous:
+            self.rga.pressure.total_pressure_enable = False
+
+    def _take_sample(self):
+        try:
+            current = self.rga.pressure.total_pressure
+            calibration = self.rga.pressure.get_calibration()
+        except Exception as e:
+            self.error_count += 1
+            logger.error('Total pressure sampling error: {}: {}'.format(e.__class__.__name__, e))
+            return
+        self.add_sample(time.time(), current, float(calibration.convert_total_pressure(current)))
+
+    def add_sample(self, timestamp, current, pressure):
+        """
+        Add a sample to the ring buffer, and call the update callback and alarms
+        """
+        with self._lock:
+            index = self._index
+            self.times[index] = timestamp
+            self.currents[index] = current
+            self.pressures[index] = pressure
+            self._index = (index + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self.sample_count += 1
+
+            self._decimation_sum += pressure
+            self._decimation_count += 1
+            update = None
+            if self._decimation_count >= self.decimation:
+                update = self._decimation_sum / self._decimation_count
+                self._decimation_sum = 0.0
+                self._decimation_count = 0
+
+        for alarm in list(self.alarms):
+            try:
+                alarm.check(timestamp, pressure)
+            except Exception as e:
+                self.error_count += 1
+                logger.error('Alarm callback error: {}: {}'.format(e.__class__.__name__, e))
+
+        if update is not None and self.update_callback:
+            try:
+                self.update_callback(timestamp, update)
+            except Exception as e:
+                self.error_count += 1
+                logger.error('Update callback error: {}: {}'.format(e.__class__.__name__, e))
+
+    def get_count(self):
+        return self._count
+
+    def get_data(self, count=None, in_torr=True):
+        """
+        Get samples in chronological order
+
+        :param int count: number of the latest samples. If None, all samples in the buffer
+        :param bool in_torr: If False, total pressure currents in 0.1 fA unit are returned
+        :return: (times, values)
+        :rtype: tuple of NumPy arrays
+        """
+        with self._lock:
+            available = self._count
+            count = available if count is None else min(count, available)
+            indices = (np.arange(self._index - count, self._index)) % self.capacity
+            values = self.pressures if in_torr else self.currents
+            return self.times[indices], values[indices]
+
+    def get_latest(self):
+        """
+        :return: (timestamp, pressure in Torr) of the latest sample, or None without a sample
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+            index = (self._index - 1) % self.capacity
+            return self.times[index], self.pressures[index]
@@ -0,0 +1,265 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to plan scans measuring a set of masses in the shortest time.
+
+AcquisitionPlanner compares a full analog scan, a segmented analog scan over
+windows around the masses, a histogram scan and a multiple mass (MR) scan at every
+scan speed, with cycle times predicted by a ScanTimingModel. It picks the fastest plan
+that reaches a target signal-to-noise ratio, or the lowest noise plan that fits
+in a target cycle time. The plan is run on the Scans component of an RGA.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga.instruments.rga100.planner import AcquisitionPlanner
+
+        planner = AcquisitionPlanner(rga.timing)
+        plan = planner.plan([2, 18, 28, 44], cycle_time=5.0)
+        print(plan)
+
+        plan.setup(rga.scan)
+        while True:
+            plan.run(rga.scan)
+            print(plan.get_intensities(rga.scan))
+"""
+
+import logging
+
+import numpy as np
+
+from .timing import ScanTimingModel, AnalogScan, SegmentedAnalogScan, HistogramScan, \
+    MultipleMassScan, MaxSpeed
+from .scans import Scans
+from .components import Defaults
+
+logger = logging.getLogger(__name__)
+
+MinStepsPerAmu = 10
+MaxStepsPerAmu = 25
+
+# Noise in 0.1 fA unit at the slowest scan speed. Noise doubles with every two steps of speed.
+DefaultNoiseFloor = 1.0
+
+
+class AcquisitionPlan:
+    """
+    Scan plan chosen by AcquisitionPlanner
+
+    attributes
+    -----------
+
+        scan_type: str
+            'analog_scan', 'segmented_analog_scan', 'histogram_scan' or 'multiple_mass_scan'
+        speed: int
+            scan speed (NF)
+        resolution: int
+            steps per AMU for analog scans, 1 for the others
+        masses: list of int
+            target masses
+        initial_mass, final_mass: int
+            mass range of analog and histogram scans
+        windows: list of tuple
+            mass windows of a segmented analog scan
+        cycle_time: float
+            predicted seconds for a scan
+        snr: float or None
+            predicted signal-to-noise ratio of the weakest mass, if intensities are given
+        feasible: bool
+            False, if the plan does not meet the target
+    """
+
+    def __init__(self, scan_type, speed, resolution, masses, initial_mass, final_mass, windows,
+                 cycle_time, snr=None):
+        self.scan_type = scan_type
+        self.speed = speed
+        self.resolution = resolution
+        self.masses = masses
+        self.initial_mass = initial_mass
+        self.final_mass = final_mass
+        self.windows = windows
+        self.cycle_time = cycle_time
+        self.snr = snr
+        self.feasible = True
+
+    def __repr__(self):
+        snr = '' if self.snr is None else ', snr={:.1f}'.format(self.snr)
+        return 'AcquisitionPlan({}, speed={}, resolution={}, cycle_time={:.2f} s{})'\
+            .format(self.scan_type, self.speed, self.resolution, self.cycle_time, snr)
+
+    def setup(self, scans: Scans):
+        """
+        Set scan parameters for the plan
+        """
+        if self.scan_type == MultipleMassScan:
+            scans.speed = self.speed
+        else:
+            scans.set_parameters(self.initial_mass, self.final_mass, self.speed, max(MinStepsPerAmu, self.resolution))
+
+    def run(self, scans: Scans):
+        """
+        Run a scan of the plan. setup() should be called before.
+
+        :return: spectrum, or intensities of the masses for a multiple mass scan
+        :rtype: NumPy array
+        """
+        if self.scan_type == AnalogScan:
+            return scans.get_analog_scan()
+        if self.scan_type == SegmentedAnalogScan:
+            return scans.get_segmented_analog_scan(self.windows, restore=False)
+        if self.scan_type == HistogramScan:
+            return scans.get_histogram_scan()
+        return scans.get_multiple_mass_scan(self.masses)
+
+    def execute(self, scans: Scans):
+        """
+        Set up and run a scan of the plan
+        """
+        self.setup(scans)
+        return self.run(scans)
+
+    def get_intensities(self, scans: Scans):
+        """
+        Get the intensities of the masses from the last scan run with the plan
+
+        :rtype: list of float
+        """
+        if self.scan_type == MultipleMassScan:
+            return list(scans.spectrum)
+        if self.scan_type == HistogramScan:
+            return [scans.spectrum[mass - self.initial_mass] for mass in self.masses]
+        if self.scan_type == AnalogScan:
+            step = 1.0 / self.resolution
+            scans.mass_axis = np.arange(self.initial_mass, self.final_mass + step / 2.0, step)
+        return [scans.get_peak_from_analog_scan(mass, True) for mass in self.masses]
+
+
+class AcquisitionPlanner:
+    """
+    Class to choose the fastest scan strategy for target masses
+
+    parameters
+    -----------
+
+        timing_model: ScanTimingModel, optional
+            model to predict cycle time
+        max_mass: int, optional
+            maximum mass of the RGA
+        margin: int, optional
+            half width in AMU of analog scan windows around the masses
+        noise_floor: float, optional
+            noise in 0.1 fA unit at scan speed 0
+    """
+
+    def __init__(self, timing_model=None, max_mass=Scans.MaxMass, margin=1, noise_floor=DefaultNoiseFloor):
+        self.timing_model = timing_model if timing_model else ScanTimingModel()
+        self.max_mass = max_mass
+        self.margin = margin
+        self.noise_floor = noise_floor
+
+    def get_noise(self, speed):
+        """
+        :return: noise in 0.1 fA unit at the scan speed
+        :rtype: float
+        """
+        return self.noise_floor * 2 ** (speed / 2.0)
+
+    def get_candidates(self, masses, resolution=1, speeds=None, intensities=None):
+        """
+        Get all the plans able to measure the masses at the resolution
+
+        :param list masses: target masses
+        :param int resolution: steps per AMU required. 1 if only the peak intensity is needed.
+        :param speeds: scan speeds to consider. All speeds if None
+        :param list intensities: expected intensities of the masses in 0.1 fA unit to predict SNR
+        :rtype: list of AcquisitionPlan
+        """
+        masses = [int(mass) for mass in masses]
+        if not masses:
+            raise ValueError('No mass to plan')
+        low_mass = min(masses)
+        high_mass = max(masses)
+        if low_mass < 1 or high_mass > self.max_mass:
+            raise ValueError('Masses out of range 1 - {}: {}'.format(self.max_mass, masses))
+        if resolution > MaxStepsPerAmu:
+            raise ValueError('Resolution {} is higher than {} steps per AMU'.format(resolution, MaxStepsPerAmu))
+        if speeds is None:
+            speeds = range(MaxSpeed + 1)
+
+        steps = max(MinStepsPerAmu, resolution)
+        windows = Scans.get_mass_windows(masses, self.margin, self.max_mass)
+        initial_mass = windows[0][0]
+        final_mass = windows[-1][1]
+        model = self.timing_model
+
+        candidates = []
+        for speed in speeds:
+            candidates.append(AcquisitionPlan(AnalogScan, speed, steps, masses, initial_mass, final_mass, None,
+                                              model.predict_analog(initial_mass, final_mass, speed, steps)))
+            if len(windows) > 1:
+                candidates.append(AcquisitionPlan(SegmentedAnalogScan, speed, steps, masses,
+                                                  initial_mass, final_mass, windows,
+                                                  model.predict_segmented(windows, speed, steps)))
+            if resolution <= 1:
+                candidates.append(AcquisitionPlan(HistogramScan, speed, 1, masses, low_mass, high_mass, None,
+                                                  model.predict_histogram(low_mass, high_mass, speed)))
+                candidates.append(AcquisitionPlan(MultipleMassScan, speed, 1, masses, low_mass, high_mass, None,
+                                                  model.predict_multiple_mass(masses, speed)))
+        if intensities is not None:
+            weakest = min(intensities)
+            for plan in candidates:
+                plan.snr = weakest / self.get_noise(plan.speed)
+        return candidates
+
+    def plan(self, masses, resolution=1, target_snr=None, cycle_time=None, intensities=None,
+             speed=None):
+        """
+        Choose a plan for the masses
+
+        With target_snr, the fastest plan reaching the SNR is chosen. It needs intensities.
+        With cycle_time, the plan with the lowest noise that fits in the cycle time is chosen.
+        Otherwise, the fastest plan at the speed is chosen.
+        If no plan meets the target, the closest one is returned with feasible set to False.
+
+        :param list masses: target masses
+        :param int resolution: steps per AMU required. 1 if only the peak intensity is needed.
+        :param float target_snr: signal-to-noise ratio required for the weakest mass
+        :param float cycle_time: maximum seconds for a scan
+        :param list intensities: expected intensities of the masses in 0.1 fA unit
+        :param int speed: scan speed to use without target_snr and cycle_time.
+                          If None, the default scan speed is used
+        :rtype: AcquisitionPlan
+        """
+        if target_snr is not None and intensities is None:
+            raise ValueError('Intensities are needed to plan for a target SNR')
+
+        if target_snr is None and cycle_time is None:
+            speeds = [Defaults.ScanSpeed if speed is None else speed]
+        else:
+            speeds = None
+        candidates = self.get_candidates(masses, resolution, speeds, intensities)
+
+        if target_snr is not None:
+            feasible = [plan for plan in candidates if plan.snr >= target_snr
+                        and (cycle_time is None or plan.cycle_time <= cycle_time)]
+            key = lambda plan: (plan.cycle_time, plan.speed)
+            closest = lambda plan: (-plan.snr, plan.cycle_time)
+        elif cycle_time is not None:
+            feasible = [plan for plan in candidates if plan.cycle_time <= cycle_time]
+            key = lambda plan: (plan.speed, plan.cycle_time)
+            closest = lambda plan: (plan.cycle_time, plan.speed)
+        else:
+            feasible = candidates
+            key = closest = lambda plan: plan.cycle_time
+
+        if feasible:
+            return min(feasible, key=key)
+        plan = min(candidates, key=closest)
+        plan.feasible = False
+        logger.warning('No plan meets the target: SNR {} cycle time {}. Closest: {}'
+                       .format(target_snr, cycle_time, plan))
+        return plan
@@ -7,6 +7,10 @@
 Module contains the main class for operation of SRS RGA100 series
 """
 
+import time
+import logging
+import threading
+
 from srsgui import Instrument
 from srsgui import InstCommunicationError, \
                    InstLoginFailureError, InstIdError
@@ -15,8 +19,15 @@ from srsgui import SerialInterface, TcpipInterface
 from srsgui import FindListInput, Ip4Input, StringInput, PasswordInput, IntegerInput
 
 from .scans import Scans, Scans200, Scans300
+from .batch import CommandBatch
+from .commands import SetValueCache
+from .calibration import CalibrationCommands
+from .timing import ScanTimingModel, OperationCalibrateAll, OperationCalibrateElectrometer
+from .identity import InstrumentState, parse_id_string
 from .components import QMF, Ionizer, Filament, CEM, Pressure, Status
 
+logger = logging.getLogger(__name__)
+
 
 class RGA100(Instrument):
     """
@@ -91,6 +102,85 @@ class RGA100(Instrument):
         self.pressure = Pressure(self)
         self.status = Status(self)
 
+        self._scheduler = None
+        self._batch_local = threading.local()
+
+        self.set_cache = SetValueCache()
+        """
+        Last confirmed values of set commands, i.e., ionizer, CEM HV and QMF parameters,
+        to skip set commands that would change nothing. Enable it with set_cache.enable()
+        """
+
+        self.timing = ScanTimingModel()
+        """
+        Scan duration model calibrated with measured scans, and saved for the serial number
+        """
+
+        self._connect_args = (interface_type,) + args if interface_type else None
+
+        self.identity = None
+        """
+        InstrumentIdentity parsed by check_id() or read_state(), None until then
+        """
+        self._startup_time = time.time()
+
+    def invalidate_caches(self):
+        """
+        Clear the values cached from the RGA, i.e., set_cache and the pressure calibration
+        """
+        self.set_cache.invalidate()
+        self.pressure.invalidate_calibration()
+        self.pressure.total_pressure_enabled = None
+        self.scan.current_speed = None
+
+    def on_command_set(self, remote_command, value=None):
+        """
+        Called by command descriptors of the components when a value is set
+        """
+        if remote_command in CalibrationCommands:
+            self.pressure.invalidate_calibration()
+        elif remote_command == Scans.speed.remote_command:
+            self.scan.current_speed = None if value is None else int(value)
+        elif remote_command == 'TP':
+            self.pressure.total_pressure_enabled = None if value is None else bool(value)
+
+    def batch(self):
+        """
+        Get a CommandBatch to collect set commands and queries
+        and send them in a single write at the exit of a with block.
+        If a batch is already active in the current thread, it is returned.
+
+        Example
+        ---------
+        .. code-block:: python
+
+            with rga.batch():
+                rga.qmf.rf.slope = 1000.0
+                rga.qmf.rf.offset = 0.0
+
+        returns
+        --------
+            CommandBatch
+        """
+        active_batch = getattr(self._batch_local, 'batch', None)
+        if active_batch is not None:
+            return active_batch
+        return CommandBatch(self)
+
+    def get_scheduler(self):
+        """
+        Get the CommandScheduler that runs commands from multiple threads
+        in the order of priority. It is created when called first.
+
+        returns
+        --------
+            CommandScheduler
+        """
+        if self._scheduler is None:
+            from .scheduler import CommandScheduler
+            self._scheduler = CommandScheduler(self)
+        return self._scheduler
+
     def connect(self, interface_type, *args):
         """
         Connect to an instrument over the specified communication interface
@@ -124,11 +214,44 @@ class RGA100(Instrument):
                 TCP port number. The default is 818.
 
         """
+        self.invalidate_caches()
+        self.identity = None
         super().connect(interface_type, *args)
+        self.mark_startup()
+        self._connect_args = (interface_type,) + args if interface_type else None
         if type(self.comm) == SerialInterface:
             # Make sure the hardware flow control is set
             self.comm._serial.rtscts = True
 
+    def get_connect_args(self):
+        """
+        Get the arguments of the last connection to reconnect with connect(*args)
+
+        returns
+        --------
+            tuple or None
+                (interface_type, *args)
+        """
+        if self._connect_args is None and self.comm.type == SerialInterface.NAME:
+            # Connected by srsgui without RGA100.connect(). Only a serial port can be reopened with its info.
+            info = self.comm.get_info()
+            if info.get('port'):
+                return (info['type'], info['port'], info['baud_rate'], info['hardware_flow_control'])
+        return self._connect_args
+
+    def disconnect(self):
+        """
+        Save the timing model for the serial number, if it has new records,
+        and disconnect from the instrument
+        """
+        if self.timing.path and self.timing.modified:
+            try:
+                self.timing.save()
+            except OSError as e:
+                logger.error('Failed to save timing model: {}: {}'.format(e.__class__.__name__, e))
+        self.identity = None
+        super().disconnect()
+
     def check_id(self):
         """
         Check if the connected instrument returns the right ID string
@@ -143,48 +266,119 @@ class RGA100(Instrument):
         if not self.is_connected():
             return None, None, None
 
-        reply = self.query_text('ID?').strip()
-
-        if len(reply) < 20:
+        self._set_identity(parse_id_string(self.query_text('ID?')))
+        if self.identity is None:
             return None, None, None
-
-        model_name = reply[0:9]
-        firmware_version = reply[12:16]
-        serial_number = reply[18:]
-
-        if self._IdString not in reply:
-            raise InstIdError("Invalid instrument: {} not in {}"
-                  .format(self._IdString, model_name))
-        self._id_string = reply
-
-        try:
-            self._m_max = int(reply[6:9])  # uninitialized unit has '???'
-        except ValueError:
-            self._m_max = 100
-
-        self._model_name = model_name
-        self._serial_number = serial_number
-        self._firmware_version = firmware_version
-
-        if self._m_max >= 300:
-            self._m_max = 300
-            if not isinstance(self.scan, Scans300):
-                self.scan = Scans300(self)
-        elif self._m_max >= 200:
-            self._m_max = 200
-            if not isinstance(self.scan, Scans200):
-                self.scan = Scans200(self)
-        elif self._m_max >= 100:
-            self._m_max = 100
-            if not isinstance(self.scan, Scans):
-                self.scan = Scans(self)
         return self._model_name, self._serial_number, self._firmware_version
 
+    def _set_identity(self, identity):
+        self.identity = identity
+        if identity is None:
+            return
+        self._id_string = identity.id_string
+        self._model_name = identity.model_name
+        self._serial_number = identity.serial_number
+        self._firmware_version = identity.firmware_version
+        self._m_max = identity.max_mass
+
+        scans_class = {300: Scans300, 200: Scans200}.get(self._m_max, Scans)
+        if type(self.scan) is not scans_class:
+            # Replace the scan component, and remove the old one from the component tree
+            if self.scan in self._children:
+                self._children.remove(self.scan)
+            self.scan = scans_class(self)
+        self.timing.set_instrument(self._serial_number, self._m_max)
+
+    def get_identity(self):
+        """
+        Get the identity of the RGA. The ID string is queried only if it is not read yet.
+
+        returns
+        --------
+            InstrumentIdentity or None
+        """
+        if self.identity is None:
+            self.check_id()
+        return self.identity
+
+    def read_state(self, clear_buffer=False):
+        """
+        Read the ID string, scan parameters, ionizer parameters and CEM HV in a single write,
+        and update the identity as check_id() does
+
+        Parameters
+        -----------
+            clear_buffer: bool, optional
+                If True, discard any data left in the input buffer before reading
+
+        returns
+        --------
+            InstrumentState
+        """
+        start_time = time.time()
+        if clear_buffer:
+            self.clear_input_buffer()
+        with self.batch() as batch:
+            id_string = batch.query_text('ID?')
+            scan_parameters = [batch.get(self.scan, name)
+                               for name in ('initial_mass', 'final_mass', 'speed', 'resolution')]
+            ionizer_parameters = [batch.get(self.ionizer, name)
+                                  for name in ('electron_energy', 'ion_energy', 'focus_voltage', 'emission_current')]
+            cem_voltage = batch.get(self.cem, 'voltage')
+            batch.flush()  # in case that it is inside another batch
+
+        self._set_identity(parse_id_string(id_string.value))
+        if self.identity is None:
+            raise InstCommunicationError('Invalid ID reply: {}'.format(id_string.value))
+        values = [result.value for result in scan_parameters + ionizer_parameters]
+        self.scan.current_speed = values[2]
+        return InstrumentState(self.identity, *values, cem_voltage.value, start_time, time.time() - start_time)
+
+    def clear_input_buffer(self, timeout=0.1):
+        """
+        Discard data left in the input buffer, i.e., replies of an interrupted operation
+
+        Parameters
+        -----------
+            timeout: float, optional
+                seconds to wait for more data
+        """
+        with self.comm.get_lock():
+            saved_timeout = self.comm.get_timeout()
+            self.comm.set_timeout(timeout)
+            try:
+                while self.comm._recv():
+                    pass
+            except InstCommunicationError:
+                pass
+            finally:
+                self.comm.set_timeout(saved_timeout)
+
+    def mark_startup(self):
+        """
+        Start timing for get_time_to_first_scan(), i.e., at the start of a task.
+        It is called with connect().
+        """
+        self._startup_time = time.time()
+        self.scan.first_scan_time = None
+
+    def get_time_to_first_scan(self):
+        """
+        Get seconds from the connection or the last mark_startup() to the end of the first scan
+
+        returns
+        --------
+            float or None
+                None if no scan has finished since then
+        """
+        if self.scan.first_scan_time is None:
+            return None
+        return self.scan.first_scan_time - self._startup_time
+
     def get_status(self):
-        status_string = 'Emission current: {:.2f} mA\n'.format(self.ionizer.emission_current)
-        status_string += 'CEM HV: {:.0f} V\n'.format(self.cem.voltage)
-        status_string += self.status.get_error_text()
-        return status_string
+        snapshot = self.status.snapshot()
+        return 'Emission current: {:.2f} mA\nCEM HV: {:.0f} V\n{}'.format(
+            snapshot.emission_current, snapshot.cem_voltage, snapshot.get_error_text())
 
     def handle_command(self, cmd_string: str):
         cmd = cmd_string.upper()
@@ -209,9 +403,12 @@ class RGA100(Instrument):
             reply = "Scan Completed"
         else:
             self.send(cmd)
+        if '?' not in cmd:
+            self.invalidate_caches()
         return reply
 
     def reset(self):
+        self.invalidate_caches()
         self.query_text("IN2")
 
     # For RGA100,  RS232 DSR line should be high if RS232 cable is connected
@@ -250,7 +447,8 @@ class RGA100(Instrument):
             int
                 Error status byte after calibration
         """
-        reply = self.comm.query_text_with_long_timeout("CA", 120)
+        self.invalidate_caches()
+        reply = self.timing.time_operation(OperationCalibrateAll, self.comm.query_text_with_long_timeout, "CA")
         error_status = int(reply)
         return error_status
 
@@ -263,7 +461,9 @@ class RGA100(Instrument):
             int
                 Error status byte after calibration
         """
-        reply = self.comm.query_text_with_long_timeout("CL", 120)
+        self.invalidate_caches()
+        reply = self.timing.time_operation(OperationCalibrateElectrometer,
+                                           self.comm.query_text_with_long_timeout, "CL")
         error_status = int(reply)
         return error_status
 
@@ -4,14 +4,128 @@
 ##! 
 
 import time
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
 import numpy as np
 
 from srsgui.inst.communications import Interface, SerialInterface, TcpipInterface
 from srsgui.inst.component import Component
 from srsgui.inst.commands import IntGetCommand
+from srsgui.inst.exceptions import InstCommunicationError
 
 from .commands import IntNSCommand
 from .components import Defaults
+from .timing import AnalogScan, SegmentedAnalogScan, HistogramScan, MultipleMassScan
+
+logger = logging.getLogger(__name__)
+
+
+class SpectrumSnapshot:
+    """
+    Read-only copy of a completed scan, which can be passed to analysis
+    running in another thread or process while the next scan is running.
+
+    parameters
+    -----------
+
+        sequence: int
+            sequence number of the scan
+        scan_type: str
+            'analog_scan', 'histogram_scan', etc.
+        mass_axis: Numpy array or None
+            mass axis of the spectrum
+        spectrum: Numpy array
+            scan data in 0.1 fA unit
+        total_current: int
+            total ion current measured at the end of the scan
+        timestamp: float, optional
+            time when the scan finished. If None, the current time is used
+    """
+
+    def __init__(self, sequence, scan_type, mass_axis, spectrum, total_current=0, timestamp=None):
+        self.sequence = sequence
+        self.scan_type = scan_type
+        self.mass_axis = self._freeze(mass_axis)
+        self.spectrum = self._freeze(spectrum)
+        self.total_current = total_current
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    @staticmethod
+    def _freeze(array):
+        if array is None:
+            return None
+        frozen = np.array(array, dtype=np.double)
+        frozen.setflags(write=False)
+        return frozen
+
+
+ScanRecovery = namedtuple('ScanRecovery', ('total_points', 'points_received', 'retries', 'completed', 'error'))
+"""
+Report of an analog scan recovered from a fault. points_received is the number of valid points
+from the start of the scan, including ones scanned again.
+"""
+
+
+class MergedSpectrum:
+    """
+    Spectrum merged from a histogram scan and high resolution analog scans in mass windows
+
+    attributes
+    -----------
+
+        histogram_axis, histogram: NumPy array
+            histogram scan
+        analog_axis, analog_spectrum: NumPy array
+            analog scans stitched from the windows
+        windows: list of tuple
+            (initial_mass, final_mass) of the analog scans
+        threshold: float
+            intensity of the masses scanned in high resolution
+        mass_axis, spectrum: NumPy array
+            merged spectrum with the analog points in the windows,
+            and the histogram points outside the windows
+        is_analog: NumPy array of bool
+            True for the points from the analog scans
+    """
+
+    def __init__(self, histogram_axis, histogram, analog_axis, analog_spectrum, windows, threshold):
+        self.histogram_axis = np.asarray(histogram_axis, dtype=np.double)
+        self.histogram = np.asarray(histogram, dtype=np.double)
+        self.analog_axis = np.asarray(analog_axis, dtype=np.double)
+        self.analog_spectrum = np.asarray(analog_spectrum, dtype=np.double)
+        self.windows = list(windows)
+        self.threshold = threshold
+
+        outside = np.ones(len(self.histogram_axis), dtype=bool)
+        for initial_mass, final_mass in self.windows:
+            outside &= (self.histogram_axis < initial_mass) | (self.histogram_axis > final_mass)
+        mass_axis = np.concatenate((self.histogram_axis[outside], self.analog_axis))
+        order = np.argsort(mass_axis, kind='stable')
+        self.mass_axis = mass_axis[order]
+        self.spectrum = np.concatenate((self.histogram[outside], self.analog_spectrum))[order]
+        self.is_analog = np.concatenate((np.zeros(np.count_nonzero(outside), dtype=bool),
+                                         np.ones(len(self.analog_axis), dtype=bool)))[order]
+
+    def get_masses(self):
+        """
+        :return: integer masses scanned in high resolution
+        :rtype: list of int
+        """
+        return [mass for initial_mass, final_mass in self.windows for mass in range(initial_mass, final_mass + 1)]
+
+    def get_intensity(self, mass):
+        """
+        Peak intensity of a mass: the maximum of the analog points within 0.5 AMU,
+        or the histogram value for a mass outside the windows
+
+        :rtype: float
+        """
+        selected = self.is_analog & (np.abs(self.mass_axis - mass) < 0.5)
+        if np.any(selected):
+            return float(np.max(self.spectrum[selected]))
+        index = np.flatnonzero(self.histogram_axis == round(mass))
+        return float(self.histogram[index[0]]) if len(index) else 0.0
 
 
 class Scans(Component):
@@ -37,6 +151,11 @@ class Scans(Component):
         self.spectrum = np.array([], dtype=np.double)
         self.previous_spectrum = self.spectrum
         self.total_current = 0
+        self.scan_count = 0  # number of completed analog and histogram scans
+        self.first_scan_time = None  # when the first scan finished after connection, for startup latency
+        self.current_speed = None  # the last scan speed set or queried, for the timing model
+        self.point_speeds = None  # scan speed of each point of an adaptive speed scan
+        self.speed_regions = []
 
         self.analog_scan_command = 'SC1'
         self.histogram_scan_command = 'HS1'
@@ -44,8 +163,15 @@ class Scans(Component):
         self.scan_read = self.read_long
         self.scan_convert = self.convert_to_long
         self.check_buffer_overrun = True
+        self.max_scan_retries = 2  # to scan again the range not received after a fault. 0 to disable
+        self.points_received = 0
+        self.last_recovery = None
+        self.recovery_count = 0
 
         self._data_callback_period = 0.25
+        self._callback_time = 0.0  # time spent in callbacks during a scan exchange
+        self._exchange_time = 0.0  # duration of the last scan exchange without callbacks
+        self._mass_listeners = []
         self.set_callbacks()
 
     def set_callbacks(self, data_available=None, scan_started=None, scan_finished=None):
@@ -77,6 +203,48 @@ class Scans(Component):
         else:
             self._scan_finished_callback = None
 
+    def get_callbacks(self):
+        """
+        Get the current callback functions
+
+        :return: (data_available, scan_started, scan_finished)
+        :rtype: tuple
+        """
+        return self._data_available_callback, self._scan_started_callback, self._scan_finished_callback
+
+    def add_mass_listener(self, listener):
+        """
+        Add a function called with every single mass measurement,
+        including ones in multiple mass scans. The listeners are called after
+        the communication lock is released, i.e., at the end of a multiple mass scan,
+        with the time of each measurement.
+
+        :param listener: function(mass, intensity, timestamp)
+        """
+        if callable(listener) and listener not in self._mass_listeners:
+            self._mass_listeners.append(listener)
+
+    def remove_mass_listener(self, listener):
+        if listener in self._mass_listeners:
+            self._mass_listeners.remove(listener)
+
+    def _complete_scan(self):
+        """
+        Keep the finished scan as the previous spectrum and call the scan_finished callback
+        """
+        self.previous_spectrum = self.spectrum
+        self.scan_count += 1
+        if self.first_scan_time is None:
+            self.first_scan_time = time.time()
+        if self._scan_finished_callback:
+            self._scan_finished_callback()
+
+    def _run_callback(self, callback, *args):
+        # Time spent in callbacks is excluded from the scan durations recorded in the timing model
+        start_time = time.time()
+        callback(*args)
+        self._callback_time += time.time() - start_time
+
     def set_data_callback_period(self, period):
         """
         Set how often data_available_callback function needs to be called during a scan
@@ -97,10 +265,14 @@ class Scans(Component):
 
     def get_max_mass(self):
         """
-        Get maximum mass available to a scan
+        Get maximum mass available to a scan. The ID string is queried
+        only if the identity of the RGA is not read yet.
 
         :rtype: int
         """
+        identity = getattr(self._parent, 'identity', None)
+        if identity is not None:
+            return identity.max_mass
         reply = self.comm.query_text('id?')
         return int(reply[6:9])
 
@@ -136,18 +308,46 @@ class Scans(Component):
                 For a histogram scan, it is 1
         """
 
-        self.final_mass = self.get_max_mass()
-        self.initial_mass = initial_mass
-        self.final_mass = final_mass
-        temp = self.final_mass  # To add a pause
-        self.speed = scan_speed
-        self.resolution = steps_per_amu
+        max_mass = self.get_max_mass()
+        with self._parent.batch():
+            self.final_mass = max_mass
+            self.initial_mass = initial_mass
+            self.final_mass = final_mass
+            temp = self.final_mass  # To add a pause
+            self.speed = scan_speed
+            self.resolution = steps_per_amu
 
     def read_long(self):
         data = self.comm._read_binary(4)
+        if len(data) < 4:
+            raise InstCommunicationError('Scan data timeout after {:.1f} s'.format(self.comm.get_timeout()))
         intensity = self.convert_to_long(data)
         return intensity
 
+    def get_current_speed(self):
+        """
+        Get the scan speed without a query, if it is known from the last setting
+
+        :rtype: int
+        """
+        if self.current_speed is None:
+            self.current_speed = self.speed
+        return self.current_speed
+
+    @contextmanager
+    def _scan_timeout(self, scan_type, speed):
+        # Read timeout from the timing model while reading scan data. Use it with the comm lock held.
+        old_timeout = self.comm.get_timeout()
+        timeout = self._parent.timing.get_read_timeout(scan_type, speed, old_timeout)
+        if timeout == old_timeout:
+            yield
+            return
+        self.comm.set_timeout(timeout)
+        try:
+            yield
+        finally:
+            self.comm.set_timeout(old_timeout)
+
     @staticmethod
     def convert_to_long(data):
         num = int.from_bytes(data, 'little', signed=True)
@@ -176,8 +376,13 @@ class Scans(Component):
         Run an analog scan
 
         Set_scan_parameters() before running
+
+        If the scan data stops or the communication buffer overruns, the data stream is
+        resynchronized, and only the mass range not received is scanned again, up to
+        max_scan_retries times. self.last_recovery reports what was recovered.
         """
         self.scan_type = 'analog_scan'
+        speed = self.get_current_speed()
         try:
             self.comm.query_text('id?')
             total_points = self.total_points_analog
@@ -186,16 +391,49 @@ class Scans(Component):
             total_points = self.total_points_analog
 
         self.spectrum = np.zeros([total_points])
-        with self.comm.get_lock():
+        self.last_recovery = None
+        try:
+            completed = self._read_analog_scan(self.spectrum, speed, self._data_available_callback,
+                                               self._scan_started_callback)
+            error = None if completed else 'Communication buffer overrun'
+        except InstCommunicationError as e:
+            if self.max_scan_retries < 1:
+                raise
+            completed = False
+            error = e
+
+        if completed:
+            self._parent.timing.record(AnalogScan, speed, total_points, self._exchange_time)
+        elif self.max_scan_retries > 0:
+            # With an overrun, points received are not reliable
+            received = self.points_received if isinstance(error, Exception) else 0
+            self._recover_analog_scan(speed, received, error)
+
+        self._complete_scan()
+
+        return self.spectrum
+
+    def _read_analog_scan(self, spectrum, speed, data_available=None, scan_started=None):
+        """
+        Run an analog scan with the current parameters into spectrum.
+        self.points_received is updated with every point as a checkpoint.
+
+        :return: False if the communication buffer overran
+        """
+        self.points_received = 0
+        with self.comm.get_lock(), self._scan_timeout(AnalogScan, speed):
+            self._callback_time = 0.0
+            exchange_start_time = time.time()
             self.comm._send(self.analog_scan_command)
-            if self._scan_started_callback:
-                self._scan_started_callback()
+            if scan_started:
+                self._run_callback(scan_started)
             start_time = time.time()
-            for index in range(total_points):
-                self.spectrum[index] = self.scan_read()
+            for index in range(len(spectrum)):
+                spectrum[index] = self.scan_read()
+                self.points_received = index + 1
                 current_time = time.time()
-                if self._data_available_callback and current_time - start_time > self._data_callback_period:
-                    self._data_available_callback(index)
+                if data_available and current_time - start_time > self._data_callback_period:
+                    self._run_callback(data_available, index)
                     start_time = current_time
             if self.check_buffer_overrun:
                 self.total_current = 0  # if the total current is 0, there are missing bytes.
@@ -203,6 +441,7 @@ class Scans(Component):
             else:
                 self.total_current = 0
                 self.total_current = self.scan_read()
+            self._exchange_time = time.time() - exchange_start_time - self._callback_time
 
         # fix RGA100 comm buffer overflow bug
         if self.check_buffer_overrun:
@@ -211,55 +450,338 @@ class Scans(Component):
             if length > 4:
                 print('Communication buffer reset')
                 self.comm.query_text('IN0')    # if there is extra bytes, reset the RGA
+                return False
             elif length == 4:
                 self.total_current = self.convert_to_long(last_data)
+        return True
+
+    def _resync(self, speed):
+        # Discard the rest of the data stream until the RGA is quiet, and reset the communication
+        with self.comm.get_lock(), self._scan_timeout(AnalogScan, speed):
+            try:
+                while self.comm._recv():
+                    pass
+            except InstCommunicationError:
+                pass
+        self.comm.query_text('IN0')
+
+    def _recover_analog_scan(self, speed, received, error):
+        """
+        Scan again the mass range not received, from the integer mass of the first point missing,
+        and splice the data into self.spectrum. The result is in self.last_recovery.
+        """
+        spectrum = self.spectrum
+        total_points = len(spectrum)
+        retries = 0
+        initial_mass = final_mass = None
+        current_range = None
+        try:
+            while received < total_points and retries < self.max_scan_retries:
+                retries += 1
+                print('Analog scan recovery {} from point {}: {}'.format(retries, received, error))
+                part = None
+                try:
+                    self._resync(speed)
+                    if initial_mass is None:
+                        initial_mass, final_mass = self.initial_mass, self.final_mass
+                        resolution = self.resolution
+                        current_range = initial_mass, final_mass
+                    start_mass = initial_mass + received // resolution
+                    start_index = (start_mass - initial_mass) * resolution
+                    current_range = self._set_mass_range(start_mass, final_mass, current_range)
+                    part = np.zeros(total_points - start_index)
+                    completed = self._read_analog_scan(part, speed)
+                    spectrum[start_index:start_index + self.points_received] = part[:self.points_received]
+                    if completed:
+                        received = total_points
+                    else:
+                        error = 'Communication buffer overrun'
+                except InstCommunicationError as e:
+                    if initial_mass is None:
+                        raise
+                    error = e
+                    if part is not None:
+                        part_received = self.points_received
+                        spectrum[start_index:start_index + part_received] = part[:part_received]
+                        received = max(received, start_index + part_received)
+        finally:
+            if current_range is not None and current_range[0] != initial_mass:
+                self._set_mass_range(initial_mass, final_mass, current_range)
+
+        self.last_recovery = ScanRecovery(total_points, received, retries, received >= total_points, str(error))
+        self.recovery_count += 1
+        if not self.last_recovery.completed:
+            raise InstCommunicationError('Analog scan failed after {} retries with {} of {} points: {}'
+                                         .format(retries, received, total_points, error))
 
-        self.previous_spectrum = self.spectrum
-        if self._scan_finished_callback:
-            self._scan_finished_callback()
+    @staticmethod
+    def get_mass_windows(masses, margin=1, max_mass=MaxMass, min_mass=1):
+        """
+        Make mass windows around masses for a segmented analog scan.
+        Overlapping or adjacent windows are merged into one.
+
+        :param list masses: masses to cover
+        :param int margin: half width of a window in AMU
+        :param int max_mass: upper limit of the windows
+        :param int min_mass: lower limit of the windows
+        :return: list of (initial_mass, final_mass) in increasing order
+        :rtype: list of tuple
+        """
+        windows = sorted((max(min_mass, int(mass) - margin), min(max_mass, int(mass) + margin))
+                         for mass in masses)
+        merged = []
+        for initial_mass, final_mass in windows:
+            if merged and initial_mass <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], final_mass))
+            else:
+                merged.append((initial_mass, final_mass))
+        return merged
+
+    @contextmanager
+    def _composite_scan(self):
+        # Scans run inside count as a single scan, and the callbacks are called once for it.
+        # _complete_scan() should be called after the with block.
+        callbacks = self.get_callbacks()
+        scan_count = self.scan_count
+        self.set_callbacks(None, None, None)
+        try:
+            if callbacks[1]:
+                callbacks[1]()
+            yield
+        finally:
+            self.set_callbacks(*callbacks)
+            self.scan_count = scan_count
+
+    def _set_mass_range(self, initial_mass, final_mass, current_range):
+        # Keep initial mass not larger than final mass while changing the range
+        with self._parent.batch():
+            if initial_mass <= current_range[1]:
+                self.initial_mass = initial_mass
+                self.final_mass = final_mass
+            else:
+                self.final_mass = final_mass
+                self.initial_mass = initial_mass
+        return initial_mass, final_mass
+
+    def get_segmented_analog_scan(self, windows, restore=True):
+        """
+        Run analog scans over mass windows back to back, and stitch them
+        into one sparse spectrum. Only the windows are scanned, so that the scan time
+        depends on the number of windows, not on the span of the masses.
+
+        self.mass_axis is set with the masses of the stitched spectrum.
+        The scan_started and scan_finished callbacks are called once for the whole scan,
+        and data_available is not called.
+
+        :param list windows: list of (initial_mass, final_mass), i.e., from get_mass_windows()
+        :param bool restore: If True, the initial and final mass are restored after the scan
+        :rtype: NumPy array
+        """
+        if not windows:
+            raise ValueError('No mass window to scan')
+        saved_range = self.initial_mass, self.final_mass
+        step = 1.0 / self.resolution
+
+        current_range = saved_range
+        axes = []
+        parts = []
+        with self._composite_scan():
+            scan_start_time = time.time()  # after the scan_started callback
+            try:
+                for initial_mass, final_mass in windows:
+                    current_range = self._set_mass_range(initial_mass, final_mass, current_range)
+                    spectrum = self.get_analog_scan()
+                    axes.append(initial_mass + step * np.arange(len(spectrum)))
+                    parts.append(spectrum)
+            finally:
+                if restore:
+                    self._set_mass_range(*saved_range, current_range)
+
+        self.scan_type = 'segmented_analog_scan'
+        self.mass_axis = np.concatenate(axes)
+        self.spectrum = np.concatenate(parts)
+        self._parent.timing.record(SegmentedAnalogScan, self.get_current_speed(), len(self.spectrum),
+                                   time.time() - scan_start_time, len(parts))
+        self._complete_scan()
+        return self.spectrum
 
+    @staticmethod
+    def get_weak_peak_windows(mass_axis, spectrum, low_snr=3.0, high_snr=30.0, margin=1):
+        """
+        Find mass windows with weak peaks in an analog scan. A peak is weak if its height above
+        the baseline is above low_snr times the noise, but below high_snr times the noise.
+        The baseline is the median of the spectrum, and the noise is estimated from the spectrum.
+
+        :return: list of (initial_mass, final_mass) inside the mass axis
+        :rtype: list of tuple
+        """
+        x = np.asarray(mass_axis)
+        y = np.asarray(spectrum, dtype=np.double)
+        # Noise from the median absolute deviation of point-to-point differences
+        noise = max(1.4826 * np.median(np.abs(np.diff(y))) / np.sqrt(2.0), 1.0)
+        baseline = np.median(y)
+        masses = np.rint(x).astype(int)
+        peaks = np.full(masses[-1] + 1, -np.inf)
+        np.maximum.at(peaks, masses, y - baseline)
+        snr = peaks / noise
+        weak_masses = np.flatnonzero((snr >= low_snr) & (snr < high_snr))
+        weak_masses = weak_masses[(weak_masses >= x[0]) & (weak_masses <= x[-1])]
+        windows = Scans.get_mass_windows(weak_masses, margin, int(np.floor(x[-1])), int(np.ceil(x[0])))
+        return [window for window in windows if window[1] > window[0]]
+
+    def get_adaptive_speed_scan(self, survey_speed=7, slow_speed=3, low_snr=3.0, high_snr=30.0, margin=1):
+        """
+        Run a fast survey analog scan over the current mass range, and re-scan only
+        the regions with weak peaks at a slower speed. The re-scanned points replace
+        the survey points, and the spectrum has the sensitivity of the slow speed for
+        the weak peaks at a fraction of the time of a slow scan.
+
+        self.point_speeds has the scan speed used for each point, and self.speed_regions has
+        (initial_mass, final_mass, speed) of the regions re-scanned.
+        The scan speed is restored after the scan.
+
+        :param int survey_speed: scan speed for the survey, 7 for the fastest
+        :param int slow_speed: scan speed to re-scan weak peaks
+        :param float low_snr: peaks above low_snr times the survey noise are re-scanned
+        :param float high_snr: peaks above high_snr times the survey noise are kept from the survey
+        :param int margin: half width in AMU of re-scanned regions around weak peaks
+        :rtype: NumPy array
+        """
+        speed = self.get_current_speed()
+        regions = []
+        with self._composite_scan():
+            try:
+                self.speed = survey_speed
+                survey = self.get_analog_scan()
+                mass_axis = self.get_mass_axis(True)
+                spectrum = survey.copy()
+                point_speeds = np.full(len(spectrum), survey_speed, dtype=int)
+
+                windows = self.get_weak_peak_windows(mass_axis, survey, low_snr, high_snr, margin)
+                if windows:
+                    self.speed = slow_speed
+                    rescan = self.get_segmented_analog_scan(windows)
+                    indices = np.rint((self.mass_axis - mass_axis[0]) * self.resolution).astype(int)
+                    spectrum[indices] = rescan
+                    point_speeds[indices] = slow_speed
+                    regions = [(initial_mass, final_mass, slow_speed) for initial_mass, final_mass in windows]
+            finally:
+                self.speed = speed
+
+        self.scan_type = 'analog_scan'
+        self.mass_axis = mass_axis
+        self.spectrum = spectrum
+        self.point_speeds = point_speeds
+        self.speed_regions = regions
+        self._complete_scan()
         return self.spectrum
 
+    def get_coarse_fine_scan(self, threshold=None, margin=1):
+        """
+        Run a histogram scan over the current mass range, and high resolution analog scans
+        only in windows around the masses above the threshold.
+        The scan time depends on the number of peaks found, not on the mass range.
+
+        self.mass_axis and self.spectrum are set with the merged spectrum.
+
+        :param float threshold: intensity in 0.1 fA unit for a mass to be scanned in high resolution.
+                                If None, it is 5 times the noise above the median of the histogram scan.
+        :param int margin: half width in AMU of the windows around the masses
+        :rtype: MergedSpectrum
+        """
+        with self._composite_scan():
+            histogram = self.get_histogram_scan()
+            histogram_axis = self.get_mass_axis(False)
+            if threshold is None:
+                median = np.median(histogram)
+                threshold = median + 5.0 * max(1.4826 * np.median(np.abs(histogram - median)), 1.0)
+            masses = histogram_axis[histogram > threshold]
+            windows = self.get_mass_windows(masses, margin, int(histogram_axis[-1]), int(histogram_axis[0]))
+            windows = [window for window in windows if window[1] > window[0]]
+            analog_axis = analog_spectrum = np.array([], dtype=np.double)
+            if windows:
+                analog_spectrum = self.get_segmented_analog_scan(windows)
+                analog_axis = self.mass_axis
+
+        merged = MergedSpectrum(histogram_axis, histogram, analog_axis, analog_spectrum, windows, threshold)
+        self.scan_type = 'coarse_fine_scan'
+        self.mass_axis = merged.mass_axis
+        self.spectrum = merged.spectrum
+        self._complete_scan()
+        return merged
+
     def get_histogram_scan(self):
         """  Run a histogram scan
         """
         self.scan_type = 'histogram_scan'
+        speed = self.get_current_speed()
         total_points = self.total_points_histogram
         self.spectrum = np.zeros([total_points])
-        with self.comm.get_lock():
+        with self.comm.get_lock(), self._scan_timeout(HistogramScan, speed):
+            self._callback_time = 0.0
+            exchange_start_time = time.time()
             self.comm._send(self.histogram_scan_command)
             if self._scan_started_callback:
-                self._scan_started_callback()
+                self._run_callback(self._scan_started_callback)
 
             start_time = time.time()
             for index in range(total_points):
                 self.spectrum[index] = self.scan_read()
                 current_time = time.time()
                 if self._data_available_callback and current_time - start_time > self._data_callback_period:
-                    self._data_available_callback(index)
+                    self._run_callback(self._data_available_callback, index)
                     start_time = current_time
 
             self.total_current = 0
             self.total_current = self.scan_read()
+            self._exchange_time = time.time() - exchange_start_time - self._callback_time
 
-        self.previous_spectrum = self.spectrum
-        if self._scan_finished_callback:
-            self._scan_finished_callback()
+        self._parent.timing.record(HistogramScan, speed, total_points, self._exchange_time)
+        self._complete_scan()
         return self.spectrum
 
-    def get_multiple_mass_scan(self, mass_list):
+    def get_snapshot(self, mass_axis=None):
+        """
+        Get a read-only copy of the last completed scan.
+
+        It is safe to use the snapshot in another thread after the next scan starts.
+
+        :param mass_axis: mass axis of the spectrum. If None, self.mass_axis is used,
+                          if its length matches with the spectrum
+        :rtype: SpectrumSnapshot
+        """
+        if mass_axis is None and len(self.mass_axis) == len(self.previous_spectrum):
+            mass_axis = self.mass_axis
+        return SpectrumSnapshot(self.scan_count, self.scan_type, mass_axis,
+                                self.previous_spectrum, self.total_current)
+
+    def get_multiple_mass_scan(self, mass_list, speeds=None):
         """
         Run a multi mass scan
 
         :param list[int] mass_list: list of masses to measure ion current
+        :param list[int] speeds: optional scan speed for each mass. A scan speed change is
+                                 sent in the same write as the measurement command.
+                                 Masses with the same speed should be next to each other.
         :rtype: NumPy array
         """
 
         self.scan_type = 'multiple_mass_scan'
         self.spectrum = np.zeros(len(mass_list))
-        for index, amu in enumerate(mass_list):
-            intensity = self.get_single_mass_scan(amu)
-            self.spectrum[index] = intensity
+        speed = self.get_current_speed()
+        if speeds is None:
+            speeds = [speed] * len(mass_list)
+        elif len(speeds) != len(mass_list):
+            raise ValueError('{} speeds for {} masses'.format(len(speeds), len(mass_list)))
+        measurements = []
+        with self.comm.get_lock(), self._scan_timeout(MultipleMassScan, min(speeds, default=speed)):
+            for index, amu in enumerate(mass_list):
+                intensity, timestamp = self._measure_single_mass(amu, speeds[index])
+                self.spectrum[index] = intensity
+                measurements.append((amu, intensity, timestamp))
+        self._notify_mass_listeners(measurements)
+        if self.first_scan_time is None:
+            self.first_scan_time = time.time()
         return self.spectrum
 
     def get_single_mass_scan(self, mass):
@@ -270,13 +792,45 @@ class Scans(Component):
         :rtype: float
         """
 
-        self.scan_type = 'single_mass_scan'
-        intensity = 0
-        with self.comm.get_lock():
-            self.comm._send(self.single_mass_scan_command.format(mass))
-            intensity = self.scan_read()
+        speed = self.get_current_speed()
+        with self.comm.get_lock(), self._scan_timeout(MultipleMassScan, speed):
+            intensity, timestamp = self._measure_single_mass(mass, speed)
+        self._notify_mass_listeners([(mass, intensity, timestamp)])
         return intensity
 
+    def _measure_single_mass(self, mass, speed):
+        # Call with the comm lock held. Mass listeners are called after the lock is released.
+        self.scan_type = 'single_mass_scan'
+        command = self.single_mass_scan_command.format(mass)
+        speed_string = None
+        cache = None
+        if speed != self.current_speed:
+            # The speed is set in the same write, bypassing the descriptor. Keep the set cache in sync.
+            speed_command = type(self).speed
+            speed_string = speed_command.get_set_string(speed)
+            cache = speed_command.get_cache(self)
+            if cache is not None:
+                cache.invalidate(speed_command.remote_command)
+            command = speed_string + self.comm.get_term_char().decode() + command
+        start_time = time.time()
+        self.comm._send(command)
+        self.current_speed = speed
+        if cache is not None:
+            cache.confirm(type(self).speed.remote_command, speed_string)
+        intensity = self.scan_read()
+        timestamp = time.time()
+        self._parent.timing.record(MultipleMassScan, speed, 1, timestamp - start_time)
+        return intensity, timestamp
+
+    def _notify_mass_listeners(self, measurements):
+        # A failing listener does not stop the scan or the other listeners
+        for mass, intensity, timestamp in measurements:
+            for listener in list(self._mass_listeners):
+                try:
+                    listener(mass, intensity, timestamp)
+                except Exception as e:
+                    logger.error('Mass listener error: {}: {}'.format(e.__class__.__name__, e))
+
     def set_mass_lock(self, mass):
         """
         fix mass filter to a mass
@@ -0,0 +1,391 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to schedule commands from multiple threads on the single communication channel of an RGA.
+
+The communication lock is held during a whole analog scan, and a status query from another
+thread waits until the scan finishes. CommandScheduler runs all the jobs in a worker thread
+in the order of priority and deadline. Scans are submitted as long jobs with the lowest priority,
+and an analog scan can be split into mass segments, so that short queries waiting in the queue
+run between scans or between segments of a scan, with the latency bounded by the segment duration.
+Only jobs with higher priority than the scan run between segments, and they run with
+the mass range and callbacks of the scan restored. Consecutive text queries submitted
+with query() are sent in a single write with a CommandBatch.
+
+Only the jobs submitted to the scheduler are scheduled. A component attribute used directly
+from another thread, such as rga.ionizer.emission_current, still waits for the communication
+lock held by a scan. While the scheduler runs scans, use call() or query() from other threads.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga import RGA100
+        from srsinst.rga.instruments.rga100.scheduler import CommandScheduler, Priority
+
+        rga = RGA100('serial', 'COM3', 28800)
+        scheduler = rga.get_scheduler()
+
+        scan_future = scheduler.submit_analog_scan(segment_width=10)
+
+        # From another thread, it returns after the current segment finishes.
+        errors = scheduler.call(rga.status.get_errors, priority=Priority.High)
+
+        spectrum = scan_future.result()
+"""
+
+import time
+import heapq
+import logging
+import threading
+from concurrent.futures import Future, CancelledError
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Priority:
+    """
+    Job priorities. A job with a smaller number runs first.
+    """
+    Alarm = 0
+    High = 10
+    Normal = 50
+    Bulk = 100
+
+
+class DeadlineMissedError(Exception):
+    """
+    Raised with a job that could not start before its deadline
+    """
+    pass
+
+
+class _Job:
+    def __init__(self, function, priority, deadline, future, command=None):
+        self.function = function
+        self.command = command  # text query sent in a batch with other queries, if not None
+        self.priority = priority
+        self.deadline = deadline
+        self.future = future
+        self.submitted_time = time.time()
+
+
+class CommandScheduler:
+    """
+    Class to run commands to an RGA100 from multiple threads in a single worker thread
+    in the order of priority, deadline and submission.
+
+    parameters
+    -----------
+
+        rga: RGA100
+            instrument to use. Its components can be used in the submitted functions.
+    """
+
+    def __init__(self, rga):
+        self.rga = rga
+        self._queue = []  # heap of (priority, deadline, sequence, job)
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._thread = None
+        self._running = False
+
+        self.executed_count = 0
+        self.missed_deadline_count = 0
+        self.max_wait_time = {}  # maximum time from submission to start for each priority
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the worker thread after the current job. Pending jobs are cancelled.
+        """
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            for _, _, _, job in self._queue:
+                job.future.cancel()
+            self._queue = []
+            self._condition.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_running(self):
+        return self._running
+
+    def is_worker_thread(self):
+        return self._thread is threading.current_thread()
+
+    def submit(self, function, *args, priority=Priority.Normal, deadline=None, **kwargs):
+        """
+        Submit a function to run in the worker thread
+
+        Parameters
+        -----------
+            function: callable
+                function to run with args and kwargs
+            priority: int, optional
+                smaller number runs first. See Priority
+            deadline: float, optional
+                time.time() value by which the job should start.
+                If the job cannot start by then, the Future raises DeadlineMissedError.
+                Among jobs with the same priority, the earlier deadline runs first.
+
+        Returns
+        --------
+            concurrent.futures.Future
+                Future for the return value of the function
+        """
+        future = Future()
+        if args or kwargs:
+            job_function = lambda: function(*args, **kwargs)
+        else:
+            job_function = function
+        self._push(_Job(job_function, priority, deadline, future))
+        return future
+
+    def call(self, function, *args, priority=Priority.High, deadline=None, timeout=None, **kwargs):
+        """
+        Run a function through the scheduler and wait for the result.
+        If called from the worker thread, the function runs immediately.
+        """
+        if self.is_worker_thread():
+            return function(*args, **kwargs)
+        future = self.submit(function, *args, priority=priority, deadline=deadline, **kwargs)
+        return future.result(timeout)
+
+    def query(self, cmd, priority=Priority.High, deadline=None):
+        """
+        Submit a text query and return a Future for the reply.
+        Queries waiting next to each other in the queue are sent in a single write.
+        """
+        future = Future()
+        self._push(_Job(None, priority, deadline, future, cmd))
+        return future
+
+    def _push(self, job):
+        if not self._running:
+            self.start()
+        with self._condition:
+            self._sequence += 1
+            deadline = float('inf') if job.deadline is None else job.deadline
+            heapq.heappush(self._queue, (job.priority, deadline, self._sequence, job))
+            self._condition.notify()
+
+    def get_pending_count(self):
+        with self._condition:
+            return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                jobs = self._pop_jobs()
+            self._execute(jobs)
+
+    def _pop_jobs(self, priority=None):
+        # Pop the next job, with the queries following it if it is a query.
+        # Called with the condition acquired
+        _, _, _, job = heapq.heappop(self._queue)
+        jobs = [job]
+        while job.command is not None and self._queue and self._queue[0][3].command is not None \
+                and (priority is None or self._queue[0][0] < priority):
+            jobs.append(heapq.heappop(self._queue)[3])
+        return jobs
+
+    def _start(self, job):
+        if not job.future.set_running_or_notify_cancel():
+            return False
+        start_time = time.time()
+        if job.deadline is not None and start_time > job.deadline:
+            self.missed_deadline_count += 1
+            job.future.set_exception(DeadlineMissedError('Job missed deadline by {:.3f} s'
+                                                         .format(start_time - job.deadline)))
+            return False
+
+        wait_time = start_time - job.submitted_time
+        if wait_time > self.max_wait_time.get(job.priority, 0.0):
+            self.max_wait_time[job.priority] = wait_time
+        return True
+
+    def _execute(self, jobs):
+        jobs = [job for job in jobs if self._start(job)]
+        if not jobs:
+            return
+        if jobs[0].command is not None:
+            self._execute_queries(jobs)
+            return
+        job = jobs[0]
+        try:
+            result = job.function()
+        except Exception as e:
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+        self.executed_count += 1
+
+    def _execute_queries(self, jobs):
+        # Send the queries in a single write, and resolve each future with its own reply
+        results = {}
+        error = None
+        try:
+            with self.rga.batch() as batch:
+                for job in jobs:
+                    results[job] = batch.query_text(job.command)
+        except Exception as e:
+            error = e
+        for job in jobs:
+            result = results.get(job)
+            if result is None or not result.done:
+                job.future.set_exception(error)
+                continue
+            try:
+                job.future.set_result(result.value)
+            except Exception as e:
+                job.future.set_exception(e)
+        self.executed_count += len(jobs)
+
+    def has_pending(self, priority):
+        """
+        Check if a job with a priority higher than the priority is waiting
+        """
+        with self._condition:
+            return bool(self._queue) and self._queue[0][0] < priority
+
+    def run_pending(self, priority):
+        """
+        Run the jobs waiting with a priority higher than the priority.
+        It is called in the worker thread by a long job to let urgent jobs run.
+        """
+        while self._running:
+            with self._condition:
+                if not self._queue or self._queue[0][0] >= priority:
+                    return
+                jobs = self._pop_jobs(priority)
+            self._execute(jobs)
+
+    def submit_analog_scan(self, segment_width=None, priority=Priority.Bulk, deadline=None):
+        """
+        Submit an analog scan with the current scan parameters as a long job.
+
+        Parameters
+        -----------
+            segment_width: int, optional
+                If given, the scan is split into segments of the width in AMU, and
+                jobs with higher priority run between segments.
+                The scan_finished callback is called once with the stitched spectrum.
+
+        Returns
+        --------
+            concurrent.futures.Future
+                Future for the spectrum
+        """
+        if not segment_width:
+            return self.submit(self.rga.scan.get_analog_scan, priority=priority, deadline=deadline)
+        segmented_scan = _SegmentedAnalogScan(self, segment_width, priority)
+        job_future = self.submit(segmented_scan.run, priority=priority, deadline=deadline)
+        job_future.add_done_callback(segmented_scan.on_job_done)
+        return segmented_scan.future
+
+    def submit_histogram_scan(self, priority=Priority.Bulk, deadline=None):
+        return self.submit(self.rga.scan.get_histogram_scan, priority=priority, deadline=deadline)
+
+    def submit_multiple_mass_scan(self, mass_list, priority=Priority.Bulk, deadline=None):
+        return self.submit(self.rga.scan.get_multiple_mass_scan, mass_list,
+                           priority=priority, deadline=deadline)
+
+
+class _SegmentedAnalogScan:
+    """
+    Analog scan run in mass segments in a single job. Between segments, jobs with
+    higher priority run with the mass range and callbacks of the scan restored.
+    """
+
+    def __init__(self, scheduler, segment_width, priority):
+        self.scheduler = scheduler
+        self.scan = scheduler.rga.scan
+        self.segment_width = max(int(segment_width), 1)
+        self.priority = priority
+        self.future = Future()
+        self.future.set_running_or_notify_cancel()
+        self.parts = []
+        self.edges = []
+        self.callbacks = (None, None, None)
+
+    def on_job_done(self, job_future):
+        # The job is cancelled or missed its deadline before it started
+        if not self.future.done():
+            try:
+                error = job_future.exception()
+            except CancelledError as e:
+                error = e
+            self.future.set_exception(error if error is not None else
+                                      CancelledError('Segmented scan did not run'))
+
+    def run(self):
+        try:
+            self.initial_mass = self.scan.initial_mass
+            self.final_mass = self.scan.final_mass
+        except Exception as e:
+            self.future.set_exception(e)
+            return
+        edges = list(range(self.initial_mass, self.final_mass, self.segment_width))
+        self.edges = edges + [self.final_mass] if edges else [self.initial_mass, self.final_mass]
+        # Callbacks are called once for the stitched spectrum, not for each segment
+        self.callbacks = self.scan.get_callbacks()
+
+        error = None
+        current_range = (self.initial_mass, self.final_mass)
+        try:
+            for index in range(len(self.edges) - 1):
+                if index > 0 and self.scheduler.has_pending(self.priority):
+                    current_range = self._yield(current_range)
+                if not self.scheduler.is_running():
+                    raise CancelledError('Scheduler stopped during a segmented scan')
+                self.scan.set_callbacks(None, None, None)
+                current_range = self.scan._set_mass_range(self.edges[index], self.edges[index + 1],
+                                                          current_range)
+                spectrum = self.scan.get_analog_scan()
+                # Adjacent segments share the boundary mass point
+                self.parts.append(spectrum if index == 0 else spectrum[1:])
+        except Exception as e:
+            error = e
+        finally:
+            self.finish(current_range, error)
+
+    def _yield(self, current_range):
+        # Let urgent jobs run with the state of the scan as it was before the scan
+        self.scan.set_callbacks(*self.callbacks)
+        current_range = self.scan._set_mass_range(self.initial_mass, self.final_mass, current_range)
+        self.scheduler.run_pending(self.priority)
+        return current_range
+
+    def finish(self, current_range, error=None):
+        try:
+            self.scan._set_mass_range(self.initial_mass, self.final_mass, current_range)
+        except Exception as e:
+            error = error or e
+        self.scan.set_callbacks(*self.callbacks)
+        if error is not None:
+            self.future.set_exception(error)
+            return
+        self.scan.spectrum = np.concatenate(self.parts)
+        self.scan.scan_count -= len(self.parts)  # count the segments as a single scan
+        self.scan._complete_scan()
+        self.future.set_result(self.scan.spectrum)
@@ -0,0 +1,524 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Local server to share one RGA among multiple client processes.
+
+Only one process can open the serial port of an RGA, or the TCP port 818
+of an RGA Ethernet adapter. RgaServer owns the RGA100 connection and accepts
+clients, such as GUI, data logger and alarm daemon, over a local TCP socket.
+Command requests from all clients are serialized through a single worker thread
+and run between scans. Each completed scan is encoded once and fanned out
+to all subscribed clients. Each client has a bounded queue of outgoing messages and
+a writer thread, so that a slow client never blocks the worker thread. Scans are dropped
+for a client that cannot keep up, and the client is disconnected if it falls too far behind.
+
+Messages are JSON objects, one per line. A request has 'id' and 'op' keys,
+and the server replies with the same 'id', 'ok' and 'result' or 'error'.
+Scan data are sent to subscribers as {'event': 'scan', ...} messages, with arrays encoded
+in base64 of little-endian float64.
+
+Example
+---------
+    .. code-block:: python
+
+        # Server process
+        from srsinst.rga import RGA100
+        from srsinst.rga.instruments.rga100.server import RgaServer
+
+        server = RgaServer(RGA100('serial', 'COM3', 28800))
+        server.serve_forever()
+
+        # Client processes
+        from srsinst.rga.instruments.rga100.server import RgaClient
+
+        client = RgaClient()
+        print(client.query('FL?'))
+        client.subscribe(lambda snapshot: print(snapshot.sequence, snapshot.spectrum.max()))
+        client.configure_scan('analog', (1, 50, 3, 10))
+        client.start_scan()
+"""
+
+import json
+import queue
+import socket
+import base64
+import logging
+import threading
+import socketserver
+
+import numpy as np
+
+from .scans import SpectrumSnapshot
+
+logger = logging.getLogger(__name__)
+
+DefaultHost = '127.0.0.1'
+DefaultPort = 18180
+Encoding = 'utf-8'
+
+# Outgoing messages queued for each client, and consecutive scans dropped before disconnecting it
+MaxPendingMessages = 16
+MaxDroppedScans = 50
+
+
+def encode_array(array):
+    return base64.b64encode(np.ascontiguousarray(array, dtype='<f8').tobytes()).decode('ascii')
+
+
+def decode_array(text):
+    return np.frombuffer(base64.b64decode(text), dtype='<f8')
+
+
+def encode_message(message):
+    return (json.dumps(message) + '\n').encode(Encoding)
+
+
+class _ClientHandler(socketserver.StreamRequestHandler):
+    """
+    Handle requests from a client connection. Requests are queued to the server worker,
+    and messages to the client are written by a writer thread from a bounded queue.
+    """
+
+    def setup(self):
+        super().setup()
+        self.connected = True
+        self.dropped_count = 0
+        self._consecutive_drops = 0
+        self._outgoing = queue.Queue(MaxPendingMessages)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        self.server.rga_server.add_client(self)
+
+    def finish(self):
+        self.server.rga_server.remove_client(self)
+        self.connected = False
+        while True:
+            try:
+                self._outgoing.put_nowait(None)
+                break
+            except queue.Full:
+                try:
+                    self._outgoing.get_nowait()
+                except queue.Empty:
+                    pass
+        self._writer.join(1.0)
+        super().finish()
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                self.send_message({'id': None, 'ok': False, 'error': 'Invalid JSON'})
+                continue
+            self.server.rga_server.handle_request(self, request)
+
+    def _write_loop(self):
+        while True:
+            data = self._outgoing.get()
+            if data is None:
+                return
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except (OSError, ValueError):
+                self.connected = False
+                return
+
+    def send_bytes(self, data, droppable=False):
+        """
+        Queue data to send without blocking
+
+        :param bool droppable: If True, the data is dropped when the queue is full,
+                               i.e., a scan for a slow client
+        :return: False if the client is disconnected
+        """
+        if not self.connected:
+            return False
+        try:
+            self._outgoing.put_nowait(data)
+            self._consecutive_drops = 0
+            return True
+        except queue.Full:
+            if droppable and self._consecutive_drops < MaxDroppedScans:
+                self.dropped_count += 1
+                self._consecutive_drops += 1
+                return True
+        logger.warning('Disconnecting client {} that cannot keep up'.format(self.client_address))
+        self.disconnect()
+        return False
+
+    def send_message(self, message):
+        return self.send_bytes(encode_message(message))
+
+    def disconnect(self):
+        self.connected = False
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)  # unblocks the writer and the reader
+        except OSError:
+            pass
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class RgaServer:
+    """
+    Server that owns an RGA100 and multiplexes it among local clients
+
+    parameters
+    -----------
+
+        rga: RGA100
+            connected RGA100 instance. Only the server worker thread uses it.
+        host: str, optional
+            address to listen. The default is the loopback address, for local clients only
+        port: int, optional
+            TCP port to listen
+    """
+
+    def __init__(self, rga, host=DefaultHost, port=DefaultPort):
+        self.rga = rga
+        self.host = host
+        self.port = port
+
+        self._requests = queue.Queue()
+        self._clients = set()
+        self._subscribers = set()
+        self._clients_lock = threading.Lock()
+
+        self._server = None
+        self._server_thread = None
+        self._worker_thread = None
+        self._running = False
+
+        self.scan_type = None
+        self.mass_list = []
+        self.mass_axis = None
+        self.acquiring = False
+        self.sequence = 0
+
+        self.operations = {
+            'command': self._op_command,
+            'status': self._op_status,
+            'configure_scan': self._op_configure_scan,
+            'start_scan': self._op_start_scan,
+            'stop_scan': self._op_stop_scan,
+        }
+
+    def start(self):
+        """
+        Start listening to clients and the worker thread in the background
+        """
+        self._server = _ThreadingServer((self.host, self.port), _ClientHandler)
+        self._server.rga_server = self
+        self.port = self._server.server_address[1]
+        self._running = True
+        self._worker_thread = threading.Thread(target=self._run_worker, daemon=True)
+        self._worker_thread.start()
+        self._server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._server_thread.start()
+        logger.info('RGA server listening on {}:{}'.format(self.host, self.port))
+
+    def serve_forever(self):
+        """
+        Start the server and block until interrupted
+        """
+        self.start()
+        try:
+            self._worker_thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._running = False
+        self._requests.put(None)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._worker_thread is not None and self._worker_thread is not threading.current_thread():
+            self._worker_thread.join()
+
+    def add_client(self, client):
+        with self._clients_lock:
+            self._clients.add(client)
+
+    def remove_client(self, client):
+        with self._clients_lock:
+            self._clients.discard(client)
+            self._subscribers.discard(client)
+
+    def handle_request(self, client, request):
+        """
+        Called from client handler threads. Subscription is handled immediately,
+        and other requests are queued to the worker thread.
+        """
+        op = request.get('op')
+        if op in ('subscribe', 'unsubscribe'):
+            with self._clients_lock:
+                if op == 'subscribe':
+                    self._subscribers.add(client)
+                else:
+                    self._subscribers.discard(client)
+            client.send_message({'id': request.get('id'), 'ok': True, 'result': None})
+        else:
+            self._requests.put((client, request))
+
+    def _run_worker(self):
+        while self._running:
+            # Run all the pending requests between scans
+            block = not self.acquiring
+            while True:
+                try:
+                    item = self._requests.get(block=block, timeout=0.5 if block else None)
+                except queue.Empty:
+                    break
+                if item is None:
+                    return
+                self._process_request(*item)
+                block = False
+            if self.acquiring:
+                self._run_scan()
+
+    def _process_request(self, client, request):
+        reply = {'id': request.get('id')}
+        operation = self.operations.get(request.get('op'))
+        try:
+            if operation is None:
+                raise ValueError('Invalid op: {}'.format(request.get('op')))
+            reply['result'] = operation(request)
+            reply['ok'] = True
+        except Exception as e:
+            reply['ok'] = False
+            reply['error'] = '{}: {}'.format(e.__class__.__name__, e)
+        client.send_message(reply)
+
+    def _op_command(self, request):
+        return self.rga.handle_command(request['cmd'])
+
+    def _op_status(self, request):
+        return self.rga.get_status()
+
+    def _op_configure_scan(self, request):
+        scan_type = request['scan_type']
+        scan = self.rga.scan
+        if scan_type == 'multiple_mass':
+            self.mass_list = [int(m) for m in request['masses']]
+            self.mass_axis = np.array(self.mass_list, dtype=np.float64)
+        elif scan_type in ('analog', 'histogram'):
+            if request.get('parameters'):
+                scan.set_parameters(*request['parameters'])
+            self.mass_axis = scan.get_mass_axis(scan_type == 'analog')
+        else:
+            raise ValueError('Invalid scan type: {}'.format(scan_type))
+        self.scan_type = scan_type
+        return len(self.mass_axis)
+
+    def _op_start_scan(self, request):
+        if self.scan_type is None:
+            raise ValueError('Scan is not configured')
+        self.acquiring = True
+
+    def _op_stop_scan(self, request):
+        self.acquiring = False
+
+    def _run_scan(self):
+        scan = self.rga.scan
+        try:
+            if self.scan_type == 'analog':
+                spectrum = scan.get_analog_scan()
+            elif self.scan_type == 'histogram':
+                spectrum = scan.get_histogram_scan()
+            else:
+                spectrum = scan.get_multiple_mass_scan(self.mass_list)
+        except Exception as e:
+            logger.error('Scan failed: {}: {}'.format(e.__class__.__name__, e))
+            if not self.rga.is_connected():
+                self.acquiring = False
+            return
+        self.sequence += 1
+        snapshot = SpectrumSnapshot(self.sequence, scan.scan_type, self.mass_axis,
+                                    spectrum, scan.total_current)
+        self.broadcast(snapshot)
+
+    def broadcast(self, snapshot):
+        """
+        Encode a snapshot once and send it to all subscribers
+        """
+        data = encode_message({
+            'event': 'scan',
+            'sequence': snapshot.sequence,
+            'scan_type': snapshot.scan_type,
+            'timestamp': snapshot.timestamp,
+            'total_current': snapshot.total_current,
+            'mass_axis': encode_array(snapshot.mass_axis),
+            'spectrum': encode_array(snapshot.spectrum),
+        })
+        with self._clients_lock:
+            subscribers = list(self._subscribers)
+        for client in subscribers:
+            if not client.send_bytes(data, droppable=True):
+                self.remove_client(client)
+
+
+class RgaClient:
+    """
+    Client to use an RGA shared by an RgaServer
+
+    parameters
+    -----------
+
+        host: str, optional
+            server address
+        port: int, optional
+            server TCP port
+        timeout: float, optional
+            time to wait for a reply in seconds
+    """
+
+    def __init__(self, host=DefaultHost, port=DefaultPort, timeout=60.0):
+        self.timeout = timeout
+        self._socket = socket.create_connection((host, port))
+        self._rfile = self._socket.makefile('rb')
+        self._send_lock = threading.Lock()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._next_id = 0
+        self._scan_callback = None
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def close(self):
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read_loop(self):
+        try:
+            for line in self._rfile:
+                message = json.loads(line)
+                if message.get('event') == 'scan':
+                    if self._scan_callback:
+                        self._scan_callback(self._decode_snapshot(message))
+                    continue
+                with self._pending_lock:
+                    waiter = self._pending.pop(message.get('id'), None)
+                if waiter is not None:
+                    waiter[1] = message
+                    waiter[0].set()
+        except (OSError, ValueError) as e:
+            logger.debug('Client reader stopped: {}'.format(e))
+        finally:
+            with self._pending_lock:
+                for event, _ in self._pending.values():
+                    event.set()
+
+    @staticmethod
+    def _decode_snapshot(message):
+        return SpectrumSnapshot(message['sequence'], message['scan_type'],
+                                decode_array(message['mass_axis']),
+                                decode_array(message['spectrum']),
+                                message['total_current'], message['timestamp'])
+
+    def request(self, op, **kwargs):
+        """
+        Send a request to the server and wait for the reply
+
+        Returns
+        --------
+            result of the request
+
+        Raises
+        -------
+            RuntimeError if the server returns an error, or TimeoutError if there is no reply
+        """
+        waiter = [threading.Event(), None]
+        with self._pending_lock:
+            self._next_id += 1
+            request_id = self._next_id
+            self._pending[request_id] = waiter
+        message = dict(kwargs, id=request_id, op=op)
+        with self._send_lock:
+            self._socket.sendall(encode_message(message))
+        if not waiter[0].wait(self.timeout) or waiter[1] is None:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise TimeoutError('No reply for {} from the server'.format(op))
+        reply = waiter[1]
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+        return reply['result']
+
+    def query(self, cmd):
+        """
+        Send a remote command through the server, as RGA100.handle_command() does.
+        """
+        return self.request('command', cmd=cmd)
+
+    def get_status(self):
+        return self.request('status')
+
+    def configure_scan(self, scan_type='analog', parameters=None, masses=None):
+        """
+        Configure the scan the server runs repeatedly
+
+        Parameters
+        -----------
+            scan_type: str
+                'analog', 'histogram' or 'multiple_mass'
+            parameters: tuple, optional
+                (initial_mass, final_mass, scan_speed, steps_per_amu) for analog or histogram scan
+            masses: list of int, optional
+                masses to measure for multiple mass scan
+        """
+        return self.request('configure_scan', scan_type=scan_type,
+                            parameters=list(parameters) if parameters else None,
+                            masses=list(masses) if masses else None)
+
+    def start_scan(self):
+        return self.request('start_scan')
+
+    def stop_scan(self):
+        return self.request('stop_scan')
+
+    def subscribe(self, callback):
+        """
+        Receive scans from the server.
+
+        :param callback: function(snapshot: SpectrumSnapshot) called in the client reader thread
+        """
+        self._scan_callback = callback if callable(callback) else None
+        return self.request('subscribe')
+
+    def unsubscribe(self):
+        self._scan_callback = None
+        return self.request('unsubscribe')
+
+
+if __name__ == "__main__":
+    import sys
+    from .rga import RGA100
+
+    logging.basicConfig(level=logging.INFO)
+    # Usage: python -m srsinst.rga.instruments.rga100.server serial:COM3:28800:True
+    #        python -m srsinst.rga.instruments.rga100.server tcpip:192.168.1.10:admin:admin:818
+    rga = RGA100()
+    rga.connect_with_parameter_string(sys.argv[1])
+    rga.check_id()
+    RgaServer(rga).serve_forever()
@@ -0,0 +1,397 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to keep the connection to an RGA alive through communication faults.
+
+ConnectionSupervisor probes the RGA with a keepalive query while the connection is idle,
+and reconnects with exponential backoff when the RGA stops responding, i.e., after
+a cable is unplugged or an Ethernet adapter reboots. Scan and ionizer parameters are cached
+in a snapshot, read in a single batch, and restored after reconnection, so that an acquisition
+wrapped with run() resumes where it stopped instead of aborting.
+The reconnect latency and the time lost in each gap are recorded with ReconnectEvent.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga import RGA100
+        from srsinst.rga.instruments.rga100.supervisor import ConnectionSupervisor
+
+        rga = RGA100('serial', 'COM3', 28800)
+        rga.scan.set_parameters(1, 50, 3, 10)
+
+        supervisor = ConnectionSupervisor(rga, keepalive_period=5.0)
+        supervisor.start()
+
+        for i in range(100):
+            spectrum = supervisor.run(rga.scan.get_analog_scan)
+
+        supervisor.stop()
+        for event in supervisor.events:
+            print(event.latency, event.gap, event.lost_cycles)
+"""
+
+import time
+import logging
+import threading
+from collections import namedtuple
+
+from srsgui.inst.exceptions import InstCommunicationError, InstIdError, InstQueryError, InstSetError
+
+from .scheduler import Priority
+
+logger = logging.getLogger(__name__)
+
+# Parameters restored after reconnection in the order of restoration, as (component, attribute)
+ScanParameters = (
+    ('scan', 'initial_mass'),
+    ('scan', 'final_mass'),
+    ('scan', 'speed'),
+    ('scan', 'resolution'),
+)
+IonizerParameters = (
+    ('ionizer', 'electron_energy'),
+    ('ionizer', 'ion_energy'),
+    ('ionizer', 'focus_voltage'),
+    ('ionizer', 'emission_current'),
+    ('cem', 'voltage'),
+)
+
+# Errors from a lost connection. serial.SerialException and socket errors are OSError.
+# Remote commands raise InstQueryError or InstSetError for a communication error.
+ConnectionErrors = (InstCommunicationError, InstQueryError, InstSetError, OSError)
+
+ReconnectEvent = namedtuple('ReconnectEvent',
+                            'fault_time restore_time latency attempts gap lost_cycles error')
+ReconnectEvent.__doc__ = """
+Record of a reconnection
+
+    fault_time: time.time() when the fault was detected
+    restore_time: time.time() when the parameters were restored
+    latency: seconds from the fault to the restoration
+    attempts: number of connection attempts
+    gap: seconds from the last successful operation to the restoration
+    lost_cycles: number of acquisition cycles that would have run in the gap
+    error: description of the fault
+"""
+
+
+class ParameterSnapshot:
+    """
+    Scan and ionizer parameters of an RGA, read in a single batch
+
+    attributes
+    -----------
+
+        values: dict
+            parameter values with (component, attribute) as keys
+        timestamp: float
+            time.time() when the snapshot was taken
+    """
+
+    Parameters = ScanParameters + IonizerParameters
+
+    def __init__(self, values=None, timestamp=None):
+        self.values = dict(values) if values else {}
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return 'ParameterSnapshot({})'.format(
+            ', '.join('{}.{}={}'.format(component, name, value)
+                      for (component, name), value in self.values.items()))
+
+    @staticmethod
+    def _read(rga):
+        with rga.batch() as batch:
+            results = {key: batch.get(getattr(rga, key[0]), key[1]) for key in ParameterSnapshot.Parameters}
+            batch.flush()  # in case that it is inside another batch
+        return {key: result.value for key, result in results.items()}
+
+    @classmethod
+    def take(cls, rga):
+        """
+        Read the parameters from the RGA
+
+        :rtype: ParameterSnapshot
+        """
+        return cls(cls._read(rga), time.time())
+
+    def restore(self, rga):
+        """
+        Set the parameters that differ from the values in the RGA.
+        The mass range is set with Scans.set_parameters() to keep the valid order of MI and MF.
+
+        :return: list of (component, attribute) restored
+        """
+        current = self._read(rga)
+        changed = [key for key in self.Parameters
+                   if key in self.values and current.get(key) != self.values[key]]
+        if not changed:
+            return changed
+        if any(key in changed for key in ScanParameters):
+            rga.scan.set_parameters(*(self.values[key] for key in ScanParameters))
+        with rga.batch():
+            for key in IonizerParameters:
+                if key in changed:
+                    setattr(getattr(rga, key[0]), key[1], self.values[key])
+        return changed
+
+
+class ConnectionSupervisor:
+    """
+    Class to supervise the connection to an RGA and reconnect after faults
+
+    parameters
+    -----------
+
+        rga: RGA100
+            instrument to supervise. It should be connected already.
+        keepalive_period: float, optional
+            seconds between keepalive queries while the connection is idle
+        initial_backoff: float, optional
+            seconds to wait before the second connection attempt
+        max_backoff: float, optional
+            the longest wait between connection attempts
+        max_attempts: int, optional
+            connection attempts before giving up a reconnection. None to try until stopped
+        scheduler: CommandScheduler, optional
+            If given, keepalive queries run through the scheduler
+        stop_function: function, optional
+            returns True to give up a reconnection, i.e., lambda: not task.is_running()
+    """
+
+    def __init__(self, rga, keepalive_period=5.0, initial_backoff=0.5, max_backoff=30.0,
+                 max_attempts=None, scheduler=None, stop_function=None):
+        if keepalive_period <= 0 or initial_backoff <= 0 or max_backoff < initial_backoff:
+            raise ValueError('Invalid keepalive period: {} or backoff: {} {}'
+                             .format(keepalive_period, initial_backoff, max_backoff))
+        self.rga = rga
+        self.keepalive_period = keepalive_period
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.scheduler = scheduler
+        self.stop_function = stop_function if callable(stop_function) else None
+
+        self.snapshot = None
+        self.serial_number = rga._serial_number
+        self.events = []
+
+        self.last_success_time = time.time()
+        self.cycle_time = None  # average duration of operations run with run()
+
+        self._reconnect_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.probe_count = 0
+        self.fault_count = 0
+
+    def take_snapshot(self):
+        """
+        Cache the current scan and ionizer parameters to restore after reconnection.
+        It is called by run() when no snapshot is taken yet.
+        Call it again after changing parameters.
+
+        :rtype: ParameterSnapshot
+        """
+        self.snapshot = ParameterSnapshot.take(self.rga)
+        return self.snapshot
+
+    def start(self):
+        """
+        Start keepalive probing in a background thread
+        """
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _is_stopped(self):
+        return self._stop_event.is_set() or (self.stop_function is not None and self.stop_function())
+
+    def _run(self):
+        while not self._stop_event.wait(self.keepalive_period):
+            if time.time() - self.last_success_time < self.keepalive_period:
+                continue  # recent operations show that the connection is alive
+            try:
+                self.probe()
+            except ConnectionErrors as e:
+                try:
+                    self.reconnect(e)
+                except Exception as e:
+                    logger.error('Reconnection failed: {}: {}'.format(e.__class__.__name__, e))
+            except Exception as e:
+                logger.error('Keepalive error: {}: {}'.format(e.__class__.__name__, e))
+
+    def probe(self):
+        """
+        Send a keepalive query. If a scan holds the communication lock, the probe is skipped,
+        because the scan itself shows the connection is alive.
+
+        :return: True if the probe was sent and answered, False if skipped
+        """
+        if not self.rga.is_connected():
+            raise InstCommunicationError('Not connected')
+        if self.scheduler is not None:
+            self.scheduler.call(self._query_id, priority=Priority.High)
+            return True
+        if self.rga.comm.get_lock().locked():
+            return False
+        self._query_id()
+        return True
+
+    def _query_id(self):
+        reply = self.rga.comm.query_text('ID?')
+        if self.rga._IdString not in reply:
+            raise InstCommunicationError('Invalid keepalive reply: {}'.format(reply.strip()))
+        self.probe_count += 1
+        self.last_success_time = time.time()
+
+    def is_connection_lost(self):
+        """
+        Check the connection after a communication error with a keepalive query,
+        after discarding the replies left by the failed operation.
+
+        :return: True if the RGA is disconnected or does not answer the keepalive query
+        """
+        if not self.rga.is_connected():
+            return True
+        try:
+            self.rga.clear_input_buffer()
+            self._query_id()
+        except ConnectionErrors as e:
+            logger.warning('Keepalive failed after an error: {}: {}'.format(e.__class__.__name__, e))
+            return True
+        return False
+
+    def reconnect(self, error=None):
+        """
+        Reconnect to the RGA with exponential backoff, check that it is the same RGA,
+        and restore the parameters in the snapshot. If another thread is reconnecting,
+        wait for it to finish instead.
+
+        :param error: the fault that caused reconnection
+        :rtype: ReconnectEvent
+        """
+        fault_time = time.time()
+        if not self._reconnect_lock.acquire(blocking=False):
+            with self._reconnect_lock:  # wait for the other reconnection
+                pass
+            if not self.rga.is_connected():
+                raise InstCommunicationError('Reconnection by another thread failed')
+            return self.events[-1] if self.events else None
+        try:
+            return self._reconnect(fault_time, error)
+        finally:
+            self._reconnect_lock.release()
+
+    def _reconnect(self, fault_time, error):
+        connect_args = self.rga.get_connect_args()
+        if connect_args is None:
+            raise InstCommunicationError('No connection parameters to reconnect')
+
+        self.fault_count += 1
+        logger.warning('Reconnecting after "{}"'.format(error))
+        backoff = self.initial_backoff
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                self.rga.connect(*connect_args)
+                model_name, serial_number, _ = self.rga.check_id()
+                if model_name is None:
+                    raise InstCommunicationError('No ID reply')
+                break
+            except InstIdError:
+                raise
+            except Exception as e:
+                last_error = e
+            if self.max_attempts is not None and attempts >= self.max_attempts:
+                raise InstCommunicationError('Reconnection failed after {} attempts: {}'
+                                             .format(attempts, last_error))
+            if self._stop_event.wait(backoff) or self._is_stopped():
+                raise InstCommunicationError('Reconnection stopped after {} attempts'.format(attempts))
+            backoff = min(2.0 * backoff, self.max_backoff)
+
+        if self.serial_number is None:
+            self.serial_number = serial_number
+        elif serial_number != self.serial_number:
+            raise InstIdError('Reconnected to RGA {}, not {}'.format(serial_number, self.serial_number))
+
+        if self.snapshot is not None:
+            restored = self.snapshot.restore(self.rga)
+            if restored:
+                logger.info('Restored {}'.format(', '.join('{}.{}'.format(*key) for key in restored)))
+
+        restore_time = time.time()
+        gap = restore_time - min(fault_time, self.last_success_time)
+        lost_cycles = int(gap / self.cycle_time) if self.cycle_time else 0
+        event = ReconnectEvent(fault_time, restore_time, restore_time - fault_time,
+                               attempts, gap, lost_cycles, str(error))
+        self.events.append(event)
+        self.last_success_time = restore_time
+        logger.warning('Reconnected in {:.2f} s after {} attempts, {:.2f} s gap'
+                       .format(event.latency, attempts, gap))
+        return event
+
+    def run(self, function, *args, **kwargs):
+        """
+        Run an acquisition function. If the function fails with a communication error,
+        and the connection is lost, reconnect, restore the parameters and run it again.
+        An error with the connection still alive, i.e., a scan data timeout or a failed
+        scan recovery, is raised to the caller.
+
+        :param function: function to run, i.e., rga.scan.get_analog_scan
+        :return: the return value of the function
+        """
+        if self.snapshot is None and self.rga.is_connected():
+            self.take_snapshot()
+        while True:
+            start_time = time.time()
+            try:
+                if not self.rga.is_connected():
+                    raise InstCommunicationError('Not connected')
+                reply = function(*args, **kwargs)
+            except ConnectionErrors as e:
+                if self._is_stopped() or not self.is_connection_lost():
+                    raise
+                self.reconnect(e)
+                continue
+            end_time = time.time()
+            duration = end_time - start_time
+            self.cycle_time = duration if self.cycle_time is None else \
+                0.8 * self.cycle_time + 0.2 * duration
+            self.last_success_time = end_time
+            return reply
+
+    def get_statistics(self):
+        """
+        :return: reconnection count, mean and maximum latency and gap in seconds, and lost cycles
+        :rtype: dict
+        """
+        latencies = [event.latency for event in self.events]
+        gaps = [event.gap for event in self.events]
+        return {
+            'reconnections': len(self.events),
+            'faults': self.fault_count,
+            'probes': self.probe_count,
+            'mean_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+            'max_latency': max(latencies, default=0.0),
+            'total_gap': sum(gaps),
+            'max_gap': max(gaps, default=0.0),
+            'lost_cycles': sum(event.lost_cycles for event in self.events),
+        }
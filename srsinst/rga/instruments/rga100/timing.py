@@ -0,0 +1,334 @@
+##!
+##! Copyright(c) 2022-2025 Stanford Research Systems, All rights reserved
+##! Subject to the MIT License
+##!
+
+"""
+Module to predict how long scans take.
+
+ScanTimingModel estimates the duration of a scan from its type, scan speed (NF)
+and number of points, as a fixed overhead for each scan or segment plus
+the time for each point. The time for each point doubles with each step of lower
+scan speed, because the RGA integrates twice as long for a lower noise floor.
+
+The model is calibrated with the durations of scans measured by Scans, and of long
+operations like calibration and degas. It is saved in a file for each instrument serial number.
+Once calibrated, it gives tight timeouts for reading scan data and for the long operations,
+so that a hang is detected in seconds, not after a generic long timeout.
+
+Example
+---------
+    .. code-block:: python
+
+        from srsinst.rga import RGA100
+
+        rga = RGA100('serial', 'COM3', 28800)  # loads the timing model saved for the serial number
+        print(rga.timing.predict_analog(1, 65, speed=4, resolution=10))
+        print(rga.timing.predict_multiple_mass([2, 18, 28, 44], speed=4))
+
+        rga.scan.get_analog_scan()  # measured duration calibrates the model
+        rga.timing.save()
+"""
+
+import os
+import json
+import time
+import logging
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+AnalogScan = 'analog_scan'
+SegmentedAnalogScan = 'segmented_analog_scan'
+HistogramScan = 'histogram_scan'
+MultipleMassScan = 'multiple_mass_scan'
+
+ScanTypes = (AnalogScan, SegmentedAnalogScan, HistogramScan, MultipleMassScan)
+
+MaxSpeed = 7
+
+# Nominal seconds per point at the fastest scan speed, and overhead in seconds for each scan,
+# segment or mass. A histogram point is measured with 10 steps per AMU in the RGA.
+DefaultPointTimes = {
+    AnalogScan: 0.0032,
+    SegmentedAnalogScan: 0.0032,
+    HistogramScan: 0.032,
+    MultipleMassScan: 0.0128,
+}
+DefaultOverheads = {
+    AnalogScan: 0.1,
+    SegmentedAnalogScan: 0.15,
+    HistogramScan: 0.1,
+    MultipleMassScan: 0.02,
+}
+
+# Long operations with their default timeouts in seconds, for each unit, i.e., a minute of degas
+OperationCalibrateAll = 'CA'
+OperationCalibrateElectrometer = 'CL'
+OperationDegas = 'DG'
+DefaultOperationTimeouts = {
+    OperationCalibrateAll: 120.0,
+    OperationCalibrateElectrometer: 120.0,
+    OperationDegas: 65.0,
+}
+
+# Timeouts are the predicted time multiplied by the factor plus the margin in seconds
+ReadTimeoutFactor = 3.0
+ReadTimeoutMargin = 1.0
+OperationTimeoutFactor = 1.2
+OperationTimeoutMargin = 5.0
+
+MaxRecords = 100
+DefaultDirectory = os.path.join(os.path.expanduser('~'), '.srsinst', 'rga', 'timing')
+FileVersion = 1
+
+
+def get_analog_points(initial_mass, final_mass, resolution):
+    return (final_mass - initial_mass) * resolution + 1
+
+
+def get_histogram_points(initial_mass, final_mass):
+    return final_mass - initial_mass + 1
+
+
+class ScanTimingModel:
+    """
+    Model of scan duration: overhead for each scan plus time for each point
+
+    parameters
+    -----------
+
+        point_times: dict, optional
+            seconds per point at the fastest speed with scan types as keys
+        overheads: dict, optional
+            seconds of overhead for each scan, segment or mass with scan types as keys
+    """
+
+    def __init__(self, point_times=None, overheads=None):
+        self.point_times = dict(DefaultPointTimes)
+        self.overheads = dict(DefaultOverheads)
+        if point_times:
+            self.point_times.update(point_times)
+        if overheads:
+            self.overheads.update(overheads)
+
+        # (segments, points scaled to the fastest speed, duration) of measured scans
+        self.records = {scan_type: deque(maxlen=MaxRecords) for scan_type in ScanTypes}
+        self.calibrated = set()
+        self.operation_times = {}  # the longest measured time for each unit
+        self._dirty = set()
+        self.modified = False  # True with records not saved yet
+
+        self.serial_number = None
+        self.model = None
+        self.path = None
+
+    @staticmethod
+    def _check(scan_type, speed):
+        if scan_type not in ScanTypes:
+            raise ValueError('Invalid scan type: {}'.format(scan_type))
+        if not 0 <= speed <= MaxSpeed:
+            raise ValueError('Invalid scan speed: {}'.format(speed))
+
+    def get_point_time(self, scan_type, speed):
+        """
+        :return: seconds per point at the scan speed
+        :rtype: float
+        """
+        self._check(scan_type, speed)
+        if scan_type in self._dirty:
+            self.calibrate(scan_type)
+        return self.point_times[scan_type] * 2 ** (MaxSpeed - speed)
+
+    def get_overhead(self, scan_type):
+        self._check(scan_type, 0)
+        if scan_type in self._dirty:
+            self.calibrate(scan_type)
+        return self.overheads[scan_type]
+
+    def is_calibrated(self, scan_type):
+        """
+        Check if the scan type is calibrated, after fitting new records if any
+        """
+        if scan_type in self._dirty:
+            self.calibrate(scan_type)
+        return scan_type in self.calibrated
+
+    def record(self, scan_type, speed, points, duration, segments=1):
+        """
+        Record the measured duration of a scan to calibrate the model
+        """
+        self._check(scan_type, speed)
+        self.records[scan_type].append((segments, points * 2 ** (MaxSpeed - speed), duration))
+        self._dirty.add(scan_type)
+        self.modified = True
+
+    def calibrate(self, scan_type):
+        """
+        Fit the overhead and point time of a scan type to the recorded durations.
+        It is called when the model is used after new records.
+        """
+        self._dirty.discard(scan_type)
+        records = np.array(self.records[scan_type], dtype=np.double).reshape(-1, 3)
+        if len(records) == 0:
+            return
+        a = records[:, :2]
+        y = records[:, 2]
+        if np.linalg.matrix_rank(a) == 2:
+            (overhead, point_time), *_ = np.linalg.lstsq(a, y, rcond=None)
+            if overhead < 0:
+                overhead = 0.0
+                point_time = a[:, 1] @ y / (a[:, 1] @ a[:, 1])
+        else:
+            # All the scans have the same size. Keep the overhead and fit the point time only.
+            overhead = self.overheads[scan_type]
+            point_time = a[:, 1] @ (y - overhead * a[:, 0]) / (a[:, 1] @ a[:, 1])
+        if point_time <= 0:
+            return
+        self.overheads[scan_type] = float(overhead)
+        self.point_times[scan_type] = float(point_time)
+        self.calibrated.add(scan_type)
+
+    def get_read_timeout(self, scan_type, speed, default=None):
+        """
+        Timeout for reading a point of a scan, long enough for the scan to start.
+        Until the scan type is calibrated, it is not shorter than the default.
+
+        :param default: timeout used before calibration, i.e., the current comm timeout
+        :rtype: float
+        """
+        timeout = ReadTimeoutFactor * (self.get_overhead(scan_type) + self.get_point_time(scan_type, speed)) \
+            + ReadTimeoutMargin
+        if default is not None and not self.is_calibrated(scan_type):
+            timeout = max(timeout, default)
+        return timeout
+
+    def get_deadline(self, scan_type, speed, points, segments=1):
+        """
+        Seconds allowed for a whole scan, i.e., for a deadline of a scheduler job
+
+        :rtype: float
+        """
+        return ReadTimeoutFactor * self.predict(scan_type, speed, points, segments) + ReadTimeoutMargin
+
+    def record_operation(self, operation, duration, units=1):
+        """
+        Record the duration of a long operation, i.e., 'CA', 'CL' or 'DG'
+
+        :param int units: number of units in the operation, i.e., minutes of degas
+        """
+        unit_time = duration / max(units, 1)
+        if unit_time > self.operation_times.get(operation, 0.0):
+            self.operation_times[operation] = unit_time
+            self.modified = True
+
+    def get_operation_timeout(self, operation, units=1):
+        """
+        Timeout for a long operation. It is the default timeout until the operation is measured.
+
+        :rtype: float
+        """
+        default = DefaultOperationTimeouts.get(operation, 120.0) * max(units, 1)
+        measured = self.operation_times.get(operation)
+        if measured is None:
+            return default
+        return min(default, OperationTimeoutFactor * measured * max(units, 1) + OperationTimeoutMargin)
+
+    def time_operation(self, operation, function, *args, units=1):
+        """
+        Run a long operation with a timeout from the model, and record its duration.
+        function is called with the timeout as the last argument.
+        """
+        start_time = time.time()
+        reply = function(*args, self.get_operation_timeout(operation, units))
+        self.record_operation(operation, time.time() - start_time, units)
+        return reply
+
+    def set_instrument(self, serial_number, model=None, directory=DefaultDirectory):
+        """
+        Set the instrument serial number and load the model saved for it, if available
+
+        :param str serial_number: serial number of the RGA
+        :param int model: maximum mass of the RGA, 100, 200 or 300
+        :param str directory: where model files are saved
+        """
+        if serial_number == self.serial_number and self.path:
+            return
+        self.serial_number = serial_number
+        self.model = model
+        self.path = os.path.join(directory, 'rga_timing_{}.json'.format(serial_number))
+        if os.path.exists(self.path):
+            try:
+                self.load(self.path)
+            except Exception as e:
+                logger.error('Failed to load timing model {}: {}: {}'.format(self.path, e.__class__.__name__, e))
+
+    def to_dict(self):
+        return {
+            'version': FileVersion,
+            'serial_number': self.serial_number,
+            'model': self.model,
+            'point_times': self.point_times,
+            'overheads': self.overheads,
+            'operation_times': self.operation_times,
+            'records': {scan_type: list(records) for scan_type, records in self.records.items()},
+        }
+
+    def from_dict(self, data):
+        if data.get('version') != FileVersion:
+            raise ValueError('Invalid timing model version: {}'.format(data.get('version')))
+        if self.model is not None and data.get('model') not in (None, self.model):
+            raise ValueError('Timing model for RGA{}, not RGA{}'.format(data.get('model'), self.model))
+        self.point_times.update(data['point_times'])
+        self.overheads.update(data['overheads'])
+        self.operation_times.update(data['operation_times'])
+        for scan_type, records in data['records'].items():
+            if scan_type in self.records:
+                self.records[scan_type].extend(tuple(record) for record in records)
+                if records:
+                    self.calibrated.add(scan_type)
+
+    def save(self, path=None):
+        """
+        Save the model into a JSON file. If path is None, the file for the serial number is used.
+        """
+        path = self.path if path is None else path
+        if path is None:
+            raise ValueError('No path to save the timing model')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        self.modified = False
+
+    def load(self, path):
+        with open(path, 'r') as f:
+            self.from_dict(json.load(f))
+
+    def predict(self, scan_type, speed, points, segments=1):
+        """
+        Predict the duration of a scan
+
+        :param str scan_type: one of ScanTypes
+        :param int speed: scan speed (NF) from 0 to 7
+        :param int points: total number of points
+        :param int segments: number of scans, segments or masses with overhead
+        :return: seconds
+        :rtype: float
+        """
+        return segments * self.get_overhead(scan_type) + points * self.get_point_time(scan_type, speed)
+
+    def predict_analog(self, initial_mass, final_mass, speed, resolution):
+        return self.predict(AnalogScan, speed, get_analog_points(initial_mass, final_mass, resolution))
+
+    def predict_segmented(self, windows, speed, resolution):
+        points = sum(get_analog_points(initial_mass, final_mass, resolution)
+                     for initial_mass, final_mass in windows)
+        return self.predict(SegmentedAnalogScan, speed, points, len(windows))
+
+    def predict_histogram(self, initial_mass, final_mass, speed):
+        return self.predict(HistogramScan, speed, get_histogram_points(initial_mass, final_mass))
+
+    def predict_multiple_mass(self, masses, speed):
+        return self.predict(MultipleMassScan, speed, len(masses), len(masses))
@@ -9,6 +9,7 @@ from matplotlib.axes import Axes
 from srsgui import Task
 from srsinst.rga.plots.basescanplot import BaseScanPlot
 from srsinst.rga.plots.analysis import calculate_baseline
+from srsinst.rga.data.pipeline import AnalysisPipeline, AnalysisWaitTime
 from srsinst.rga.instruments.rga100.scans import Scans
 
 logger = logging.getLogger(__name__)
@@ -32,9 +33,16 @@ class AnalogScanPlot(BaseScanPlot):
 
         save_to_file: bool
             to create a table in the data file
+
+        use_pipeline: bool
+            If True, the baseline of the previous scan is calculated in a worker thread,
+            without delaying the next scan. The baseline is plotted in the thread running the scan,
+            when the next scan starts or with a data callback after it is calculated.
+            The baseline of the last scan is plotted in cleanup().
     """
 
-    def __init__(self, parent: Task, ax: Axes, scan: Scans, plot_name='', save_to_file=True):
+    def __init__(self, parent: Task, ax: Axes, scan: Scans, plot_name='', save_to_file=True,
+                 use_pipeline=False):
         if not issubclass(type(parent), Task):
             raise TypeError('Invalid parent {} is not a Task subclass'.format(type(parent)))
         if not hasattr(ax, 'figure'):
@@ -56,6 +64,10 @@ class AnalogScanPlot(BaseScanPlot):
 
         self.ax.set_ylim(1, 10000)
 
+        self.pipeline = None
+        if use_pipeline:
+            self.pipeline = AnalysisPipeline({'baseline': self.calculate_baseline_stage},
+                                             error_logger=parent.logger)
         self.reset()
 
     def reset(self):
@@ -68,32 +80,44 @@ class AnalogScanPlot(BaseScanPlot):
 
         self.ax.set_xlim(self.initial_mass, self.final_mass, auto=False)
         self.scan.set_callbacks(self.scan_data_available_callback,
-                                None,
+                                self.scan_started_callback,
                                 self.scan_finished_callback)
 
+    def scan_started_callback(self):
+        if self.plot_analysis_results():
+            self.parent.request_figure_update(self.ax.figure)
+
     def scan_data_available_callback(self, index):
         self.data['x'] = self.x_axis[:index]
         self.data['y'] = self.scan.spectrum[:index] * self.conversion_factor
         self.line.set_xdata(self.data['x'])
         self.line.set_ydata(self.data['y'])
+        self.plot_analysis_results()
 
         # Tell GUI to redraw the plot
         self.parent.request_figure_update(self.ax.figure)
 
     def scan_finished_callback(self):
+        if len(self.x_axis) != len(self.scan.spectrum) and len(self.scan.mass_axis) == len(self.scan.spectrum):
+            # A segmented analog scan has a sparse mass axis
+            self.set_x_axis(self.scan.mass_axis)
         self.data['x'] = self.x_axis
         self.data['y'] = self.scan.spectrum * self.conversion_factor
         self.data['prev_x'] = self.data['x']
         self.data['prev_y'] = self.data['y']
-        self.data['prev_baseline'] = calculate_baseline(self.data['y'], 1e-5, 1e6)
 
         self.line.set_xdata(self.data['x'])
         self.line.set_ydata(self.data['y'])
         self.prev_line.set_xdata(self.data['prev_x'])
         self.prev_line.set_ydata(self.data['prev_y'])
 
-        self.prev_baseline.set_xdata(self.data['prev_x'])
-        self.prev_baseline.set_ydata(self.data['prev_baseline'])
+        if self.pipeline:
+            self.plot_analysis_results()
+            self.pipeline.submit(self.scan.get_snapshot(self.x_axis))
+        else:
+            self.data['prev_baseline'] = calculate_baseline(self.data['y'], 1e-5, 1e6)
+            self.prev_baseline.set_xdata(self.data['prev_x'])
+            self.prev_baseline.set_ydata(self.data['prev_baseline'])
 
         if self.first_scan:
             self.first_scan = False
@@ -106,8 +130,32 @@ class AnalogScanPlot(BaseScanPlot):
         self.parent.request_figure_update(self.ax.figure)
         self.save_scan_data(self.scan.spectrum)
 
+    def calculate_baseline_stage(self, snapshot, results):
+        return calculate_baseline(snapshot.spectrum * self.conversion_factor, 1e-5, 1e6)
+
+    def plot_analysis_results(self):
+        """
+        Plot the baseline calculated in the pipeline, if a new one is available
+
+        :return: True if a new baseline is plotted
+        """
+        latest = self.pipeline.take_result() if self.pipeline else None
+        if latest is None:
+            return False
+        snapshot, results = latest
+        self.data['prev_baseline'] = results['baseline']
+        self.prev_baseline.set_xdata(snapshot.mass_axis)
+        self.prev_baseline.set_ydata(self.data['prev_baseline'])
+        return True
+
     def cleanup(self):
         """
         callback functions should be disconnected when task is finished
         """
         self.scan.set_callbacks(None, None, None)
+        if self.pipeline:
+            # Plot the baseline of the last scan
+            self.pipeline.wait(AnalysisWaitTime)
+            if self.plot_analysis_results():
+                self.parent.request_figure_update(self.ax.figure)
+            self.pipeline.stop()
@@ -6,9 +6,6 @@
 import numpy as np
 from numpy.linalg import norm
 
-from scipy import sparse
-from scipy.sparse import linalg
-
 
 def calculate_baseline(y, ratio=1e-6, lam=1e4, niter=20, full_output=False):
     """
@@ -44,6 +41,10 @@ def calculate_baseline(y, ratio=1e-6, lam=1e4, niter=20, full_output=False):
             if full_output == True
 
     """
+    # SciPy is imported when a baseline is calculated first, not when this module is imported
+    from scipy import sparse
+    from scipy.sparse import linalg
+
     L = len(y)
 
     diag = np.ones(L - 2)
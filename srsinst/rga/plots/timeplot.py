@@ -9,6 +9,7 @@ import numpy as np
 from datetime import datetime, timedelta
 from matplotlib.axes import Axes
 from srsgui import Task
+from srsinst.rga.data.retention import RetentionStore
 
 logger = logging.getLogger(__name__)
 
@@ -77,6 +78,8 @@ class TimePlot:
         self._data_buffer_size = 1000000  # Maximum data points per line
         self.data_points = 0  # Current data points in data buffer
         self.max_points_in_plot = 10000  # Maximum point to plot
+        self.retention = None  # RetentionStore for long-running trends
+        self.listeners = []  # functions called with every data point added
 
         if self.use_datetime:
             self.time = np.zeros(self._data_buffer_size).astype('datetime64[ms]')
@@ -144,6 +147,27 @@ class TimePlot:
         for key in self.data_keys:
             self.data[key] = np.zeros(size)
 
+    def enable_retention(self, **kwargs):
+        """
+        Keep rollups of the data in a RetentionStore for long-running measurement.
+        Keyword arguments are passed to RetentionStore.
+
+        When the data buffer is full, the older half of the buffer is discarded.
+        The discarded data are plotted from the rollups of the retention store,
+        and the store is saved next to the data file in cleanup().
+        """
+        self.retention = RetentionStore(self.data_keys, **kwargs)
+        return self.retention
+
+    def add_listener(self, listener):
+        """
+        Add a function(values, timestamp) called with every data point added.
+        values are converted with the conversion factor, and timestamp is time.time()
+        of the data point in the plot
+        """
+        if callable(listener):
+            self.listeners.append(listener)
+
     def set_conversion_factor(self, factor=0.1, unit='fA'):
         old_factor = self.conversion_factor
         self.conversion_factor = factor
@@ -158,15 +182,29 @@ class TimePlot:
         self.ax.set_ylabel('Intensity ({})'.format(self.unit))
 
     def add_data(self, data_list=(0,), update_figure=False):
+        if self.retention is not None and self.data_points >= self._data_buffer_size:
+            self.discard_old_data()
+
+        timestamp = time.time()
         if self.use_datetime:
-            self.time[self.data_points] = np.datetime64(datetime.now())
+            self.time[self.data_points] = np.datetime64(datetime.fromtimestamp(timestamp))
         else:
-            self.time[self.data_points] = time.time() - self.initial_time
+            self.time[self.data_points] = timestamp - self.initial_time
 
         for key, point in zip(self.data_keys, data_list):
             self.data[key][self.data_points] = point * self.conversion_factor
         self.data_points += 1
 
+        if self.retention is not None or self.listeners:
+            converted = [point * self.conversion_factor for point in data_list]
+            if self.retention is not None:
+                self.retention.add(converted, timestamp)
+            for listener in self.listeners:
+                try:
+                    listener(converted, timestamp)
+                except Exception as e:
+                    logger.error('Listener error: {}: {}'.format(e.__class__.__name__, e))
+
         if self.data_points == 1:
             min_value = min(data_list)
             max_value = max(data_list)
@@ -180,6 +218,18 @@ class TimePlot:
             self.update_plot()
         self.save_data(self.time[self.data_points - 1], data_list)
 
+    def discard_old_data(self):
+        """
+        Discard the older half of the data buffer to make room for new data.
+        It is used only with retention enabled, which keeps the discarded data in rollups.
+        """
+        half = self.data_points // 2
+        remaining = self.data_points - half
+        self.time[:remaining] = self.time[half:self.data_points]
+        for key in self.data_keys:
+            self.data[key][:remaining] = self.data[key][half:self.data_points]
+        self.data_points = remaining
+
     def save_data(self, timestamp, data_list):
         if not self.save_to_file:
             return
@@ -237,13 +287,68 @@ class TimePlot:
         index[1] = self.data_points if index[1] >= self.data_points else index[1] + 1
 
         s = slice(index[0], index[1], index_step)
+        retained_time, retained_data = self.get_retained_data(xl[0])
         for key in self.data_keys:
-            self.lines[key].set_xdata(self.time[s])
-            self.lines[key].set_ydata(self.data[key][s])
+            if len(retained_time):
+                self.lines[key].set_xdata(np.concatenate((retained_time, self.time[s])))
+                self.lines[key].set_ydata(np.concatenate((retained_data[key], self.data[key][s])))
+            else:
+                self.lines[key].set_xdata(self.time[s])
+                self.lines[key].set_ydata(self.data[key][s])
 
         self.parent.request_figure_update(self.ax.figure)
         self.figure_updated_time = current_time
 
+    def get_retained_data(self, start):
+        """
+        Get the mean rollups of the data discarded from the data buffer, from start
+        to the oldest data in the buffer.
+
+        Returns
+        --------
+            tuple
+                (time array in the x axis unit, dict of data arrays with data names as keys)
+        """
+        empty = np.array([], dtype=self.time.dtype)
+        if self.retention is None or self.data_points == 0:
+            return empty, {}
+        start = self._to_timestamp(start)
+        stop = self._to_timestamp(self.time[0])
+        if start >= stop:
+            return empty, {}
+        resolution, data = self.retention.query(start, stop, self.max_points_in_plot)
+        if resolution == 0:
+            times, values = data
+        else:
+            times, values = data['time'], data['mean']
+        keep = times < stop
+        times, values = times[keep], values[keep]
+        if self.use_datetime:
+            times = np.array([np.datetime64(datetime.fromtimestamp(t)) for t in times],
+                             dtype=self.time.dtype)
+        else:
+            times = times - self.initial_time
+        return times, {key: values[:, i] for i, key in enumerate(self.data_keys)}
+
+    def _to_timestamp(self, x):
+        if self.use_datetime:
+            return np.datetime64(x, 'ms').astype(datetime).timestamp()
+        return float(x) + self.initial_time
+
+    def save_retention(self):
+        """
+        Save the retention store in a file named after the data file, with '.retention.npz' appended
+        """
+        handler = getattr(self.parent, 'session_handler', None)
+        if self.retention is None or not self.save_to_file or not getattr(handler, 'file_name', None):
+            return
+        file_name = handler.path / '{}-{}.retention.npz'.format(handler.file_name, self.name)
+        try:
+            self.retention.save(file_name)
+            logger.info('Retention store saved in {}'.format(file_name))
+        except OSError as e:
+            logger.error('Failed to save retention store: {}: {}'.format(e.__class__.__name__, e))
+
     def cleanup(self):
-        pass
+        self.save_retention()
 
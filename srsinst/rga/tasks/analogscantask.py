@@ -6,6 +6,7 @@
 from srsgui import Task
 from srsgui import ListInput, IntegerInput, InstrumentInput
 from srsinst.rga import AnalogScanPlot
+from srsinst.rga.instruments.rga100.supervisor import ConnectionSupervisor
 
 # get_rga is imported from the path relative to the .taskconfig file
 from instruments import get_rga
@@ -36,10 +37,13 @@ class AnalogScanTask(Task):
     def setup(self):
         # Get values to use for task  from input_parameters in GUI
         self.params = self.get_all_input_parameters()
+        self.supervisor = None
 
         # Get the instrument to use
         self.rga = get_rga(self, self.params[self.InstrumentName])
-        self.id_string = self.rga.status.id_string
+        self.rga.mark_startup()
+        self.state = self.rga.read_state()  # ID and parameters in a single write
+        self.id_string = self.state.identity.id_string
 
         # Get logger to use
         self.logger = self.get_logger(__name__)
@@ -48,7 +52,7 @@ class AnalogScanTask(Task):
 
         # Set up an analog scan plot
         self.ax = self.get_figure().add_subplot(111)
-        self.plot = AnalogScanPlot(self, self.ax, self.rga.scan, 'Analog Scan')
+        self.plot = AnalogScanPlot(self, self.ax, self.rga.scan, 'Analog Scan', use_pipeline=True)
 
         if self.params[self.IntensityUnit] == 0:
             self.conversion_factor = 0.1
@@ -58,8 +62,8 @@ class AnalogScanTask(Task):
             self.plot.set_conversion_factor(self.conversion_factor, 'Torr')
 
     def init_scan(self):
-        emission_current = self.rga.ionizer.emission_current
-        cem_voltage = self.rga.cem.voltage
+        emission_current = self.state.emission_current
+        cem_voltage = self.state.cem_voltage
 
         self.logger.info('Emission current: {:.2f} mA CEM HV: {} V'.format(emission_current, cem_voltage))
 
@@ -72,9 +76,26 @@ class AnalogScanTask(Task):
         self.set_task_passed(True)
         self.add_details('{}'.format(self.id_string), key='ID')
 
+        # Reconnect and resume scanning, if the connection is lost
+        self.supervisor = supervisor = ConnectionSupervisor(self.rga, stop_function=lambda: not self.is_running())
+        supervisor.start()  # keepalive while the connection is idle
+        event_count = 0
+        startup_reported = False
         while self.is_running():
             try:
-                self.rga.scan.get_analog_scan()
+                supervisor.run(self.rga.scan.get_analog_scan)
+                if not startup_reported:
+                    startup_reported = True
+                    self.logger.info('Time to first scan: {:.2f} s'.format(self.rga.get_time_to_first_scan()))
+                if len(supervisor.events) > event_count:
+                    event_count = len(supervisor.events)
+                    event = supervisor.events[-1]
+                    self.logger.warning('Reconnected in {:.1f} s after "{}", {} scans lost'
+                                        .format(event.latency, event.error, event.lost_cycles))
+                recovery = self.rga.scan.last_recovery
+                if recovery:
+                    self.logger.warning('Scan recovered after {} retries from "{}"'
+                                        .format(recovery.retries, recovery.error))
             except Exception as e:
                 self.set_task_passed(False)
                 self.logger.error('{}: {}'.format(e.__class__.__name__, e))
@@ -84,6 +105,8 @@ class AnalogScanTask(Task):
 
     def cleanup(self):
         self.logger.info('Task finished')
+        if self.supervisor is not None:
+            self.supervisor.stop()
         self.plot.cleanup()  # Detach callback functions used in the plot
 
 
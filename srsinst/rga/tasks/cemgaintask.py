@@ -86,8 +86,8 @@ class CEMGainTask(Task):
 
     def init_rga(self):
         self.rga = get_rga(self, self.params[self.InstrumentName])
-        print(self.rga.status.id_string)
-        self.id_string = self.rga.status.id_string
+        self.id_string = self.rga.get_identity().id_string
+        print(self.id_string)
         self.old_speed = self.rga.scan.speed
         self.old_hv = self.rga.cem.voltage
 
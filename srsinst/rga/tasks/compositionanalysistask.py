@@ -9,6 +9,7 @@ from srsgui.task.inputs import StringInput, IntegerInput, InstrumentInput
 from srsinst.rga.plots.analysis import get_peak_from_analog_scan
 from srsinst.rga.plots.analogscanplot import AnalogScanPlot
 from srsinst.rga.plots.timeplot import TimePlot
+from srsinst.rga.data.alarms import create_alarm_engine
 
 import numpy as np
 from scipy.optimize import nnls
@@ -28,6 +29,7 @@ from a gas library file.
     ScanSpeed = 'scan speed'
     StepSize = 'step per AMU'
     GasList = 'gas list'
+    AlarmRules = 'alarm rules'
 
     CompPlot = 'composition_plot'
     DerivedPvsTPlot = 'derived_pvst'
@@ -40,6 +42,7 @@ from a gas library file.
         ScanSpeed: IntegerInput(3, " ", 0, 9, 1),
         StepSize: IntegerInput(20, " steps per AMU", 10, 80, 1),
         GasList: StringInput('water, nitrogen, oxygen, hydrogen, argon, carbon dioxide'),
+        AlarmRules: StringInput(""),
     }
 
     additional_figure_names = [CompPlot, DerivedPvsTPlot]
@@ -65,6 +68,10 @@ from a gas library file.
         self.ax_pvst = self.get_figure(self.DerivedPvsTPlot).add_subplot(111)
         self.pvst_plot = TimePlot(self, self.ax_pvst, 'PP vs T', self.gas_list)
         self.pvst_plot.ax.set_yscale('log')
+        self.pvst_plot.enable_retention()
+
+        # Alarm rules, i.e., '18 > 1e-7; 18/28 > 0.5', are evaluated with every P vs T data point
+        self.alarms = create_alarm_engine(self.gas_list, self.params[self.AlarmRules], self.pvst_plot, self.logger)
 
         # Set up a composition analysis plot for the last full analog scan
         self.ax_comp = self.get_figure(self.CompPlot).add_subplot(111)
@@ -112,9 +119,11 @@ from a gas library file.
     def init_scan(self):
         # Get the instrument to use
         self.rga = get_rga(self, self.params[self.InstrumentName])
-        self.id_string = self.rga.status.id_string
-        emission_current = self.rga.ionizer.emission_current
-        cem_voltage = self.rga.cem.voltage
+        self.rga.mark_startup()
+        self.state = self.rga.read_state()  # ID and parameters in a single write
+        self.id_string = self.state.identity.id_string
+        emission_current = self.state.emission_current
+        cem_voltage = self.state.cem_voltage
 
         self.logger.info('Emission current: {:.2f} mA CEM HV: {} V'.format(emission_current, cem_voltage))
         self.rga.scan.set_parameters(self.params[self.StartMass],
@@ -173,6 +182,7 @@ from a gas library file.
     def cleanup(self):
         self.logger.info('Task finished')
         self.plot.cleanup()  # Detach callback functions
+        self.pvst_plot.cleanup()  # Save the retention store
 
     def read_gas_library(self, file_name='gaslib.dat'):
         """
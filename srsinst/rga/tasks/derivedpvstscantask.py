@@ -7,6 +7,7 @@ from srsgui import Task
 from srsgui.task.inputs import ListInput, IntegerInput, StringInput, InstrumentInput
 
 from srsinst.rga.plots.timeplot import TimePlot
+from srsinst.rga.data.alarms import create_alarm_engine
 from srsinst.rga.plots.analogscanplot import AnalogScanPlot
 
 # get_rga is imported from the path relative to the .taskconfig file
@@ -14,13 +15,14 @@ from instruments import get_rga
 
 
 class DerivedPvsTScanTask(Task):
-    """Task to run analog scans wide enough to cover all the specified masses
+    """Task to run segmented analog scans over windows around the specified masses
 and extract ion intensity for the masses from the analog scans.
     """
     InstrumentName = 'instrument to control'
     MassesToMeasure = 'masses to measure'
     ScanSpeed = 'scan speed'
     IntensityUnit = 'intensity unit'
+    AlarmRules = 'alarm rules'
 
     LogPlot = 'log_scan_plot'
     DerivedPvsTPlot = 'derived_pvst'
@@ -31,6 +33,7 @@ and extract ion intensity for the masses from the analog scans.
         MassesToMeasure: StringInput("2, 18, 28, 44"),
         ScanSpeed: IntegerInput(3, " ", 0, 9, 1),
         IntensityUnit: ListInput(['Ion current (fA)', 'Partial Pressure (Torr)']),
+        AlarmRules: StringInput(""),
     }
     additional_figure_names = [LogPlot, DerivedPvsTPlot]
 
@@ -44,21 +47,24 @@ and extract ion intensity for the masses from the analog scans.
         self.mass_list = list(map(int, self.params[self.MassesToMeasure].split(',')))
 
         self.rga = get_rga(self, self.params[self.InstrumentName])
-        self.id_string = self.rga.status.id_string
+        self.rga.mark_startup()
+        self.state = self.rga.read_state()  # ID and parameters in a single write
+        self.id_string = self.state.identity.id_string
 
-        margin = 5
-        initial_mass = min(self.mass_list) - margin if min(self.mass_list) > margin else 1
-        final_mass = max(self.mass_list) + margin if max(self.mass_list) < self.rga.scan.get_max_mass() \
-            else self.rga.scan.get_max_mass()
+        # Scan only windows around the masses, not the whole span of the masses
+        margin = 1
+        self.windows = self.rga.scan.get_mass_windows(self.mass_list, margin, self.rga.scan.get_max_mass())
+        initial_mass = self.windows[0][0]
+        final_mass = self.windows[-1][1]
 
         self.rga.scan.speed = self.params[self.ScanSpeed]
         self.rga.scan.resolution = 10
         self.rga.scan.set_parameters(initial_mass, final_mass, self.params[self.ScanSpeed], self.rga.scan.resolution)
-        self.logger.info('Scan initial mass: {}, final mass: {}, scan speed: {}, steps per AMU: {}'
-                         .format(initial_mass, final_mass, self.params[self.ScanSpeed], self.rga.scan.resolution))
+        self.logger.info('Scan windows: {}, scan speed: {}, steps per AMU: {}'
+                         .format(self.windows, self.params[self.ScanSpeed], self.rga.scan.resolution))
 
-        emission_current = self.rga.ionizer.emission_current
-        cem_voltage = self.rga.cem.voltage
+        emission_current = self.state.emission_current
+        cem_voltage = self.state.cem_voltage
         self.logger.info('Emission current: {:.2f} mA CEM HV: {} V'.format(emission_current, cem_voltage))
 
         # Set up an derived P vs T plot
@@ -66,6 +72,10 @@ and extract ion intensity for the masses from the analog scans.
         key_list = list(map(str, self.mass_list))
         self.pvst_plot = TimePlot(self, self.ax_pvst, 'Derived P vs T', key_list)
         self.pvst_plot.ax.set_yscale('log')
+        self.pvst_plot.enable_retention()
+
+        # Alarm rules, i.e., '18 > 1e-7; 18/28 > 0.5', are evaluated with every P vs T data point
+        self.alarms = create_alarm_engine(key_list, self.params[self.AlarmRules], self.pvst_plot, self.logger)
 
         # Set up an analog scan plot
         self.ax_analog = self.get_figure().add_subplot(111) # use the default figure
@@ -92,7 +102,7 @@ and extract ion intensity for the masses from the analog scans.
         self.set_task_passed(True)
         while self.is_running():
             try:
-                self.rga.scan.get_analog_scan()
+                self.rga.scan.get_segmented_analog_scan(self.windows, restore=False)
 
                 # manually update self.plot_log
                 self.line_log.set_xdata(self.plot_analog.data['prev_x'])
@@ -116,4 +126,4 @@ and extract ion intensity for the masses from the analog scans.
                     break
 
     def cleanup(self):
-        pass
+        self.pvst_plot.cleanup()  # Save the retention store
@@ -8,6 +8,7 @@ import time
 from srsgui import Task
 from srsgui import ListInput, IntegerInput, InstrumentInput
 from srsinst.rga import HistogramScanPlot
+from srsinst.rga.instruments.rga100.supervisor import ConnectionSupervisor
 
 # get_rga is imported from the path relative to the .taskconfig file
 from instruments import get_rga
@@ -37,6 +38,7 @@ class HistogramScanTask(Task):
 
         # Get values to use for task  from input_parameters in GUI
         self.params = self.get_all_input_parameters()
+        self.supervisor = None
 
         # Get logger to use
         self.logger = self.get_logger(__name__)
@@ -58,9 +60,11 @@ class HistogramScanTask(Task):
     def init_scan(self):
         # Get the instrument to use
         self.rga = get_rga(self, self.params[self.InstrumentName])
-        self.id_string = self.rga.status.id_string
-        emission_current = self.rga.ionizer.emission_current
-        cem_voltage = self.rga.cem.voltage
+        self.rga.mark_startup()
+        self.state = self.rga.read_state()  # ID and parameters in a single write
+        self.id_string = self.state.identity.id_string
+        emission_current = self.state.emission_current
+        cem_voltage = self.state.cem_voltage
 
         self.logger.info('Emission current: {:.2f} mA CEM HV: {} V'.format(emission_current, cem_voltage))
         self.rga.scan.set_parameters(self.params[self.StartMass],
@@ -69,11 +73,24 @@ class HistogramScanTask(Task):
 
     def test(self):
         self.set_task_passed(True)
-        self.add_details('{}'.format(self.rga.status.id_string), key='ID')
+        self.add_details('{}'.format(self.id_string), key='ID')
 
+        # Reconnect and resume scanning, if the connection is lost
+        self.supervisor = supervisor = ConnectionSupervisor(self.rga, stop_function=lambda: not self.is_running())
+        supervisor.start()  # keepalive while the connection is idle
+        event_count = 0
+        startup_reported = False
         while self.is_running():
             try:
-                self.rga.scan.get_histogram_scan()
+                supervisor.run(self.rga.scan.get_histogram_scan)
+                if not startup_reported:
+                    startup_reported = True
+                    self.logger.info('Time to first scan: {:.2f} s'.format(self.rga.get_time_to_first_scan()))
+                if len(supervisor.events) > event_count:
+                    event_count = len(supervisor.events)
+                    event = supervisor.events[-1]
+                    self.logger.warning('Reconnected in {:.1f} s after "{}", {} scans lost'
+                                        .format(event.latency, event.error, event.lost_cycles))
             except Exception as e:
                 self.set_task_passed(False)
                 self.logger.error('{}: {}'.format(e.__class__.__name__, e))
@@ -82,6 +99,8 @@ class HistogramScanTask(Task):
 
     def cleanup(self):
         self.logger.info('Task finished')
+        if self.supervisor is not None:
+            self.supervisor.stop()
 
 
 if __name__ == '__main__':
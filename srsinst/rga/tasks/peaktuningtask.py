@@ -13,6 +13,7 @@ from srsgui import Task
 from srsgui import FloatInput, IntegerInput, StringInput
 
 from srsinst.rga.plots.analysis import calculate_baseline
+from srsinst.rga.data.pipeline import AnalysisPipeline, AnalysisWaitTime
 
 # get_rga is imported from the path relative to the .taskconfig file
 from instruments import get_rga
@@ -56,8 +57,9 @@ Before start, select the maximum mass you want to see in the plot.
         self.mass_limit_value = self.get_input_parameter(self.MassLimit)
 
         self.rga = get_rga(self)
-        print(self.rga.comm.query_text('id?'))  # clear buffer
-        self.id_string = self.rga.comm.query_text('id?')
+        self.rga.mark_startup()
+        self.state = self.rga.read_state(clear_buffer=True)
+        self.id_string = self.state.identity.id_string
 
         self.start_value = 1
         self.stop_value = self.mass_limit_value
@@ -76,6 +78,7 @@ Before start, select the maximum mass you want to see in the plot.
         self.init_plot()
         self.notify_data_available(self.data_dict)
 
+        self.pipeline = AnalysisPipeline({'peaks': self.analyze_peaks}, error_logger=self.logger)
         self.rga.scan.set_callbacks(self.update_callback, None, self.scan_finished_callback)
         self.rga.scan.set_data_callback_period(0.5)
 
@@ -152,10 +155,11 @@ Before start, select the maximum mass you want to see in the plot.
                 self.dc_slope_value  = self.input_parameters[self.DCSlope].value
                 self.dc_offset_value  = self.input_parameters[self.DCOffset].value
 
-                self.rga.qmf.rf.slope = self.rf_slope_value
-                self.rga.qmf.rf.offset = self.rf_offset_value
-                self.rga.qmf.dc.slope = self.dc_slope_value
-                self.rga.qmf.dc.offset = self.dc_offset_value
+                with self.rga.batch():
+                    self.rga.qmf.rf.slope = self.rf_slope_value
+                    self.rga.qmf.rf.offset = self.rf_offset_value
+                    self.rga.qmf.dc.slope = self.dc_slope_value
+                    self.rga.qmf.dc.offset = self.dc_offset_value
 
             self.add_details('Final cal values', '\n2')
             self.add_details(f'{self.rf_slope_value:.1f}', 'RF slope')
@@ -177,37 +181,52 @@ Before start, select the maximum mass you want to see in the plot.
 
         self.line000.set_xdata(self.data_dict['x'])
         self.line000.set_ydata(self.data_dict['y'])
+        self.plot_latest_peaks()
         self.notify_data_available()
 
     def scan_finished_callback(self):
-        try:
-            w_height = 0.5
-            peak_threshold = self.get_input_parameter(self.PeakThreshold)
-            prominence_value = peak_threshold
+        # Peak analysis runs in the pipeline worker, not to delay the next scan.
+        # The results are plotted in this thread with the following callbacks.
+        self.plot_latest_peaks()
+        self.pipeline.submit(self.rga.scan.get_snapshot(self.mass_axis))
+
+    def analyze_peaks(self, snapshot, results):
+        w_height = 0.5
+        peak_threshold = self.get_input_parameter(self.PeakThreshold)
+        prominence_value = peak_threshold
+
+        x = snapshot.mass_axis
+        yr = snapshot.spectrum
 
-            x = self.mass_axis
-            yr = self.rga.scan.previous_spectrum
+        mi = x[0]
+        sa = round(1.0 / (x[1] - x[0]))
 
-            mi = x[0]
-            sa = round(1.0 / (x[1] - x[0]))
+        signal_offset = calculate_baseline(yr, lam=1e8)
 
-            signal_offset = calculate_baseline(yr, lam=1e8)
+        y = yr - signal_offset
 
-            y = yr - signal_offset
+        widths = np.arange(0.8, 8, 0.2)
+        peaks_cwt_raw = find_peaks_cwt(y, widths, min_snr=3)
 
-            widths = np.arange(0.8, 8, 0.2)
-            peaks_cwt_raw = find_peaks_cwt(y, widths, min_snr=3)
+        peaks_cwt = np.array([i for i in peaks_cwt_raw if y[i] > peak_threshold], dtype=np.int32)
 
-            peaks_cwt = np.array([], dtype=np.int32)
-            for i in peaks_cwt_raw:
-                if y[i] > peak_threshold:
-                    peaks_cwt = np.append(peaks_cwt, i)
-            # self.write_text(peaks_cwt_raw)
-            # self.write_text(peaks_cwt)
+        peaks, properties = find_peaks(y, distance=10, width=9, wlen=41, rel_height=w_height,
+                                       height=peak_threshold, prominence=prominence_value)
+        widths = peak_widths(y, peaks, rel_height=w_height)
 
-            peaks, properties = find_peaks(y, distance=10, width=9, wlen=41, rel_height=w_height,
-                                           height=peak_threshold, prominence=prominence_value)
-            widths = peak_widths(y, peaks, rel_height=w_height)
+        return {'x': x, 'y': y, 'mi': mi, 'sa': sa, 'peaks': peaks, 'properties': properties,
+                'widths': widths, 'peaks_cwt': peaks_cwt}
+
+    def plot_latest_peaks(self):
+        latest = self.pipeline.take_result()
+        if latest is not None:
+            self.plot_peaks(*latest)
+
+    def plot_peaks(self, snapshot, results):
+        try:
+            r = results['peaks']
+            x, y, mi, sa = r['x'], r['y'], r['mi'], r['sa']
+            peaks, properties, widths, peaks_cwt = r['peaks'], r['properties'], r['widths'], r['peaks_cwt']
 
             if len(peaks) == 0:
                 self.write_text("No peaks found")
@@ -264,4 +283,7 @@ Before start, select the maximum mass you want to see in the plot.
             self.logger.error('update_on_scan_finished error: {}'.format(e))
 
     def cleanup(self):
+        self.pipeline.wait(AnalysisWaitTime)  # Plot the peaks of the last scan
+        self.plot_latest_peaks()
+        self.pipeline.stop()
         self.logger.info('Task finished')
@@ -4,9 +4,11 @@
 ##! 
 
 from srsgui import Task
-from srsgui.task.inputs import ListInput, IntegerInput, StringInput, InstrumentInput
+from srsgui.task.inputs import ListInput, IntegerInput, FloatInput, StringInput, InstrumentInput
 
 from srsinst.rga.plots.timeplot import TimePlot
+from srsinst.rga.data.alarms import create_alarm_engine
+from srsinst.rga.instruments.rga100.dwell import DwellOptimizer
 
 # get_rga is imported from the path relative to the .taskconfig file
 from instruments import get_rga
@@ -18,14 +20,18 @@ class PvsTScanTask(Task):
     InstrumentName = 'instrument to control'
     MassesToMeasure = 'masses to measure'
     ScanSpeed = 'scan speed'
+    Precision = 'relative precision'
     IntensityUnit = 'intensity unit'
+    AlarmRules = 'alarm rules'
 
     # input_parameters values can be changed interactively from GUI
     input_parameters = {
         InstrumentName: InstrumentInput(),
         MassesToMeasure: StringInput("2, 18, 28, 44"),
         ScanSpeed: IntegerInput(3, " ", 0, 9, 1),
+        Precision: FloatInput(0.0, " (0 for the scan speed for all masses)", 0.0, 1.0, 0.01),
         IntensityUnit: ListInput(['Ion current (fA)', 'Partial Pressure (Torr)']),
+        AlarmRules: StringInput(""),
     }
 
     def setup(self):
@@ -37,10 +43,12 @@ class PvsTScanTask(Task):
 
         self.mass_list = list(map(int, self.params[self.MassesToMeasure].split(',')))
         self.rga = get_rga(self, self.params[self.InstrumentName])
-        self.id_string = self.rga.status.id_string
+        self.rga.mark_startup()
+        self.state = self.rga.read_state()  # ID and parameters in a single write
+        self.id_string = self.state.identity.id_string
         self.rga.scan.speed = self.params[self.ScanSpeed]        
-        emission_current = self.rga.ionizer.emission_current
-        cem_voltage = self.rga.cem.voltage
+        emission_current = self.state.emission_current
+        cem_voltage = self.state.cem_voltage
         self.logger.info('Emission current: {:.2f} mA CEM HV: {} V'.format(emission_current, cem_voltage))
 
         # Set a time plot
@@ -48,6 +56,10 @@ class PvsTScanTask(Task):
         key_list = list(map(str, self.mass_list))
         self.plot = TimePlot(self, self.ax, 'P vs T Scan', key_list)
         self.plot.ax.set_yscale('log')
+        self.plot.enable_retention()
+
+        # Alarm rules, i.e., '18 > 1e-7; 18/28 > 0.5', are evaluated with every P vs T data point
+        self.alarms = create_alarm_engine(key_list, self.params[self.AlarmRules], self.plot, self.logger)
 
         if self.params[self.IntensityUnit] == 0:
             self.conversion_factor = 0.1
@@ -56,11 +68,29 @@ class PvsTScanTask(Task):
             self.conversion_factor = self.rga.pressure.get_partial_pressure_sensitivity_in_torr()
             self.plot.set_conversion_factor(self.conversion_factor, 'Torr')
 
+        # With a precision, the scan speed of each mass is optimized for the shortest cycle time
+        self.dwell_optimizer = None
+        if self.params[self.Precision] > 0:
+            self.dwell_optimizer = DwellOptimizer(self.mass_list, self.params[self.Precision],
+                                                  min(self.params[self.ScanSpeed], 7),
+                                                  timing_model=self.rga.timing)
+            self.logger.info('Scan speed optimized for each mass for relative precision: {}'
+                             .format(self.params[self.Precision]))
+
     def test(self):
         while self.is_running():
-            intensity_list = self.rga.scan.get_multiple_mass_scan(*self.mass_list)
+            if self.dwell_optimizer:
+                intensity_list = self.dwell_optimizer.scan(self.rga.scan)
+            else:
+                intensity_list = self.rga.scan.get_multiple_mass_scan(self.mass_list)
             self.plot.add_data(intensity_list, True)
 
     def cleanup(self):
-        pass
+        # The dwell optimizer leaves the RGA at the scan speed of the last mass group
+        if getattr(self, 'dwell_optimizer', None):
+            try:
+                self.rga.scan.speed = self.params[self.ScanSpeed]
+            except Exception as e:
+                self.logger.error('{}: {}'.format(e.__class__.__name__, e))
+        self.plot.cleanup()  # Save the retention store
     
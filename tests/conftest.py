@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+
+from srsgui.inst.communications.interface import Interface
+from srsgui.inst.exceptions import InstCommunicationError
+
+from srsinst.rga import RGA100
+
+IdString = 'SRSRGA100VER0.24SN19999'
+
+# Set commands returning a status byte
+StatusCommands = ('EE', 'IE', 'VF', 'FL', 'HV', 'IN', 'CL', 'CA')
+
+
+def default_spectrum(mass_axis):
+    # Gaussian peaks of 1000 counts at every integer mass
+    return 1000.0 * np.exp(-(mass_axis - np.round(mass_axis)) ** 2 / 0.02)
+
+
+class FakeComm(Interface):
+    """
+    Scripted RGA100 behind an Interface. Queries are answered from state,
+    set commands update state, and scans return data from spectrum_function
+    and mass_function.
+
+    With joined_replies, every reply to a write arrives in a single read, and a read
+    with nothing to receive raises InstCommunicationError, like TcpipInterface.
+    Otherwise, a read returns a reply up to the term char, or b'' like SerialInterface.
+    """
+
+    def __init__(self, joined_replies=False):
+        super().__init__()
+        self.set_term_char(b'\r')
+        self.joined_replies = joined_replies
+        self.state = {
+            'ID': IdString, 'MI': 1, 'MF': 50, 'SA': 10, 'NF': 4,
+            'EE': 70, 'IE': 1, 'VF': 90, 'FL': 1.0, 'HV': 0, 'TP': 0,
+            'SP': 0.1, 'ST': 0.01, 'MG': 1000, 'ER': 0,
+        }
+        self.spectrum_function = default_spectrum
+        self.mass_function = lambda mass: 10 * mass
+        self.total_pressure = 5000  # TP? reply in 0.1 fA
+        self.connected = True
+        self.writes = []
+        self.pending = b''
+        self.binary = b''
+        self._timeout = 1.0
+
+    def is_connected(self):
+        return self.connected
+
+    def disconnect(self):
+        self.connected = False
+
+    def _send(self, cmd):
+        if not self.connected:
+            raise InstCommunicationError('Not connected')
+        self.writes.append(cmd)
+        for command in cmd.strip('\r').split('\r'):
+            self._handle(command)
+
+    def _reply(self, value):
+        self.pending += '{}\n\r'.format(value).encode()
+
+    def _handle(self, command):
+        name = command[:2].upper()
+        if command.endswith('?'):
+            if name == 'AP':
+                self._reply(self.get_points())
+            elif name == 'HP':
+                self._reply(self.state['MF'] - self.state['MI'] + 1)
+            elif name == 'TP':
+                self.binary += np.int32(self.total_pressure).tobytes()
+            else:
+                self._reply(self.state.get(name, 0))
+        elif name == 'SC':
+            mass_axis = self.state['MI'] + np.arange(self.get_points()) / self.state['SA']
+            self._send_scan(self.spectrum_function(mass_axis))
+        elif name == 'HS':
+            masses = np.arange(self.state['MI'], self.state['MF'] + 1, dtype=np.float64)
+            self._send_scan(self.spectrum_function(masses), binary_total=True)
+        elif name == 'MR':
+            self.binary += np.int32(self.mass_function(int(command[2:]))).tobytes()
+        elif name in StatusCommands:
+            if command[2:]:
+                self.state[name] = float(command[2:]) if '.' in command else int(command[2:])
+            self._reply(0)
+        elif command[2:]:
+            self.state[name] = float(command[2:]) if '.' in command else int(command[2:])
+
+    def _send_scan(self, spectrum, binary_total=False):
+        # An analog scan reads the total current with _recv(), and a histogram scan with the scan data
+        self.binary += np.rint(spectrum).astype('<i4').tobytes()
+        if binary_total:
+            self.binary += np.int32(7).tobytes()
+        else:
+            self.pending += np.int32(7).tobytes()
+
+    def get_points(self):
+        return (self.state['MF'] - self.state['MI']) * self.state['SA'] + 1
+
+    def _recv(self):
+        if not self.connected:
+            raise InstCommunicationError('Not connected')
+        if self.joined_replies:
+            if not self.pending:
+                raise InstCommunicationError("Timeout with Cmd: 'None'")
+            reply, self.pending = self.pending, b''
+            return reply
+        index = self.pending.find(self._term_char)
+        length = len(self.pending) if index < 0 else index + 1
+        reply, self.pending = self.pending[:length], self.pending[length:]
+        return reply
+
+    def _read_binary(self, length=4):
+        data, self.binary = self.binary[:length], self.binary[length:]
+        return data
+
+    def query_text(self, cmd):
+        with self.get_lock():
+            self._send(cmd)
+            reply = self._recv()
+            if not reply:
+                raise InstCommunicationError("Cmd '{}' timeout".format(cmd))
+            return reply.decode().strip()
+
+    def set_timeout(self, timeout):
+        self._timeout = timeout
+
+    def get_timeout(self):
+        return self._timeout
+
+
+def make_rga(comm):
+    rga = RGA100()
+    rga.comm = comm
+    rga.update_components()
+    return rga
+
+
+@pytest.fixture
+def comm():
+    return FakeComm()
+
+
+@pytest.fixture
+def rga(comm):
+    return make_rga(comm)
+
+
+@pytest.fixture
+def tcp_rga():
+    return make_rga(FakeComm(joined_replies=True))
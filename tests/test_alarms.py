@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from srsinst.rga.data.alarms import AlarmEngine, RuleThreshold, RuleRatio, RuleRate
+
+
+def states(engine, rows, timestamps=None):
+    # Active alarm names after each row of values
+    result = []
+    for i, values in enumerate(rows):
+        engine.update(values, None if timestamps is None else timestamps[i])
+        result.append(engine.get_active_alarms())
+    return result
+
+
+def test_rules_are_parsed_from_text():
+    engine = AlarmEngine(['18', '28', '32'])
+    rules = engine.add_rules('18 > 1e-7; 28/32 < 3 ; rate(28, 5) > 1e-9;')
+    assert [(r.rule_type, r.channel, r.other_channel, r.limit, r.above) for r in rules] == [
+        (RuleThreshold, '18', None, 1e-7, True),
+        (RuleRatio, '28', '32', 3.0, False),
+        (RuleRate, '28', None, 1e-9, True),
+    ]
+    assert rules[2].window == 5.0
+    with pytest.raises(ValueError):
+        engine.add_rules('18 >= 1e-7')
+    with pytest.raises(KeyError):
+        engine.add_rules('44 > 1')
+
+
+def test_threshold_clears_past_hysteresis():
+    engine = AlarmEngine(['18'])
+    engine.add_threshold('H2O', '18', 10.0, hysteresis=2.0)
+    events = []
+    engine.add_callback(events.append)
+    assert states(engine, [[9], [11], [9], [10.5], [7.9]]) == [[], ['H2O'], ['H2O'], ['H2O'], []]
+    assert [(e.active, e.value) for e in events] == [(True, 11.0), (False, 7.9)]
+
+
+def test_ratio_needs_denominator():
+    engine = AlarmEngine(['28', '32'])
+    engine.add_ratio('Air leak', '28', '32', 3.0, above=False)
+    assert states(engine, [[0, 0], [40, 10], [20, 10], [20, 0]]) == [[], [], ['Air leak'], ['Air leak']]
+    assert np.isnan(engine.values[0])  # no ratio without the denominator
+
+
+def test_rate_over_window():
+    engine = AlarmEngine(['28'])
+    engine.add_rate('Burst', '28', 1.0, window=10.0, hysteresis=0.5)
+    rows = [[0], [5], [25], [30], [30], [30]]
+    times = [0, 5, 10, 15, 20, 30]
+    # rates from the oldest value within 10 s: nan, 1, 2.5, 2.5, 0.5, 0
+    assert states(engine, rows, times) == [[], [], ['Burst'], ['Burst'], ['Burst'], []]
+
+
+def test_failing_callback_does_not_stop_others():
+    engine = AlarmEngine(['18'])
+    engine.add_threshold('H2O', '18', 1.0)
+    events = []
+    engine.add_callback(lambda event: 1 / 0)
+    engine.add_callback(events.append)
+    engine.update([2.0])
+    assert len(events) == 1
+    with pytest.raises(ValueError):
+        engine.add_threshold('H2O', '18', 2.0)
@@ -0,0 +1,99 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from srsgui.task.sessionhandler import SessionHandler
+
+from srsinst.rga.data.archive import SessionArchive, IndexFileSuffix
+
+MassAxis = [16.0, 17.0, 18.0, 19.0, 20.0]
+StartTime = datetime(2023, 5, 1, 10, 20, 30)
+
+
+@pytest.fixture
+def session(tmp_path):
+    # Data file written the way tasks and plots write it
+    session = SessionHandler(use_file=True)
+    session.data_dir = str(tmp_path)
+    session.create_file('Analog Scan')
+    session.add_dict_to_file('Analog Scan', {'name': 'Analog Scan'})
+    session.create_table_in_file('Analog Scan', 'Elapsed time', *MassAxis)
+    session.create_table_in_file('P vs T', 'Date time', '18', '28', 'N2')
+    for i in range(10):
+        session.add_to_table_in_file('Analog Scan', float(i), *[10 * i + m for m in MassAxis])
+        session.add_to_table_in_file('P vs T', str(StartTime + timedelta(seconds=i)), i, 2 * i, 3 * i)
+    session.file_name = str(session.path / session.file_name)
+    yield session
+    session.close_file()
+
+
+def test_spectra_in_time_slice_and_mass_range(session):
+    with SessionArchive(session.file_name) as archive:
+        assert archive.get_table_names() == ['Analog Scan', 'P vs T']
+        assert archive.get_table('Analog Scan').info == {'name': 'Analog Scan'}
+        times, masses, spectra = archive.get_spectra('Analog Scan', 2, 5, (17, 19))
+        assert list(times) == [2.0, 3.0, 4.0, 5.0]
+        assert list(masses) == [17.0, 18.0, 19.0]
+        assert spectra.tolist() == [[10 * i + m for m in (17, 18, 19)] for i in range(2, 6)]
+
+
+def test_datetime_table(session):
+    with SessionArchive(session.file_name) as archive:
+        # A number is seconds from the first row
+        times, data, labels = archive.get_pvst('P vs T', 7, None, ['N2', 18])
+        assert labels == ['N2', '18']
+        assert data.tolist() == [[21.0, 7.0], [24.0, 8.0], [27.0, 9.0]]
+        assert times[0] == np.datetime64(StartTime + timedelta(seconds=7))
+
+        times, data = archive.read_table('P vs T', StartTime + timedelta(seconds=1.5), '2023-05-01T10:20:33')
+        assert data[:, 0].tolist() == [2.0, 3.0]
+        with pytest.raises(KeyError):
+            archive.get_pvst('P vs T', masses=[44])
+
+
+def test_chunks(session):
+    with SessionArchive(session.file_name) as archive:
+        chunks = list(archive.iter_chunks('Analog Scan', 4, columns=[18.0]))
+        assert [len(times) for times, _ in chunks] == [4, 4, 2]
+        assert np.concatenate([data for _, data in chunks]).ravel().tolist() == [10 * i + 18 for i in range(10)]
+        with pytest.raises(ValueError):
+            next(archive.iter_chunks('Analog Scan', 0))
+
+
+def test_refresh_indexes_complete_rows_only(session):
+    with SessionArchive(session.file_name) as archive:
+        session.add_to_table_in_file('Analog Scan', 10.0, *MassAxis)
+        session.output_file.write('TD:0, 11.0, 1')  # a row still being written
+        session.output_file.flush()
+        assert archive.refresh()
+        assert archive.get_row_count('Analog Scan') == 11
+
+        session.output_file.write(', 2, 3, 4, 5\n')
+        assert archive.refresh()
+        assert not archive.refresh()
+        assert archive.read_table('Analog Scan', 11)[1].tolist() == [[1.0, 2.0, 3.0, 4.0, 5.0]]
+
+
+def test_index_file_is_reused_and_updated(session):
+    SessionArchive(session.file_name).close()
+    index_file = session.file_name + IndexFileSuffix
+    assert os.path.exists(index_file)
+
+    session.add_to_table_in_file('P vs T', str(StartTime + timedelta(seconds=10)), 10, 20, 30)
+    with SessionArchive(session.file_name) as archive:
+        assert archive.get_row_count('P vs T') == 11
+    with SessionArchive(session.file_name, use_index_file=False) as archive:
+        fresh = archive.get_table('P vs T')
+    with SessionArchive(session.file_name) as archive:
+        table = archive.get_table('P vs T')
+        assert table.offsets.tolist() == fresh.offsets.tolist()
+        assert table.times.tolist() == fresh.times.tolist()
+
+    # An index for a longer file is discarded
+    with open(session.file_name, 'w') as f:
+        f.write('\nTN:0, Short\nTH:0, Elapsed time, 28\nTD:0, 0.5, 7\n')
+    with SessionArchive(session.file_name) as archive:
+        assert archive.get_table_names() == ['Short']
+        assert archive.read_table('Short')[1].tolist() == [[7.0]]
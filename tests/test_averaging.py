@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from srsinst.rga.data.averaging import SpectrumAverager
+
+
+def spectra(count=20, points=5, seed=2):
+    rng = np.random.default_rng(seed)
+    return 100.0 + rng.normal(0.0, 3.0, (count, points))
+
+
+def test_mean_and_noise_match_numpy():
+    data = spectra()
+    averager = SpectrumAverager(data.shape[1])
+    for y in data:
+        averager.add(y)
+    assert averager.get_average() == pytest.approx(data.mean(axis=0))
+    assert averager.get_noise() == pytest.approx(data.std(axis=0, ddof=1))
+    assert averager.get_error() == pytest.approx(data.std(axis=0, ddof=1) / np.sqrt(len(data)))
+
+
+def test_ema_starts_with_first_spectrum():
+    averager = SpectrumAverager(2, mode='ema', alpha=0.5)
+    averager.add([10.0, 0.0])
+    averager.add([20.0, 4.0])
+    assert list(averager.get_average()) == [15.0, 2.0]
+    assert np.all(np.isfinite(averager.get_error()))
+
+
+def test_median_uses_latest_window():
+    data = spectra(count=7)
+    averager = SpectrumAverager(data.shape[1], mode='median', window=3)
+    for y in data:
+        averager.add(y)
+    assert averager.get_average() == pytest.approx(np.median(data[-3:], axis=0))
+    assert averager.get_noise() == pytest.approx(data[-3:].std(axis=0, ddof=1))
+
+
+def test_reset_and_invalid_input():
+    averager = SpectrumAverager(3)
+    averager.add([1.0, 2.0, 3.0])
+    averager.reset()
+    assert averager.count == 0 and not averager.get_average().any()
+    assert np.all(np.isnan(averager.get_noise()))
+    with pytest.raises(ValueError):
+        averager.add([1.0, 2.0])
+    with pytest.raises(ValueError):
+        SpectrumAverager(3, mode='sum')
+
+
+def test_run_stops_at_target_snr(rga):
+    rng = np.random.default_rng(3)
+    rga.comm.state['MF'] = 10
+    rga.comm.spectrum_function = lambda x: 1000.0 * np.exp(-(x - 5) ** 2 / 0.02) + rng.normal(50.0, 20.0, len(x))
+    mass_axis = rga.scan.get_mass_axis(True)
+    averager = SpectrumAverager(len(mass_axis))
+    averager.set_target_snr(200.0, [5], mass_axis)
+    averager.run(rga.scan.get_analog_scan, max_scans=100)
+    assert 2 <= averager.count < 100
+    assert averager.get_snr()[0] >= 200.0
+    with pytest.raises(ValueError):
+        averager.set_target_snr(10.0, [20], mass_axis)
@@ -0,0 +1,27 @@
+import pytest
+
+from srsgui.inst.exceptions import InstCommunicationError
+
+
+def test_batch_splits_joined_replies(tcp_rga):
+    tcp_rga.comm.state.update(SP=0.1, ST=0.01, MG=1000, HV=0)
+    with tcp_rga.batch() as batch:
+        results = [batch.query_text(cmd + '?', float) for cmd in ('SP', 'ST', 'MG', 'HV')]
+        tcp_rga.ionizer.electron_energy = 70
+    assert [result.value for result in results] == [0.1, 0.01, 1000.0, 0.0]
+    assert tcp_rga.ionizer.last_set_status == 0
+    assert len(tcp_rga.comm.writes) == 1
+
+
+def test_batch_timeout_with_raising_transport(tcp_rga):
+    comm = tcp_rga.comm
+    send = comm._send
+    comm._send = lambda cmd: send(cmd.replace('ST?', ''))  # the RGA misses a command
+
+    with pytest.raises(InstCommunicationError):
+        with tcp_rga.batch() as batch:
+            sp = batch.query_text('SP?', float)
+            st = batch.query_text('ST?', float)
+    assert sp.value == 0.1
+    with pytest.raises(InstCommunicationError):
+        st.value
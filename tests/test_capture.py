@@ -0,0 +1,21 @@
+from srsinst.rga.data.capture import EventCapture
+
+
+def test_capture_from_multiple_mass_scan(rga):
+    events = []
+    capture = EventCapture([18, '28'], pre_time=10.0, post_time=0.0)
+    capture.add_callback(events.append)
+    capture.add_threshold_trigger(28, 250)
+    capture.attach_scans(rga.scan)
+    capture.arm()
+
+    for level in (100, 100, 300):
+        rga.comm.mass_function = lambda mass: level if mass == 28 else 10 * mass
+        rga.scan.get_multiple_mass_scan([18, 28, 44])
+
+    assert capture.sample_count == 6  # mass 44 is not a channel
+    event, = events
+    assert event.channel_names == ['18', '28']
+    assert event.reason == '28 crossed 2.500e+02'
+    assert list(event.values['28']) == [100, 100, 300]
+    assert list(event.values['18']) == [180, 180, 180]
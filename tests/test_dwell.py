@@ -0,0 +1,58 @@
+import pytest
+
+from srsinst.rga.instruments.rga100.dwell import DwellOptimizer
+
+
+def test_speed_prefix_updates_set_cache(rga):
+    rga.set_cache.enable()
+    rga.scan.speed = 4
+    rga.scan.get_multiple_mass_scan([18, 28], [7, 7])
+    assert rga.comm.state['NF'] == 7
+
+    rga.scan.speed = 4
+    assert rga.comm.state['NF'] == 4
+    assert rga.scan.get_current_speed() == 4
+
+
+def test_speed_meets_precision_with_noise_floor():
+    optimizer = DwellOptimizer([28, 18, 40], precision=0.01, initial_speed=0, noise_floor=1.0)
+    optimizer.update([1e4, 400.0, 1.0], optimizer.speeds)
+    # noise * 2 ** (speed / 2) <= precision * intensity
+    assert list(optimizer.get_speeds()) == [7, 4, 0]
+
+
+def test_faster_speed_needs_hysteresis():
+    optimizer = DwellOptimizer([28], precision=1.0, initial_speed=3, noise_floor=1.0)
+
+    def speed_for(raw):
+        optimizer.intensities[:] = 2 ** (raw / 2.0)
+        return int(optimizer.get_speeds()[0])
+
+    assert speed_for(4.2) == 3  # not past the next speed by Hysteresis
+    assert speed_for(4.6) == 4
+    assert speed_for(2.9) == 2  # a slower speed is taken at once
+
+
+def test_noise_is_estimated_from_successive_measurements():
+    optimizer = DwellOptimizer([28], alpha=1.0, initial_speed=1)
+    optimizer.update([1000.0], [1])
+    optimizer.update([1004.0], [1])
+    # variance of a difference is 16 / 2, and scaled from speed 1 to speed 0 by 1 / 2
+    assert optimizer.get_noise()[0] == pytest.approx(2.0)
+    optimizer.update([1100.0], [2])  # no estimate across a speed change
+    assert optimizer.get_noise()[0] == pytest.approx(2.0)
+
+
+def test_scan_groups_masses_by_speed(rga):
+    rga.comm.mass_function = {2: 10, 18: 100000, 28: 1000, 44: 100000}.get
+    masses = [2, 18, 28, 44]
+    optimizer = DwellOptimizer(masses, precision=0.01)
+    assert list(optimizer.scan(rga.scan)) == [10, 100000, 1000, 100000]
+
+    rga.comm.writes.clear()
+    assert list(optimizer.scan(rga.scan)) == [10, 100000, 1000, 100000]
+    speeds = list(optimizer.speeds)
+    assert speeds == [0, 7, 6, 7]
+    # A speed change is sent only at the start of each group
+    assert sum(cmd.count('NF') for cmd in rga.comm.writes) == len(set(speeds))
+    assert optimizer.predict_cycle_time() > 0
@@ -0,0 +1,60 @@
+import math
+
+import numpy as np
+import pytest
+
+from srsinst.rga.data.leakrate import SlidingRegression, RateOfRiseEstimator
+
+
+def test_regression_matches_polyfit_over_window():
+    rng = np.random.default_rng(1)
+    t = np.arange(200.0)
+    y = 3.0 * t + 100.0 + rng.normal(0.0, 5.0, len(t))
+    regression = SlidingRegression(window=50.0)
+    for ti, yi in zip(t, y):
+        regression.add(ti, yi)
+    inside = t >= t[-1] - 50.0
+    slope, intercept = np.polyfit(t[inside], y[inside], 1)
+    fit = regression.get_fit()
+    assert regression.n == inside.sum()
+    assert fit[:2] == pytest.approx((slope, intercept))
+    assert 0.9 < fit[2] <= 1.0
+
+    regression.recalculate()
+    assert regression.get_fit()[:2] == pytest.approx((slope, intercept))
+
+
+def test_regression_needs_two_times():
+    regression = SlidingRegression(window=10.0)
+    regression.add(1.0, 5.0)
+    assert all(math.isnan(v) for v in regression.get_fit())
+    regression.add(1.0, 6.0)
+    assert all(math.isnan(v) for v in regression.get_fit())
+
+
+def test_estimator_reports_leak_rate_per_mass():
+    results = []
+    estimator = RateOfRiseEstimator(window=100.0, conversion_factor=0.5, volume=10.0,
+                                    callback=results.append)
+    returned = [estimator.add_samples([4, 28], [100 + 20 * i, 500], 1000.0 + i) for i in range(5)]
+    assert returned[:2] == [[None, None], [None, None]]  # fewer than min_samples
+    assert returned[-1] == [estimator.get_result(4), estimator.get_result(28)]
+    he = estimator.get_result(4)
+    assert he.slope == pytest.approx(10.0)  # 20 * 0.5 per second
+    assert he.intercept == pytest.approx(50.0)
+    assert he.leak_rate == pytest.approx(100.0)
+    assert he.count == 5
+    assert estimator.get_result(28).slope == pytest.approx(0.0)
+    assert len(results) == 6
+
+
+def test_estimator_follows_scans(rga):
+    estimator = RateOfRiseEstimator(min_samples=2)
+    estimator.attach(rga.scan)
+    for level in (100, 200):
+        rga.comm.mass_function = lambda mass: level
+        rga.scan.get_multiple_mass_scan([4])
+    assert estimator.get_result(4).slope > 0
+    estimator.detach()
+    rga.scan.get_multiple_mass_scan([4])
+    assert estimator.get_result(4).count == 2
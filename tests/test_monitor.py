@@ -0,0 +1,75 @@
+import time
+
+from srsinst.rga.instruments.rga100.monitor import TotalPressureMonitor
+
+
+def wait_for_samples(monitor, count, timeout=2.0):
+    end_time = time.time() + timeout
+    while monitor.sample_count < count and time.time() < end_time:
+        time.sleep(0.01)
+    return monitor.sample_count >= count
+
+
+def test_stop_turns_off_total_pressure_enabled_by_monitor(rga):
+    monitor = TotalPressureMonitor(rga, rate=100.0)
+    monitor.start()
+    assert wait_for_samples(monitor, 2)
+    monitor.stop(1)
+    assert rga.comm.state['TP'] == 0
+    assert [cmd for cmd in rga.comm.writes if cmd.startswith('TP') and cmd != 'TP?'] == ['TP1', 'TP0']
+    assert rga.pressure.total_pressure_enabled is False
+
+
+def test_stop_keeps_total_pressure_enabled_before_start(rga):
+    rga.pressure.total_pressure_enable = True
+    monitor = TotalPressureMonitor(rga, rate=100.0)
+    monitor.start()
+    assert wait_for_samples(monitor, 2)
+    monitor.stop(1)
+    assert rga.comm.state['TP'] == 1
+    assert 'TP0' not in rga.comm.writes
+
+
+def test_ring_buffer_keeps_latest_samples_in_order(rga):
+    monitor = TotalPressureMonitor(rga, capacity=3)
+    for i in range(5):
+        monitor.add_sample(float(i), 10 * i, 1e-7 * i)
+    times, pressures = monitor.get_data()
+    assert list(times) == [2.0, 3.0, 4.0]
+    assert list(monitor.get_data(2, in_torr=False)[1]) == [30, 40]
+    assert monitor.get_latest() == (4.0, 4e-7)
+
+
+def test_updates_are_decimated_averages(rga):
+    updates = []
+    monitor = TotalPressureMonitor(rga, decimation=2, update_callback=lambda t, p: updates.append(p))
+    for pressure in (1.0, 3.0, 5.0, 7.0, 9.0):
+        monitor.add_sample(time.time(), 0, pressure)
+    assert updates == [2.0, 6.0]
+
+
+def test_alarm_clears_with_hysteresis(rga):
+    events = []
+    monitor = TotalPressureMonitor(rga)
+    alarm = monitor.add_alarm(1e-5, lambda t, p, a: events.append((p, a.active)),
+                              hysteresis=2e-6, notify_clear=True)
+    for pressure in (5e-6, 1.2e-5, 9e-6, 1.1e-5, 7e-6):
+        monitor.add_sample(time.time(), 0, pressure)
+    assert events == [(1.2e-5, True), (7e-6, False)]
+    assert not alarm.active
+
+
+def test_samples_through_scheduler_are_converted_to_torr(rga):
+    scheduler = rga.get_scheduler()
+    monitor = TotalPressureMonitor(rga, rate=100.0, scheduler=scheduler)
+    try:
+        monitor.start()
+        assert wait_for_samples(monitor, 2)
+        monitor.stop(1)
+    finally:
+        scheduler.stop(1)
+    expected = rga.pressure.get_calibration().convert_total_pressure(rga.comm.total_pressure)
+    times, currents = monitor.get_data(in_torr=False)
+    assert set(currents) == {rga.comm.total_pressure}
+    assert monitor.get_latest()[1] == expected
+    assert monitor.error_count == 0
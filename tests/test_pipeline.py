@@ -0,0 +1,39 @@
+import time
+
+from srsinst.rga.data.pipeline import AnalysisPipeline
+
+
+def slow_sum(snapshot, results):
+    time.sleep(0.05)
+    return snapshot.spectrum.sum()
+
+
+def test_wait_delivers_the_last_scan(rga):
+    rga.comm.state['MF'] = 5
+    pipeline = AnalysisPipeline({'sum': slow_sum}, queue_size=2)
+    try:
+        for _ in range(3):
+            rga.scan.get_analog_scan()
+            pipeline.submit(rga.scan.get_snapshot())
+        assert pipeline.wait(2)
+        snapshot, results = pipeline.take_result()
+    finally:
+        pipeline.stop()
+    assert snapshot.sequence == 3
+    assert results['sum'] == rga.scan.spectrum.sum()
+    assert pipeline.take_result() is None
+
+
+def test_failed_stage_does_not_block_wait(rga):
+    def failing(snapshot, results):
+        raise ValueError('bad scan')
+
+    pipeline = AnalysisPipeline({'fail': failing})
+    try:
+        rga.scan.get_analog_scan()
+        pipeline.submit(rga.scan.get_snapshot())
+        assert pipeline.wait(2)
+    finally:
+        pipeline.stop()
+    assert pipeline.error_count == 1
+    assert pipeline.take_result() is None
@@ -0,0 +1,68 @@
+import pytest
+
+from srsinst.rga.instruments.rga100.planner import AcquisitionPlanner
+from srsinst.rga.instruments.rga100.timing import ScanTimingModel, AnalogScan, SegmentedAnalogScan, \
+    HistogramScan, MultipleMassScan
+
+
+def test_few_masses_use_multiple_mass_scan():
+    plan = AcquisitionPlanner().plan([2, 18, 28, 44])
+    assert (plan.scan_type, plan.speed) == (MultipleMassScan, 4)
+    assert plan.feasible
+
+
+def test_resolution_needs_analog_scan_over_windows():
+    planner = AcquisitionPlanner()
+    plan = planner.plan([2, 90], resolution=10)
+    assert plan.scan_type == SegmentedAnalogScan
+    assert plan.windows == [(1, 3), (89, 91)]
+    candidates = planner.get_candidates([2, 90], resolution=10, speeds=[4])
+    assert {c.scan_type for c in candidates} == {AnalogScan, SegmentedAnalogScan}
+
+
+def test_target_snr_picks_fastest_plan_reaching_it():
+    planner = AcquisitionPlanner()
+    masses, intensities = [18, 28], [200.0, 5000.0]
+    plan = planner.plan(masses, target_snr=50.0, intensities=intensities)
+    assert plan.snr >= 50.0
+    reaching = [c for c in planner.get_candidates(masses, intensities=intensities) if c.snr >= 50.0]
+    assert plan.cycle_time == min(c.cycle_time for c in reaching)
+    with pytest.raises(ValueError):
+        planner.plan(masses, target_snr=50.0)
+
+
+def test_cycle_time_picks_slowest_speed_that_fits():
+    planner = AcquisitionPlanner()
+    plan = planner.plan([28], cycle_time=1.0)
+    assert plan.cycle_time <= 1.0
+    fitting = [c for c in planner.get_candidates([28]) if c.cycle_time <= 1.0]
+    assert plan.speed == min(c.speed for c in fitting)
+
+    impossible = planner.plan(list(range(1, 101)), resolution=25, cycle_time=0.001)
+    assert not impossible.feasible
+    assert impossible.speed == 7
+
+
+def test_calibrated_timing_model_changes_the_choice():
+    # With a slow MR measurement, a histogram scan of a narrow range is faster
+    model = ScanTimingModel(overheads={MultipleMassScan: 1.0})
+    plan = AcquisitionPlanner(model).plan(range(10, 16))
+    assert plan.scan_type == HistogramScan
+
+
+def test_invalid_masses():
+    planner = AcquisitionPlanner(max_mass=100)
+    for masses in ([], [0, 18], [101]):
+        with pytest.raises(ValueError):
+            planner.plan(masses)
+
+
+def test_plan_runs_on_scans(rga):
+    planner = AcquisitionPlanner()
+    plan = planner.plan([2, 18, 28])
+    assert list(plan.execute(rga.scan)) == [20, 180, 280]
+    assert plan.get_intensities(rga.scan) == [20, 180, 280]
+
+    histogram, = [c for c in planner.get_candidates([5, 8], speeds=[4]) if c.scan_type == HistogramScan]
+    histogram.execute(rga.scan)
+    assert histogram.get_intensities(rga.scan) == [1000.0, 1000.0]
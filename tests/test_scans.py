@@ -0,0 +1,28 @@
+import numpy as np
+
+from srsinst.rga.instruments.rga100.scans import Scans
+
+
+def peak(mass_axis, mass, height):
+    return height * np.exp(-(mass_axis - mass) ** 2 / 0.02)
+
+
+def test_flat_offset_is_not_rescanned(rga):
+    rga.comm.spectrum_function = lambda x: np.full(len(x), 12.0)
+    rga.scan.get_adaptive_speed_scan(7, 2)
+    assert rga.scan.speed_regions == []
+    assert np.all(rga.scan.point_speeds == 7)
+
+
+def test_weak_peak_on_offset_is_rescanned(rga):
+    rng = np.random.default_rng(0)
+    rga.comm.spectrum_function = lambda x: 12.0 + rng.normal(0.0, 2.0, len(x)) \
+        + peak(x, 28, 10000) + peak(x, 40, 40)
+    rga.scan.get_adaptive_speed_scan(7, 2)
+    assert rga.scan.speed_regions == [(39, 41, 2)]
+
+
+def test_weak_peak_windows_subtract_baseline():
+    mass_axis = np.arange(1, 50.05, 0.1)
+    spectrum = 500.0 + peak(mass_axis, 18, 20)
+    assert Scans.get_weak_peak_windows(mass_axis, spectrum) == [(17, 19)]
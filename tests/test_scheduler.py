@@ -0,0 +1,41 @@
+import threading
+
+from srsinst.rga.instruments.rga100.scheduler import Priority
+
+
+def test_waiting_queries_are_sent_in_one_write(rga):
+    scheduler = rga.get_scheduler()
+    release = threading.Event()
+    try:
+        blocker = scheduler.submit(release.wait, priority=Priority.Bulk)
+        futures = [scheduler.query(cmd) for cmd in ('MI?', 'MF?', 'EE?')]
+        release.set()
+        assert [f.result(1) for f in futures] == ['1', '50', '70']
+        assert blocker.result(1)
+    finally:
+        scheduler.stop(1)
+    assert rga.comm.writes == ['MI?\rMF?\rEE?\r']
+
+
+def test_queries_run_in_one_write_between_segments(rga):
+    comm = rga.comm
+    comm.state['MF'] = 30
+    scheduler = rga.get_scheduler()
+    futures = []
+    send = comm._send
+
+    def send_and_query(cmd):
+        send(cmd)
+        if cmd.startswith('SC') and not futures:
+            futures.extend(scheduler.query(q) for q in ('ER?', 'EE?'))
+
+    comm._send = send_and_query
+    try:
+        spectrum = scheduler.submit_analog_scan(segment_width=10).result(5)
+    finally:
+        scheduler.stop(1)
+    assert len(spectrum) == comm.get_points()
+    assert [f.result(0) for f in futures] == ['0', '70']
+    scan_writes = [i for i, cmd in enumerate(comm.writes) if cmd.startswith('SC')]
+    query_write = comm.writes.index('ER?\rEE?\r')
+    assert scan_writes[0] < query_write < scan_writes[1]
@@ -0,0 +1,51 @@
+import queue
+
+import numpy as np
+import pytest
+
+from srsinst.rga.instruments.rga100.server import RgaServer, RgaClient, encode_array, decode_array
+
+
+@pytest.fixture
+def server(rga):
+    server = RgaServer(rga, port=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_array_encoding_round_trip():
+    array = np.array([0.0, 1.5e-13, -2.0, np.inf])
+    assert np.array_equal(decode_array(encode_array(array)), array)
+
+
+def test_commands_from_clients(server, rga):
+    with RgaClient(port=server.port, timeout=5.0) as first, RgaClient(port=server.port, timeout=5.0) as second:
+        assert first.query('EE?') == '70'
+        assert first.query('EE60') == '0'
+        assert second.query('EE?') == '60'
+        assert rga.comm.state['EE'] == 60
+        assert second.get_status().startswith('Emission current: 1.00 mA')
+
+        with pytest.raises(RuntimeError, match='Invalid scan type'):
+            first.configure_scan('spiral')
+        with pytest.raises(RuntimeError, match='Invalid op'):
+            first.request('reboot')
+
+
+def test_scans_are_sent_to_subscribers(server):
+    snapshots = queue.Queue()
+    with RgaClient(port=server.port, timeout=5.0) as listener, RgaClient(port=server.port, timeout=5.0) as controller:
+        listener.subscribe(snapshots.put)
+        assert controller.configure_scan('multiple_mass', masses=[2, 28]) == 2
+        controller.start_scan()
+        first = snapshots.get(timeout=5.0)
+        second = snapshots.get(timeout=5.0)
+        controller.stop_scan()
+
+        assert second.sequence == first.sequence + 1
+        assert list(first.mass_axis) == [2.0, 28.0]
+        assert list(first.spectrum) == [20.0, 280.0]
+
+        # Requests run between scans
+        assert controller.query('MF?') == '50'
@@ -0,0 +1,28 @@
+def test_set_cache_skips_status_sets(rga):
+    rga.set_cache.enable()
+    rga.ionizer.electron_energy = 70
+    rga.ionizer.electron_energy = 70
+    assert rga.comm.writes == ['EE70']
+    assert rga.ionizer.last_set_status == 0
+
+
+def test_set_cache_skips_qmf_sets(rga):
+    rga.comm.state.update(RS=1000.0, RI=0.0)
+    rga.set_cache.enable()
+    assert rga.qmf.rf.slope == 1000.0
+    rga.qmf.rf.slope = 1000.0
+    with rga.batch():
+        rga.qmf.rf.offset = 1.5
+        rga.qmf.rf.offset = 1.5
+    rga.qmf.rf.offset = 1.5
+    assert rga.comm.writes == ['RS?', 'RI1.5\rRI1.5\r']
+    assert rga.set_cache.get_statistics()['hit'] == 2
+
+
+def test_raw_command_invalidates_set_cache(rga):
+    rga.set_cache.enable()
+    rga.qmf.rf.slope = 1000.0
+    rga.handle_command('RS900')
+    rga.qmf.rf.slope = 1000.0
+    assert rga.comm.writes[-1] == 'RS1000.0'
+    assert rga.comm.state['RS'] == 1000.0
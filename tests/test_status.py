@@ -0,0 +1,18 @@
+from srsinst.rga.instruments.rga100.components import Status
+from srsinst.rga.instruments.rga100.errors import ERROR_REGISTERS, BIT3
+
+
+def test_error_registers_match_status_commands():
+    commands = {name: getattr(Status, name).remote_command for name in
+                ('error_ps', 'error_detector', 'error_qmf', 'error_cem', 'error_filament', 'error_rs232')}
+    assert commands == {'error_ps': 'EP', 'error_detector': 'ED', 'error_qmf': 'EQ',
+                        'error_cem': 'EM', 'error_filament': 'EF', 'error_rs232': 'EC'}
+    assert [command for _, command, _, _ in ERROR_REGISTERS] == ['EP', 'ED', 'EQ', 'EM', 'EF', 'EC']
+
+
+def test_cem_error_is_read_from_em(rga):
+    rga.comm.state.update({'ER': BIT3, 'EM': 1 << 7, 'EC': 1 << 0})
+    assert rga.status.error_cem == 128
+    assert rga.comm.writes[-1] == 'EM?'
+    assert rga.status.get_errors() == 'EM7'
+    assert rga.status.snapshot().get_error_keys() == ('EM7',)
@@ -0,0 +1,92 @@
+import pytest
+
+from srsgui import Instrument
+from srsgui.inst.exceptions import InstCommunicationError, InstIdError
+
+from srsinst.rga.instruments.rga100.supervisor import ConnectionSupervisor
+
+
+@pytest.fixture
+def reconnect(rga, monkeypatch):
+    """
+    Replace the interface connection under RGA100.connect(). The first 'failures' attempts fail,
+    and the RGA comes back with 'reset' state, as after a power cycle.
+    """
+    attempts = []
+    script = {'failures': 0, 'reset': {}}
+
+    def connect(instrument, interface_type, *args):
+        attempts.append((interface_type,) + args)
+        if len(attempts) <= script['failures']:
+            raise InstCommunicationError('Port not available')
+        instrument.comm.state.update(script['reset'])
+        instrument.comm.pending = instrument.comm.binary = b''
+        instrument.comm.connected = True
+
+    monkeypatch.setattr(Instrument, 'connect', connect)
+    rga._connect_args = ('serial', 'COM1', 28800)
+    rga.check_id()
+    script['attempts'] = attempts
+    return script
+
+
+def test_reconnect_restores_snapshot(rga, reconnect):
+    rga.scan.set_parameters(2, 40, 3, 20)
+    rga.ionizer.electron_energy = 60
+    supervisor = ConnectionSupervisor(rga, initial_backoff=0.01, max_backoff=0.02)
+    supervisor.take_snapshot()
+
+    rga.comm.disconnect()
+    reconnect['failures'] = 2
+    reconnect['reset'] = {'MI': 1, 'MF': 50, 'NF': 4, 'SA': 10, 'EE': 70}
+    event = supervisor.reconnect('cable unplugged')
+
+    assert reconnect['attempts'] == [('serial', 'COM1', 28800)] * 3
+    assert event.attempts == 3 and event.error == 'cable unplugged'
+    assert [rga.comm.state[name] for name in ('MI', 'MF', 'NF', 'SA', 'EE')] == [2, 40, 3, 20, 60]
+    assert 'IE1' not in rga.comm.writes[-1]  # unchanged parameters are not set again
+    assert supervisor.get_statistics()['reconnections'] == 1
+
+
+def test_run_resumes_after_lost_connection(rga, reconnect):
+    supervisor = ConnectionSupervisor(rga, initial_backoff=0.01)
+    calls = []
+
+    def measure():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            rga.comm.disconnect()
+        return rga.scan.get_multiple_mass_scan([28])
+
+    assert list(supervisor.run(measure)) == [280]
+    assert calls == [0, 1]
+    assert len(supervisor.events) == 1
+
+
+def test_error_with_live_connection_is_raised(rga, reconnect):
+    supervisor = ConnectionSupervisor(rga, initial_backoff=0.01)
+
+    def fail():
+        raise InstCommunicationError('Scan data timeout')
+
+    with pytest.raises(InstCommunicationError):
+        supervisor.run(fail)
+    assert supervisor.events == [] and reconnect['attempts'] == []
+
+
+def test_reconnect_gives_up(rga, reconnect):
+    supervisor = ConnectionSupervisor(rga, initial_backoff=0.01, max_attempts=2)
+    rga.comm.disconnect()
+    reconnect['failures'] = 5
+    with pytest.raises(InstCommunicationError):
+        supervisor.reconnect()
+    assert len(reconnect['attempts']) == 2
+
+
+def test_different_rga_is_rejected(rga, reconnect):
+    supervisor = ConnectionSupervisor(rga, initial_backoff=0.01)
+    rga.comm.disconnect()
+    reconnect['reset'] = {'ID': 'SRSRGA100VER0.24SN20001'}
+    with pytest.raises(InstIdError):
+        supervisor.reconnect()
+    assert supervisor.events == []
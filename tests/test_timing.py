@@ -0,0 +1,40 @@
+import time
+import logging
+
+from srsinst.rga.instruments.rga100.timing import AnalogScan, HistogramScan
+
+
+def slow_callback(*args):
+    time.sleep(0.02)
+
+
+def test_scan_durations_exclude_callbacks(rga):
+    rga.comm.state['MF'] = 3
+    rga.scan.set_data_callback_period(0)
+    rga.scan.set_callbacks(slow_callback, slow_callback, slow_callback)
+    rga.scan.get_analog_scan()
+    rga.scan.get_histogram_scan()
+    for scan_type in (AnalogScan, HistogramScan):
+        (_, _, duration), = rga.timing.records[scan_type]
+        assert duration < 0.02
+
+
+def test_disconnect_saves_only_new_records(rga, tmp_path):
+    rga.timing.path = str(tmp_path / 'timing.json')
+    rga.disconnect()
+    assert not (tmp_path / 'timing.json').exists()
+
+    rga.comm.connected = True
+    rga.scan.get_analog_scan()
+    rga.disconnect()
+    assert (tmp_path / 'timing.json').exists()
+    assert not rga.timing.modified
+
+
+def test_disconnect_logs_save_failure(rga, tmp_path, caplog):
+    rga.timing.path = str(tmp_path)  # a directory cannot be opened as a file
+    rga.timing.record(AnalogScan, 4, 100, 1.0)
+    with caplog.at_level(logging.ERROR):
+        rga.disconnect()
+    assert 'Failed to save timing model' in caplog.text
+    assert not rga.comm.is_connected()